@@ -2,7 +2,8 @@
 Firebase Configuration Module
 
 This module initializes Firebase Admin SDK for authentication and Firestore.
-Only this module and user_controller.py reference Firebase directly.
+Only this module, the user store (services/user_store.py) and the auth
+middleware reference Firebase directly.
 All other modules remain database-agnostic.
 """
 
@@ -12,18 +12,25 @@ IMPORTANT: This controller is database-agnostic regarding authentication.
 It receives user_id as a string from the auth middleware and does NOT import Firebase.
 """
 
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends, Query
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
+import os
 import asyncpg
 import asyncio
+import json
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
 from models import (
     Apiary, ApiaryCreate, ApiaryUpdate,
     Hive, HiveCreate, HiveUpdate,
     QueenBee, QueenBeeCreate, QueenBeeUpdate,
     Event, EventCreate,
-    TelemetryReading
+    TelemetryReading, TelemetryPoint, TelemetrySeries, HiveReadings
 )
 from middleware.auth import get_current_user_id, get_optional_user_id
+from services import ConnectionManager, ReplayBuffer, LatestReadingCache, FrameEncoder, lttb, export_encoder
 
 router = APIRouter(tags=["bee management"])
 
@@ -31,30 +38,15 @@ router = APIRouter(tags=["bee management"])
 pg_pool = None  # PostgreSQL for relational data (apiaries, hives, queens, events)
 ts_pool = None  # TimescaleDB for time-series data (telemetry readings)
 
-# WebSocket connections manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, List[WebSocket]] = {}
-    
-    async def connect(self, websocket: WebSocket, hive_id: str):
-        await websocket.accept()
-        if hive_id not in self.active_connections:
-            self.active_connections[hive_id] = []
-        self.active_connections[hive_id].append(websocket)
-    
-    def disconnect(self, websocket: WebSocket, hive_id: str):
-        if hive_id in self.active_connections:
-            self.active_connections[hive_id].remove(websocket)
-    
-    async def broadcast(self, hive_id: str, message: dict):
-        if hive_id in self.active_connections:
-            for connection in self.active_connections[hive_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    pass
+# NOTIFY channel the telemetry consumer listens on to keep its device cache current
+HIVE_DEVICES_CHANNEL = "hive_devices"
 
+# WebSocket connections manager (per-connection send queues, see services/connection_manager.py)
 manager = ConnectionManager()
+# Recent live readings per watched device, for resuming streams after a reconnect
+replay = ReplayBuffer()
+# Newest readings of recently read devices, kept current by the live telemetry stream
+latest = LatestReadingCache()
 
 
 def set_db_pools(postgres_pool, timescale_pool):
@@ -64,6 +56,117 @@ def set_db_pools(postgres_pool, timescale_pool):
     ts_pool = timescale_pool
 
 
+# ==================== PAGINATION ====================
+# List endpoints page newest first on (time column, id) when given ?limit=;
+# without it they return every row, as they always have. The body stays a
+# plain list; the X-Next-Cursor header holds the cursor of the next page and
+# is left out on the last one. Each page is one index range scan, however deep.
+
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", 1000))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_cursor(*key) -> str:
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, size: int) -> list:
+    """Cursor values ([time] or [time, id]); 400 if the cursor is not one we issued"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("wrong cursor size")
+        values[0] = datetime.fromisoformat(values[0])
+        if size == 2 and not isinstance(values[1], int):
+            raise ValueError("cursor id must be an integer")
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _db_time(value: datetime, naive: bool) -> datetime:
+    """PostgreSQL TIMESTAMP columns take naive UTC times, TimescaleDB TIMESTAMPTZ aware ones"""
+    if naive:
+        return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class Page:
+    """
+    Pagination query parameters: ?limit=&cursor=&from=&to= (from inclusive,
+    to exclusive). Paging is opt-in: without a limit every row in range is
+    returned and there is no next cursor.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_LIMIT),
+        cursor: Optional[str] = None,
+        from_: Optional[datetime] = Query(None, alias="from"),
+        to: Optional[datetime] = None
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.start = from_
+        self.end = to
+
+    def query(self, params: list, time_column: str, id_column: Optional[str] = None, naive: bool = True) -> str:
+        """
+        Range conditions (each starting with AND) plus ORDER BY and LIMIT for
+        this page, appending their values to params. Fetches one row more than
+        the limit so result() knows whether there is a next page.
+        """
+        def param(value):
+            params.append(_db_time(value, naive) if isinstance(value, datetime) else value)
+            return f"${len(params)}"
+        
+        conditions = []
+        if self.start:
+            conditions.append(f"{time_column} >= {param(self.start)}")
+        if self.end:
+            conditions.append(f"{time_column} < {param(self.end)}")
+        if self.cursor:
+            key = _decode_cursor(self.cursor, 2 if id_column else 1)
+            time = param(key[0])
+            if id_column:
+                # Written so the time bound is an index condition; id only breaks ties
+                conditions.append(
+                    f"{time_column} <= {time} AND ({time_column} < {time} OR {id_column} < {param(key[1])})"
+                )
+            else:
+                conditions.append(f"{time_column} < {time}")
+        
+        order = f"{time_column} DESC, {id_column} DESC" if id_column else f"{time_column} DESC"
+        query = "".join(f" AND {condition}" for condition in conditions) + f" ORDER BY {order}"
+        if self.limit is not None:
+            query += f" LIMIT {param(self.limit + 1)}"
+        return query
+
+    def result(self, response: Response, rows: list, time_key: str, id_key: Optional[str] = None) -> list:
+        """Trim the extra row and, if there was one, point X-Next-Cursor past the last row"""
+        if self.limit is None or len(rows) <= self.limit:
+            return rows
+        rows = rows[:self.limit]
+        last = rows[-1]
+        key = (last[time_key], last[id_key]) if id_key else (last[time_key],)
+        response.headers[NEXT_CURSOR_HEADER] = _encode_cursor(*key)
+        return rows
+
+
+class TelemetryPage(Page):
+    """Page of readings; keeps the endpoint's historical default of 100"""
+
+    def __init__(
+        self,
+        limit: int = Query(100, ge=1, le=LIST_MAX_LIMIT),
+        cursor: Optional[str] = None,
+        from_: Optional[datetime] = Query(None, alias="from"),
+        to: Optional[datetime] = None
+    ):
+        super().__init__(limit, cursor, from_, to)
+
+
 # ==================== APIARY ENDPOINTS ====================
 
 @router.post("/apiaries", response_model=Apiary)
@@ -86,15 +189,18 @@ async def create_apiary(
 
 
 @router.get("/apiaries", response_model=List[Apiary])
-async def get_apiaries(user_id: str = Depends(get_current_user_id)):
-    """Get all apiaries for the authenticated user"""
+async def get_apiaries(
+    response: Response,
+    page: Page = Depends(),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get the authenticated user's apiaries, newest first (paginated)"""
+    params = [user_id]
+    query = "SELECT * FROM apiaries WHERE user_id = $1" + page.query(params, "created_at", "id")
     async with pg_pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT * FROM apiaries WHERE user_id = $1 ORDER BY created_at DESC",
-            user_id
-        )
+        rows = await conn.fetch(query, *params)
         
-        return [Apiary(**dict(row)) for row in rows]
+        return [Apiary(**dict(row)) for row in page.result(response, rows, "created_at", "id")]
 
 
 @router.get("/apiaries/{apiary_id}", response_model=Apiary)
@@ -175,12 +281,27 @@ async def delete_apiary(
         if not existing:
             raise HTTPException(status_code=404, detail="Apiary not found")
         
-        await conn.execute("DELETE FROM apiaries WHERE id = $1", apiary_id)
+        # Hives are removed by ON DELETE CASCADE; collect their devices first
+        devices = await conn.fetch("SELECT device_id FROM hives WHERE apiary_id = $1", apiary_id)
+        
+        async with conn.transaction():
+            await conn.execute("DELETE FROM apiaries WHERE id = $1", apiary_id)
+            for device in devices:
+                await _notify_hive_devices(conn, "delete", device['device_id'])
+        
         return {"message": "Apiary deleted successfully"}
 
 
 # ==================== HIVE ENDPOINTS ====================
 
+async def _notify_hive_devices(conn, op: str, device_id: str, old_device_id: Optional[str] = None):
+    """Tell the telemetry consumer that a registered device was added, changed or removed"""
+    payload = {"op": op, "device_id": device_id}
+    if old_device_id is not None:
+        payload["old_device_id"] = old_device_id
+    await conn.execute("SELECT pg_notify($1, $2)", HIVE_DEVICES_CHANNEL, json.dumps(payload))
+
+
 async def _verify_apiary_ownership(conn, apiary_id: int, user_id: str):
     """Helper to verify apiary belongs to user"""
     apiary = await conn.fetchrow(
@@ -223,14 +344,16 @@ async def create_hive(
         if existing:
             raise HTTPException(status_code=400, detail="Device ID already registered")
         
-        row = await conn.fetchrow(
-            """
-            INSERT INTO hives (device_id, name, apiary_id)
-            VALUES ($1, $2, $3)
-            RETURNING id, device_id, name, apiary_id, current_queen_id, created_at, updated_at
-            """,
-            hive.device_id, hive.name, apiary_id
-        )
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                """
+                INSERT INTO hives (device_id, name, apiary_id)
+                VALUES ($1, $2, $3)
+                RETURNING id, device_id, name, apiary_id, current_queen_id, created_at, updated_at
+                """,
+                hive.device_id, hive.name, apiary_id
+            )
+            await _notify_hive_devices(conn, "insert", row['device_id'])
         
         return Hive(**dict(row))
 
@@ -238,36 +361,39 @@ async def create_hive(
 @router.get("/apiaries/{apiary_id}/hives", response_model=List[Hive])
 async def get_hives_by_apiary(
     apiary_id: int,
+    response: Response,
+    page: Page = Depends(),
     user_id: str = Depends(get_current_user_id)
 ):
-    """Get all hives for an apiary (apiary must belong to authenticated user)"""
+    """Get the hives of an apiary, newest first (apiary must belong to authenticated user; paginated)"""
+    params = [apiary_id]
+    query = "SELECT * FROM hives WHERE apiary_id = $1" + page.query(params, "created_at", "id")
     async with pg_pool.acquire() as conn:
         # Verify apiary ownership
         await _verify_apiary_ownership(conn, apiary_id, user_id)
         
-        rows = await conn.fetch(
-            "SELECT * FROM hives WHERE apiary_id = $1 ORDER BY created_at DESC",
-            apiary_id
-        )
+        rows = await conn.fetch(query, *params)
         
-        return [Hive(**dict(row)) for row in rows]
+        return [Hive(**dict(row)) for row in page.result(response, rows, "created_at", "id")]
 
 
 @router.get("/hives", response_model=List[Hive])
-async def get_all_hives(user_id: str = Depends(get_current_user_id)):
-    """Get all hives for the authenticated user (across all apiaries)"""
+async def get_all_hives(
+    response: Response,
+    page: Page = Depends(),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get the authenticated user's hives across all apiaries, newest first (paginated)"""
+    params = [user_id]
+    query = """
+        SELECT h.* FROM hives h
+        JOIN apiaries a ON h.apiary_id = a.id
+        WHERE a.user_id = $1
+    """ + page.query(params, "h.created_at", "h.id")
     async with pg_pool.acquire() as conn:
-        rows = await conn.fetch(
-            """
-            SELECT h.* FROM hives h
-            JOIN apiaries a ON h.apiary_id = a.id
-            WHERE a.user_id = $1
-            ORDER BY h.created_at DESC
-            """,
-            user_id
-        )
+        rows = await conn.fetch(query, *params)
         
-        return [Hive(**dict(row)) for row in rows]
+        return [Hive(**dict(row)) for row in page.result(response, rows, "created_at", "id")]
 
 
 @router.get("/hives/{hive_id}", response_model=Hive)
@@ -326,7 +452,11 @@ async def update_hive(
             RETURNING id, device_id, name, apiary_id, current_queen_id, created_at, updated_at
         """
         
-        row = await conn.fetchrow(query, *params)
+        async with conn.transaction():
+            row = await conn.fetchrow(query, *params)
+            if row['device_id'] != existing['device_id']:
+                await _notify_hive_devices(conn, "update", row['device_id'], existing['device_id'])
+        
         return Hive(**dict(row))
 
 
@@ -337,9 +467,12 @@ async def delete_hive(
 ):
     """Delete a hive (must belong to authenticated user)"""
     async with pg_pool.acquire() as conn:
-        await _verify_hive_ownership(conn, hive_id, user_id)
+        hive = await _verify_hive_ownership(conn, hive_id, user_id)
+        
+        async with conn.transaction():
+            await conn.execute("DELETE FROM hives WHERE id = $1", hive_id)
+            await _notify_hive_devices(conn, "delete", hive['device_id'])
         
-        await conn.execute("DELETE FROM hives WHERE id = $1", hive_id)
         return {"message": "Hive deleted successfully"}
 
 
@@ -385,18 +518,19 @@ async def create_queen_bee(
 @router.get("/hives/{hive_id}/queens", response_model=List[QueenBee])
 async def get_hive_queens(
     hive_id: int,
+    response: Response,
+    page: Page = Depends(),
     user_id: str = Depends(get_current_user_id)
 ):
-    """Get all queens for a hive (current and historical)"""
+    """Get the queens of a hive, current and historical, latest introduced first (paginated)"""
+    params = [hive_id]
+    query = "SELECT * FROM queen_bees WHERE hive_id = $1" + page.query(params, "introduced_date", "id")
     async with pg_pool.acquire() as conn:
         # Verify hive ownership
         await _verify_hive_ownership(conn, hive_id, user_id)
         
-        rows = await conn.fetch(
-            "SELECT * FROM queen_bees WHERE hive_id = $1 ORDER BY introduced_date DESC",
-            hive_id
-        )
-        return [QueenBee(**dict(row)) for row in rows]
+        rows = await conn.fetch(query, *params)
+        return [QueenBee(**dict(row)) for row in page.result(response, rows, "introduced_date", "id")]
 
 
 @router.get("/queens/{queen_id}", response_model=QueenBee)
@@ -541,18 +675,20 @@ async def create_hive_event(
 @router.get("/hives/{hive_id}/events", response_model=List[Event])
 async def get_hive_events(
     hive_id: int,
+    response: Response,
+    page: Page = Depends(),
     user_id: str = Depends(get_current_user_id)
 ):
-    """Get all events for a hive (hive must belong to authenticated user)"""
+    """Get the events of a hive, newest first (hive must belong to authenticated user; paginated)"""
+    params = [hive_id]
+    # Served by idx_events_hive_id (hive_id, date DESC)
+    query = "SELECT * FROM events WHERE hive_id = $1" + page.query(params, "date", "id")
     async with pg_pool.acquire() as conn:
         # Verify hive ownership
         await _verify_hive_ownership(conn, hive_id, user_id)
         
-        rows = await conn.fetch(
-            "SELECT * FROM events WHERE hive_id = $1 ORDER BY date DESC",
-            hive_id
-        )
-        return [Event(**dict(row)) for row in rows]
+        rows = await conn.fetch(query, *params)
+        return [Event(**dict(row)) for row in page.result(response, rows, "date", "id")]
 
 
 @router.post("/apiaries/{apiary_id}/events", response_model=Event)
@@ -581,18 +717,20 @@ async def create_apiary_event(
 @router.get("/apiaries/{apiary_id}/events", response_model=List[Event])
 async def get_apiary_events(
     apiary_id: int,
+    response: Response,
+    page: Page = Depends(),
     user_id: str = Depends(get_current_user_id)
 ):
-    """Get all events for an apiary (apiary must belong to authenticated user)"""
+    """Get the events of an apiary, newest first (apiary must belong to authenticated user; paginated)"""
+    params = [apiary_id]
+    # Served by idx_events_apiary_id (apiary_id, date DESC)
+    query = "SELECT * FROM events WHERE apiary_id = $1" + page.query(params, "date", "id")
     async with pg_pool.acquire() as conn:
         # Verify apiary ownership
         await _verify_apiary_ownership(conn, apiary_id, user_id)
         
-        rows = await conn.fetch(
-            "SELECT * FROM events WHERE apiary_id = $1 ORDER BY date DESC",
-            apiary_id
-        )
-        return [Event(**dict(row)) for row in rows]
+        rows = await conn.fetch(query, *params)
+        return [Event(**dict(row)) for row in page.result(response, rows, "date", "id")]
 
 
 @router.delete("/events/{event_id}")
@@ -661,79 +799,721 @@ async def update_event(
 @router.get("/hives/{hive_id}/telemetry", response_model=List[TelemetryReading])
 async def get_hive_telemetry(
     hive_id: int,
-    limit: int = 100,
+    response: Response,
+    page: TelemetryPage = Depends(),
     user_id: str = Depends(get_current_user_id)
 ):
-    """Get recent telemetry readings for a hive (hive must belong to authenticated user)"""
+    """Get telemetry readings for a hive, newest first (hive must belong to authenticated user; paginated)"""
     # Get hive info from PostgreSQL and verify ownership
     async with pg_pool.acquire() as conn:
         hive = await _verify_hive_ownership(conn, hive_id, user_id)
         device_id = hive['device_id']
     
-    # Get telemetry from TimescaleDB
+    # The newest few readings come from memory
+    if page.limit < latest.depth and not (page.cursor or page.start or page.end):
+        rows = await _latest_readings([device_id], page.limit + 1)
+        return [TelemetryReading(**dict(row)) for row in page.result(response, rows[::-1], "time")]
+    
+    # Get telemetry from TimescaleDB; (device_id, time) is unique, so time alone is the key
+    params = [device_id]
+    query = """
+        SELECT time, device_id, temperature, humidity, weight, sound_level
+        FROM readings
+        WHERE device_id = $1
+    """ + page.query(params, "time", naive=False)
     async with ts_pool.acquire() as conn:
-        rows = await conn.fetch(
-            """
-            SELECT time, device_id, temperature, humidity, weight, sound_level
-            FROM readings
-            WHERE device_id = $1
-            ORDER BY time DESC
-            LIMIT $2
-            """,
-            device_id, limit
+        rows = await conn.fetch(query, *params)
+        
+        return [TelemetryReading(**dict(row)) for row in page.result(response, rows, "time")]
+
+
+# Series over arbitrary ranges: never more than SERIES_MAX_POINTS points
+SERIES_FIELDS = ("temperature", "humidity", "weight", "sound_level")
+SERIES_MODES = ("avg", "lttb")
+SERIES_DEFAULT_POINTS = int(os.getenv("SERIES_DEFAULT_POINTS", 500))
+SERIES_MAX_POINTS = int(os.getenv("SERIES_MAX_POINTS", 5000))
+SERIES_DEFAULT_RANGE = timedelta(hours=float(os.getenv("SERIES_DEFAULT_RANGE_HOURS", 24)))
+# LTTB picks its points out of this many times more bucket averages
+SERIES_LTTB_OVERSAMPLE = int(os.getenv("SERIES_LTTB_OVERSAMPLE", 8))
+HOUR = timedelta(hours=1)
+
+SERIES_RAW_SQL = """
+    SELECT time, temperature, humidity, weight, sound_level, 1 AS count
+    FROM readings
+    WHERE device_id = $1 AND time >= $2 AND time < $3
+    ORDER BY time
+    LIMIT $4
+"""
+
+SERIES_BUCKET_SQL = """
+    SELECT time_bucket($4::interval, time) AS time,
+           avg(temperature) AS temperature, avg(humidity) AS humidity,
+           avg(weight) AS weight, avg(sound_level) AS sound_level,
+           count(*) AS count
+    FROM readings
+    WHERE device_id = $1 AND time >= $2 AND time < $3
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+# Hourly averages weighted by their reading counts; includes the hour `from` falls in
+SERIES_HOURLY_SQL = """
+    SELECT time_bucket($4::interval, bucket) AS time,
+           {averages},
+           sum(reading_count)::bigint AS count
+    FROM readings_hourly
+    WHERE device_id = $1 AND bucket > $2 - interval '1 hour' AND bucket < $3
+    GROUP BY 1
+    ORDER BY 1
+""".format(averages=",\n           ".join(
+    f"sum(avg_{field} * reading_count) / "
+    f"nullif(sum(reading_count) FILTER (WHERE avg_{field} IS NOT NULL), 0) AS {field}"
+    for field in SERIES_FIELDS
+))
+
+
+async def _series_rows(device_id: str, start: datetime, end: datetime, points: int):
+    """
+    At most `points` rows covering [start, end), from the cheapest source:
+    raw readings when there are no more than that, readings_hourly when a
+    point spans an hour or more, otherwise time_bucket over the raw readings.
+    Returns (source, bucket width or None, rows).
+    """
+    # Bucket origins need not line up with start, so a range can touch one
+    # bucket more than it spans
+    width = (end - start) / max(points - 1, 1)
+    width = max(timedelta(seconds=1), timedelta(seconds=-(-width // timedelta(seconds=1))))
+    
+    async with ts_pool.acquire() as conn:
+        if width >= HOUR:
+            width = HOUR * -(-width // HOUR)
+            rows = await conn.fetch(SERIES_HOURLY_SQL, device_id, start, end, width)
+            return "readings_hourly", width, rows
+        
+        # Cheap probe, bounded by points + 1 rows on idx_readings_device_id_time
+        rows = await conn.fetch(SERIES_RAW_SQL, device_id, start, end, points + 1)
+        if len(rows) <= points:
+            return "raw", None, rows
+        rows = await conn.fetch(SERIES_BUCKET_SQL, device_id, start, end, width)
+        return "time_bucket", width, rows
+
+
+@router.get("/hives/{hive_id}/telemetry/series", response_model=TelemetrySeries)
+async def get_hive_telemetry_series(
+    hive_id: int,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    points: int = Query(SERIES_DEFAULT_POINTS, ge=2, le=SERIES_MAX_POINTS),
+    mode: str = "avg",
+    field: str = "temperature",
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Get telemetry for a hive over [from, to) as at most `points` points
+    (default range: the last 24 hours).
+    
+    mode=avg averages the readings of each time bucket. mode=lttb keeps
+    actual bucket values chosen by largest-triangle-three-buckets on `field`,
+    which preserves the peaks and dips of that series.
+    """
+    if mode not in SERIES_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(SERIES_MODES)}")
+    if field not in SERIES_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of: {', '.join(SERIES_FIELDS)}")
+    end = to or datetime.now(timezone.utc)
+    start = from_ or end - SERIES_DEFAULT_RANGE
+    # Timestamps without an offset are UTC
+    end = end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+    start = start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    
+    async with pg_pool.acquire() as conn:
+        hive = await _verify_hive_ownership(conn, hive_id, user_id)
+        device_id = hive['device_id']
+    
+    fetch = points * SERIES_LTTB_OVERSAMPLE if mode == "lttb" else points
+    source, width, rows = await _series_rows(device_id, start, end, fetch)
+    series = [TelemetryPoint(**dict(row)) for row in rows]
+    
+    if mode == "lttb" and len(series) > points:
+        # Points without a value for `field` have no place in its shape
+        series = [point for point in series if getattr(point, field) is not None]
+        kept = lttb(
+            [point.time.timestamp() for point in series],
+            [getattr(point, field) for point in series],
+            points
         )
+        series = [series[i] for i in kept]
+    
+    return TelemetrySeries(
+        hive_id=hive_id,
+        device_id=device_id,
+        start=start,
+        end=end,
+        source=source,
+        mode=mode,
+        bucket_seconds=int(width.total_seconds()) if width else None,
+        points=series
+    )
+
+
+# Bulk export: rows stream from a server-side cursor, one batch in memory at a time
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", 5000))
+
+export_counters = {
+    "active": 0,
+    "completed": 0,
+    "cancelled": 0,
+    "rows": 0,
+}
+
+
+async def _export_stream(hives: list, start: Optional[datetime], end: Optional[datetime], encoder):
+    """
+    Encoded chunks of the readings of (hive_id, device_id) pairs, hive by hive
+    in time order. Each hive is one index range scan on
+    idx_readings_device_id_time.
+
+    When the client goes away Starlette cancels the response and this
+    generator is closed, which rolls back the transaction (closing the
+    cursor) and releases the TimescaleDB connection.
+    """
+    params = []
+    conditions = ["device_id = $2"]
+    if start:
+        conditions.append(f"time >= ${len(params) + 3}")
+        params.append(start)
+    if end:
+        conditions.append(f"time < ${len(params) + 3}")
+        params.append(end)
+    query = f"""
+        SELECT $1::int AS hive_id, time, device_id, temperature, humidity, weight, sound_level
+        FROM readings
+        WHERE {' AND '.join(conditions)}
+        ORDER BY time
+    """
+    
+    export_counters["active"] += 1
+    finished = False
+    try:
+        yield encoder.header()
+        async with ts_pool.acquire() as conn:
+            # Server-side cursors only live inside a transaction
+            async with conn.transaction():
+                for hive_id, device_id in hives:
+                    cursor = await conn.cursor(query, hive_id, device_id, *params)
+                    while True:
+                        rows = await cursor.fetch(EXPORT_BATCH_ROWS)
+                        if not rows:
+                            break
+                        export_counters["rows"] += len(rows)
+                        yield encoder.encode(rows)
+        yield encoder.footer()
+        finished = True
+    finally:
+        export_counters["active"] -= 1
+        export_counters["completed" if finished else "cancelled"] += 1
+
+
+@router.get("/telemetry/export")
+async def export_telemetry(
+    hive_ids: List[int] = Query([]),
+    apiary_id: Optional[int] = None,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    format: str = "ndjson",
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Stream the readings of several hives (?hive_ids=1&hive_ids=2 and/or every
+    hive of ?apiary_id=) over [from, to) as NDJSON, CSV or an Arrow IPC stream.
+    Rows come hive by hive, in time order, and are never held in memory all at once.
+    """
+    try:
+        encoder = export_encoder(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not hive_ids and apiary_id is None:
+        raise HTTPException(status_code=400, detail="Give hive_ids and/or apiary_id")
+    start = _db_time(from_, naive=False) if from_ else None
+    end = _db_time(to, naive=False) if to else None
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    
+    hives, not_found = await _owned_hives(user_id, hive_ids, [] if apiary_id is None else [apiary_id])
+    if not_found["hive_ids"]:
+        raise HTTPException(status_code=404, detail=f"Hives not found: {not_found['hive_ids']}")
+    if not_found["apiary_ids"]:
+        raise HTTPException(status_code=404, detail="Apiary not found")
+    
+    pairs = [(hive_id, device_id) for hive_id, (device_id, _) in sorted(hives.items())]
+    filename = f"telemetry-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.{encoder.extension}"
+    return StreamingResponse(
+        _export_stream(pairs, start, end, encoder),
+        media_type=encoder.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+# Latest readings of many hives: one PostgreSQL and one TimescaleDB round-trip
+LATEST_MAX_LIMIT = int(os.getenv("LATEST_MAX_LIMIT", 100))
+LATEST_MAX_HIVES = int(os.getenv("LATEST_MAX_HIVES", 1000))
+
+
+@router.get("/telemetry/latest", response_model=List[HiveReadings])
+async def get_latest_telemetry(
+    hive_ids: List[int] = Query([]),
+    apiary_id: Optional[int] = None,
+    limit: int = Query(1, ge=1, le=LATEST_MAX_LIMIT),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Latest `limit` readings (newest first) of several hives: ?hive_ids=1&hive_ids=2
+    and/or every hive of ?apiary_id=. Hives without readings get an empty list.
+    """
+    if not hive_ids and apiary_id is None:
+        raise HTTPException(status_code=400, detail="Give hive_ids and/or apiary_id")
+    
+    hives, not_found = await _owned_hives(user_id, hive_ids, [] if apiary_id is None else [apiary_id])
+    if not_found["hive_ids"]:
+        raise HTTPException(status_code=404, detail=f"Hives not found: {not_found['hive_ids']}")
+    if not_found["apiary_ids"]:
+        raise HTTPException(status_code=404, detail="Apiary not found")
+    if len(hives) > LATEST_MAX_HIVES:
+        raise HTTPException(status_code=400, detail=f"At most {LATEST_MAX_HIVES} hives per request")
+    
+    readings = {device_id: [] for device_id, _ in hives.values()}
+    for row in await _latest_readings(list(readings), limit):
+        readings[row['device_id']].append(TelemetryReading(**dict(row)))
+    
+    return [
+        HiveReadings(hive_id=hive_id, device_id=device_id, readings=readings[device_id][::-1])
+        for hive_id, (device_id, _) in sorted(hives.items())
+    ]
+
+
+# ==================== LIVE STREAM CURSORS ====================
+# Every pushed reading carries "cursor": its time in epoch microseconds.
+# Clients reconnect with since=<last cursor> and receive only what they missed,
+# from the replay buffer or, when that does not reach back far enough, from a
+# bounded TimescaleDB range query, plus the live readings not stored yet.
+# Late readings (older than ones already sent) come from the buffer; the
+# database cannot tell them apart, so a range that may miss some is reported
+# as incomplete.
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+WS_GAP_FILL_LIMIT = int(os.getenv("WS_GAP_FILL_LIMIT", 1000))
+WS_GAP_FILL_MAX_AGE = timedelta(hours=float(os.getenv("WS_GAP_FILL_MAX_AGE_HOURS", 24)))
+
+
+def _cursor(time: datetime) -> int:
+    """Stream cursor (epoch microseconds) of a reading time"""
+    return (time - EPOCH) // timedelta(microseconds=1)
+
+
+def _reading_message(row, hive_id: Optional[int] = None) -> dict:
+    """A database row shaped like a live reading message"""
+    message = TelemetryReading(**dict(row)).model_dump(mode="json")
+    message["cursor"] = _cursor(row['time'])
+    if hive_id is not None:
+        message["hive_id"] = hive_id
+    return message
+
+
+async def _gap_fill(since_by_device: dict) -> tuple:
+    """
+    Readings after each device's cursor, oldest first.
+
+    Returns (messages by device, devices whose gap could not be filled
+    completely). Those are devices whose cursor is older than
+    WS_GAP_FILL_MAX_AGE, that have more than WS_GAP_FILL_LIMIT readings
+    to catch up on, or that may have had late readings the range misses.
+    Their clients should reload history instead.
+    """
+    filled = {}
+    from_db = {}
+    for device_id, since in since_by_device.items():
+        buffered = replay.since(device_id, since)
+        if buffered is None:
+            from_db[device_id] = since
+        else:
+            filled[device_id] = buffered
+    
+    incomplete = set()
+    if from_db:
+        oldest = datetime.now(timezone.utc) - WS_GAP_FILL_MAX_AGE
+        starts = []
+        for device_id, since in from_db.items():
+            if replay.late_before(device_id, since):
+                incomplete.add(device_id)
+            start = EPOCH + timedelta(microseconds=since)
+            if start < oldest:
+                start = oldest
+                incomplete.add(device_id)
+            starts.append(start)
         
-        return [TelemetryReading(**dict(row)) for row in rows]
+        async with ts_pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT r.time, r.device_id, r.temperature, r.humidity, r.weight, r.sound_level
+                FROM unnest($1::text[], $2::timestamptz[]) AS d(device_id, since)
+                CROSS JOIN LATERAL (
+                    SELECT time, device_id, temperature, humidity, weight, sound_level
+                    FROM readings
+                    WHERE readings.device_id = d.device_id AND readings.time > d.since
+                    ORDER BY time
+                    LIMIT $3
+                ) r
+                ORDER BY r.device_id, r.time
+                """,
+                list(from_db), starts, WS_GAP_FILL_LIMIT
+            )
+        for device_id in from_db:
+            filled[device_id] = []
+        for row in rows:
+            filled[row['device_id']].append(_reading_message(row))
+        incomplete.update(d for d in from_db if len(filled[d]) >= WS_GAP_FILL_LIMIT)
+        
+        # Live readings are published before they are stored: add the ones
+        # the consumer has not flushed yet
+        for device_id, since in from_db.items():
+            if device_id in incomplete:
+                continue
+            stored = {message["cursor"] for message in filled[device_id]}
+            unstored = [
+                message for message in map(_reading_message, latest.recent(device_id, since))
+                if message["cursor"] not in stored
+            ]
+            if unstored:
+                filled[device_id] = sorted(filled[device_id] + unstored, key=lambda message: message["cursor"])
+    
+    return filled, incomplete
+
+
+# Live reading frames: JSON text (default) or binary, see services/ws_codec.py
+WS_FORMATS = ("json", "binary")
+WS_MAX_BATCH_MS = 1000
+
+
+def _frame_encoder(format: str, batch_ms: int) -> Optional[FrameEncoder]:
+    """Encoder for ?format=binary (None for JSON); raises ValueError on bad options"""
+    if format not in WS_FORMATS:
+        raise ValueError(f"Unknown format '{format}'. Use one of: {', '.join(WS_FORMATS)}")
+    if not 0 <= batch_ms <= WS_MAX_BATCH_MS:
+        raise ValueError(f"batch_ms must be between 0 and {WS_MAX_BATCH_MS}")
+    if format == "json":
+        return None
+    return FrameEncoder(batch_ms)
+
+
+def _hello(websocket: WebSocket, encoder: Optional[FrameEncoder]):
+    """Tell binary clients the frame version before any binary frame arrives"""
+    if encoder is not None:
+        manager.send(websocket, {"type": "hello", "format": "binary", "version": encoder.version})
 
 
 @router.websocket("/ws/hive/{hive_id}/telemetry")
-async def websocket_telemetry(websocket: WebSocket, hive_id: int):
-    """WebSocket endpoint for real-time telemetry"""
+async def websocket_telemetry(
+    websocket: WebSocket,
+    hive_id: int,
+    since: Optional[int] = Query(None),
+    token: Optional[str] = Query(None),
+    format: str = Query("json"),
+    batch_ms: int = Query(0),
+):
+    """
+    WebSocket endpoint for real-time telemetry.
+    
+    Sends the last 10 readings on connect or, with ?since=<cursor>, only the
+    readings after that cursor. Resuming reads up to WS_GAP_FILL_MAX_AGE of
+    history, so it needs the hive owner's ?token= (or Authorization header).
+    With ?format=binary live readings arrive as binary frames (batched over
+    ?batch_ms=), everything else stays JSON.
+    """
+    try:
+        encoder = _frame_encoder(format, batch_ms)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    
+    user_id = None
+    if since is not None:
+        authorization = websocket.headers.get("authorization") or (f"Bearer {token}" if token else None)
+        try:
+            user_id = await get_current_user_id(authorization)
+        except HTTPException as e:
+            await websocket.close(code=1008, reason=str(e.detail))
+            return
+    
     # Get hive info from PostgreSQL
     async with pg_pool.acquire() as conn:
-        hive = await conn.fetchrow("SELECT * FROM hives WHERE id = $1", hive_id)
+        if user_id is None:
+            hive = await conn.fetchrow("SELECT * FROM hives WHERE id = $1", hive_id)
+        else:
+            try:
+                hive = await _verify_hive_ownership(conn, hive_id, user_id)
+            except HTTPException:
+                hive = None
         if not hive:
             await websocket.close(code=1008, reason="Hive not found")
             return
         
         device_id = hive['device_id']
     
-    await manager.connect(websocket, device_id)
+    await manager.connect(websocket, device_id, hive_pk=hive_id, encoder=encoder)
+    _hello(websocket, encoder)
     
     try:
-        # Send recent readings on connect from TimescaleDB
-        async with ts_pool.acquire() as conn:
-            rows = await conn.fetch(
-                """
-                SELECT time, device_id, temperature, humidity, weight, sound_level
-                FROM readings
-                WHERE device_id = $1
-                ORDER BY time DESC
-                LIMIT 10
-                """,
-                device_id
-            )
-            
-            for row in reversed(rows):
-                reading = TelemetryReading(**dict(row))
-                await websocket.send_json(reading.dict(default=str))
+        # Subscribed before catching up, so live readings that arrive meanwhile
+        # may repeat the last catch-up rows: clients skip cursors they have seen
+        if since is not None:
+            filled, incomplete = await _gap_fill({device_id: since})
+            for message in filled[device_id]:
+                manager.send(websocket, {**message, "hive_id": hive_id}, key=device_id)
+            if incomplete:
+                manager.send(websocket, {"type": "resync", "hive_id": hive_id})
+        else:
+            # Send recent readings on connect (from the latest-reading cache when it has them)
+            rows = await _latest_readings([device_id], 10)
+            for row in rows:
+                manager.send(websocket, _reading_message(row, hive_id), key=device_id)
         
         # Keep connection alive and wait for messages
         while True:
             try:
                 data = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
             except asyncio.TimeoutError:
-                await websocket.send_json({"type": "ping"})
+                manager.send(websocket, {"type": "ping"})
                 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, device_id)
         print(f"WebSocket disconnected for device {device_id}")
     except Exception as e:
         print(f"WebSocket error: {e}")
+    finally:
         manager.disconnect(websocket, device_id)
 
 
-# Function to broadcast telemetry (called by telemetry consumer)
+# Multiplexed stream: one socket, many hives
+WS_MAX_SUBSCRIPTIONS = int(os.getenv("WS_MAX_SUBSCRIPTIONS", 1000))
+WS_HISTORY_LIMIT = int(os.getenv("WS_HISTORY_LIMIT", 10))
+
+
+async def _owned_hives(user_id: str, hive_ids: List[int], apiary_ids: List[int]):
+    """Resolve requested hives and apiaries to the user's hives in one query"""
+    async with pg_pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT a.id AS apiary_id, h.id AS hive_id, h.device_id
+            FROM apiaries a
+            LEFT JOIN hives h ON h.apiary_id = a.id
+            WHERE a.user_id = $1 AND (a.id = ANY($3::int[]) OR h.id = ANY($2::int[]))
+            """,
+            user_id, hive_ids, apiary_ids
+        )
+    requested_hives = set(hive_ids)
+    requested_apiaries = set(apiary_ids)
+    hives = {
+        row['hive_id']: (row['device_id'], row['apiary_id'])
+        for row in rows
+        if row['hive_id'] is not None
+        and (row['hive_id'] in requested_hives or row['apiary_id'] in requested_apiaries)
+    }
+    found_apiaries = {row['apiary_id'] for row in rows}
+    not_found = {
+        "hive_ids": sorted(requested_hives - hives.keys()),
+        "apiary_ids": sorted(requested_apiaries - found_apiaries),
+    }
+    return hives, not_found
+
+
+async def _latest_rows(device_ids: List[str], limit: int) -> list:
+    """
+    Last `limit` readings of every device in one TimescaleDB query, oldest
+    first per device. One short backward scan of idx_readings_device_id_time
+    per device.
+    """
+    if not device_ids or limit <= 0:
+        return []
+    async with ts_pool.acquire() as conn:
+        return await conn.fetch(
+            """
+            SELECT r.time, r.device_id, r.temperature, r.humidity, r.weight, r.sound_level
+            FROM unnest($1::text[]) AS d(device_id)
+            CROSS JOIN LATERAL (
+                SELECT time, device_id, temperature, humidity, weight, sound_level
+                FROM readings
+                WHERE readings.device_id = d.device_id
+                ORDER BY time DESC
+                LIMIT $2
+            ) r
+            ORDER BY r.device_id, r.time
+            """,
+            list(device_ids), limit
+        )
+
+
+async def _latest_readings(device_ids: List[str], limit: int) -> list:
+    """_latest_rows, served from the latest-reading cache when `limit` fits in it"""
+    if limit > latest.depth:
+        return await _latest_rows(device_ids, limit)
+    return await latest.get_many(device_ids, limit, _latest_rows)
+
+
+async def _recent_readings(hives: dict, limit: int) -> list:
+    """Last `limit` readings of every hive as stream messages, oldest first per hive"""
+    hive_by_device = {device_id: hive_id for hive_id, (device_id, _) in hives.items()}
+    rows = await _latest_readings(list(hive_by_device), limit)
+    return [_reading_message(row, hive_by_device[row['device_id']]) for row in rows]
+
+
+def _since_map(message: dict, hive_ids: List[int]) -> dict:
+    """Parse "since": one cursor for all hive_ids, or {"<hive_id>": cursor}"""
+    since = message.get("since")
+    if since is None:
+        return {}
+    if isinstance(since, int):
+        return {hive_id: since for hive_id in hive_ids}
+    if isinstance(since, dict):
+        try:
+            parsed = {int(hive_id): cursor for hive_id, cursor in since.items()}
+        except ValueError:
+            parsed = None
+        if parsed is not None and all(isinstance(cursor, int) for cursor in parsed.values()):
+            return parsed
+    raise ValueError("'since' must be a cursor or an object of hive id -> cursor")
+
+
+def _id_list(message: dict, field: str) -> List[int]:
+    values = message.get(field) or []
+    if not isinstance(values, list) or not all(isinstance(v, int) for v in values):
+        raise ValueError(f"'{field}' must be a list of integers")
+    return values
+
+
+@router.websocket("/ws/telemetry")
+async def websocket_telemetry_multiplexed(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    format: str = Query("json"),
+    batch_ms: int = Query(0),
+):
+    """
+    WebSocket endpoint for real-time telemetry of many hives on one connection.
+
+    Authenticate with ?token=<Firebase ID token> (browsers cannot set headers
+    on WebSockets) or an Authorization header. Then send:
+        {"type": "subscribe", "hive_ids": [1, 2], "apiary_ids": [3]}
+        {"type": "unsubscribe", "hive_ids": [2], "apiary_ids": [3]}
+    Every subscribe is answered with a "subscribed" message and one "history"
+    message holding the recent readings of all newly subscribed hives. Live
+    readings follow as {"type": "reading", "hive_id": ..., "cursor": ..., ...}.
+    To resume after a reconnect, add "since": <cursor> (or {"<hive_id>": cursor})
+    to the subscribe; history then holds only the missed readings, and hives
+    listed in "resync_hive_ids" could not be caught up completely.
+    ?format=binary&batch_ms= switches live readings to binary frames, as on
+    the single-hive endpoint.
+    """
+    try:
+        encoder = _frame_encoder(format, batch_ms)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    authorization = websocket.headers.get("authorization") or (f"Bearer {token}" if token else None)
+    try:
+        user_id = await get_current_user_id(authorization)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    await manager.connect(websocket, encoder=encoder)
+    _hello(websocket, encoder)
+    subscriptions = {}  # hive_id -> (device_id, apiary_id)
+    
+    try:
+        while True:
+            try:
+                data = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
+            except asyncio.TimeoutError:
+                manager.send(websocket, {"type": "ping"})
+                continue
+            
+            try:
+                message = json.loads(data)
+                if not isinstance(message, dict):
+                    raise ValueError("Messages must be JSON objects")
+                action = message.get("type")
+                hive_ids = _id_list(message, "hive_ids")
+                apiary_ids = _id_list(message, "apiary_ids")
+                since = _since_map(message, hive_ids)
+            except ValueError as e:
+                manager.send(websocket, {"type": "error", "detail": str(e)})
+                continue
+            
+            if action == "subscribe":
+                hives, not_found = await _owned_hives(user_id, hive_ids, apiary_ids)
+                new_hives = {
+                    hive_id: hive for hive_id, hive in hives.items() if hive_id not in subscriptions
+                }
+                if len(subscriptions) + len(new_hives) > WS_MAX_SUBSCRIPTIONS:
+                    manager.send(websocket, {
+                        "type": "error",
+                        "detail": f"At most {WS_MAX_SUBSCRIPTIONS} hives per connection"
+                    })
+                    continue
+                
+                # Subscribe before loading history so no reading falls in between
+                # (the first live readings may repeat the newest history rows)
+                for hive_id, (device_id, _) in new_hives.items():
+                    manager.subscribe(websocket, device_id, hive_id)
+                subscriptions.update(new_hives)
+                manager.send(websocket, {
+                    "type": "subscribed",
+                    "hive_ids": sorted(new_hives),
+                    "not_found": not_found,
+                })
+                
+                # Hives with a cursor catch up from it, the others get recent history
+                resuming = {hive_id: hive for hive_id, hive in new_hives.items() if hive_id in since}
+                fresh = {hive_id: hive for hive_id, hive in new_hives.items() if hive_id not in since}
+                readings = await _recent_readings(fresh, WS_HISTORY_LIMIT)
+                resync = []
+                if resuming:
+                    filled, incomplete = await _gap_fill(
+                        {device_id: since[hive_id] for hive_id, (device_id, _) in resuming.items()}
+                    )
+                    for hive_id, (device_id, _) in resuming.items():
+                        readings.extend({**m, "hive_id": hive_id} for m in filled[device_id])
+                        if device_id in incomplete:
+                            resync.append(hive_id)
+                manager.send(websocket, {
+                    "type": "history",
+                    "readings": readings,
+                    "resync_hive_ids": sorted(resync),
+                })
+            
+            elif action == "unsubscribe":
+                removed = [
+                    hive_id for hive_id, (_, apiary_id) in subscriptions.items()
+                    if hive_id in hive_ids or apiary_id in apiary_ids
+                ]
+                for hive_id in removed:
+                    device_id, _ = subscriptions.pop(hive_id)
+                    manager.unsubscribe(websocket, device_id)
+                manager.send(websocket, {"type": "unsubscribed", "hive_ids": sorted(removed)})
+            
+            elif action != "pong":
+                manager.send(websocket, {"type": "error", "detail": f"Unknown message type '{action}'"})
+    
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+    finally:
+        manager.disconnect(websocket)
+
+
+# Function to broadcast telemetry (live readings arrive through services.live_telemetry)
 async def broadcast_telemetry(device_id: str, telemetry: dict):
     """Broadcast telemetry to connected WebSocket clients"""
     await manager.broadcast(device_id, telemetry)
@@ -2,49 +2,106 @@
 User Controller
 
 This controller handles user authentication and profile management.
-It uses Firebase Authentication and Firestore for user data.
+User data lives in a user store (services/user_store.py): Firebase
+Authentication and Firestore by default, or memory for benchmarks.
 
-IMPORTANT: This is the ONLY controller that references Firebase directly.
-All other controllers use generic user_id from the auth middleware.
+IMPORTANT: No controller references Firebase directly. The store does,
+and all other controllers use generic user_id from the auth middleware.
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
+from typing import Optional
 from datetime import datetime
 import os
 
-# Firebase imports (isolated to this controller)
-try:
-    from firebase_admin import auth, firestore
-    from config.firebase_config import get_firestore_client, get_auth_client, is_firebase_initialized
-    FIREBASE_AVAILABLE = True
-except ImportError:
-    FIREBASE_AVAILABLE = False
-
-from models import UserCreate, UserLogin, UserUpdate, UserResponse, UserProfile, TokenResponse
+from models import (
+    UserCreate, UserLogin, UserUpdate, UserResponse, TokenResponse,
+    UserBatchRequest, UserLookup, UserBatchResponse
+)
 from middleware.auth import get_current_user_id
+from services.user_store import (
+    create_user_store, UserStore, UserStoreUnavailable, UserStoreTimeout, UserNotFound, EmailAlreadyExists
+)
+from services.profile_cache import ProfileCache
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# One store per worker; its calls never block the event loop
+users: UserStore = create_user_store()
+
+# Recently read profiles, kept current by this worker's writes
+profiles = ProfileCache()
+
+# Clients may keep a profile but must revalidate it (If-None-Match) before use
+PROFILE_CACHE_CONTROL = "private, no-cache"
+
+# Ids per POST /users/batch
+USER_BATCH_MAX = int(os.getenv("USER_BATCH_MAX", 100))
 
-def _get_db():
-    """Get Firestore client"""
-    if not FIREBASE_AVAILABLE or not is_firebase_initialized():
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Firebase service not available"
-        )
-    return get_firestore_client()
 
+def set_user_store(store: UserStore):
+    """Swap the user store (benchmarks, local runs)"""
+    global users
+    users.close()
+    users = store
+    profiles.clear()
 
-def _get_auth():
-    """Get Firebase Auth client"""
-    if not FIREBASE_AVAILABLE or not is_firebase_initialized():
+
+async def _run(call):
+    """Await a user store call; an unconfigured store is a 503, a slow one a 504"""
+    try:
+        return await call
+    except UserStoreUnavailable as e:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Firebase service not available"
+            detail=str(e)
+        )
+    except UserStoreTimeout as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
         )
-    return get_auth_client()
+
+
+async def _load_profile(user_id: str):
+    return await _run(users.get_profile(user_id))
+
+
+async def _load_profiles(user_ids: list):
+    return await _run(users.get_profiles(user_ids))
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(tag.strip() in ("*", etag, f"W/{etag}") for tag in if_none_match.split(","))
+
+
+def _profile_response(request: Request, response: Response, user_id: str, profile: dict, etag: str):
+    """UserResponse carrying its ETag, or 304 if the client already has this version"""
+    headers = {"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return _user_response(user_id, profile)
+
+
+def _user_response(user_id: str, user_data: dict) -> UserResponse:
+    """UserResponse from a stored profile"""
+    # Parse dates
+    created_at = datetime.fromisoformat(user_data.get("created_at", datetime.utcnow().isoformat()))
+    updated_at_str = user_data.get("updated_at")
+    updated_at = datetime.fromisoformat(updated_at_str) if updated_at_str else None
+    
+    return UserResponse(
+        id=user_id,
+        email=user_data.get("email", ""),
+        name=user_data.get("name", ""),
+        phone=user_data.get("phone"),
+        location=user_data.get("location"),
+        created_at=created_at,
+        updated_at=updated_at
+    )
 
 
 @router.post("/register", response_model=TokenResponse)
@@ -60,16 +117,9 @@ async def register_user(user: UserCreate):
     Returns:
         TokenResponse with access_token, user_id, and email
     """
-    auth_client = _get_auth()
-    db = _get_db()
-    
     try:
         # Create Firebase Authentication user
-        firebase_user = auth_client.create_user(
-            email=user.email,
-            password=user.password,
-            display_name=user.name
-        )
+        user_id = await _run(users.create_account(user.email, user.password, user.name))
         
         # Create Firestore user profile document
         user_doc = {
@@ -81,19 +131,22 @@ async def register_user(user: UserCreate):
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        db.collection("users").document(firebase_user.uid).set(user_doc)
+        await _run(users.set_profile(user_id, user_doc))
+        profiles.put(user_id, user_doc)
         
         # Generate custom token for the user
-        custom_token = auth_client.create_custom_token(firebase_user.uid)
+        custom_token = await _run(users.create_token(user_id))
         
         return TokenResponse(
-            access_token=custom_token.decode() if isinstance(custom_token, bytes) else custom_token,
+            access_token=custom_token,
             token_type="bearer",
-            user_id=firebase_user.uid,
+            user_id=user_id,
             email=user.email
         )
         
-    except auth.EmailAlreadyExistsError:
+    except HTTPException:
+        raise
+    except EmailAlreadyExists:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -120,22 +173,22 @@ async def login_user(user: UserLogin):
     Returns:
         User info and instructions for client-side authentication
     """
-    auth_client = _get_auth()
-    
     try:
         # Get user by email to verify they exist
-        firebase_user = auth_client.get_user_by_email(user.email)
+        account = await _run(users.get_account_by_email(user.email))
         
         # Note: Firebase Admin SDK cannot verify passwords
         # The frontend should use Firebase Client SDK for actual login
         return {
             "message": "User exists. Use Firebase Client SDK for authentication.",
-            "user_id": firebase_user.uid,
-            "email": firebase_user.email,
+            "user_id": account["user_id"],
+            "email": account["email"],
             "hint": "Call Firebase signInWithEmailAndPassword() from your client app"
         }
         
-    except auth.UserNotFoundError:
+    except HTTPException:
+        raise
+    except UserNotFound:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
@@ -148,52 +201,44 @@ async def login_user(user: UserLogin):
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_profile(user_id: str = Depends(get_current_user_id)):
+async def get_current_user_profile(
+    request: Request,
+    response: Response,
+    user_id: str = Depends(get_current_user_id)
+):
     """
     Get the current authenticated user's profile.
     
     Requires valid Bearer token in Authorization header.
+    Served from the profile cache when possible. The response carries an
+    ETag; send it back in If-None-Match to get 304 if nothing changed.
     
     Returns:
         UserResponse with user profile data
     """
-    db = _get_db()
-    
-    doc = db.collection("users").document(user_id).get()
+    cached = await profiles.get(user_id, _load_profile)
     
-    if not doc.exists:
+    if cached is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User profile not found"
         )
     
-    user_data = doc.to_dict()
-    
-    # Parse dates
-    created_at = datetime.fromisoformat(user_data.get("created_at", datetime.utcnow().isoformat()))
-    updated_at_str = user_data.get("updated_at")
-    updated_at = datetime.fromisoformat(updated_at_str) if updated_at_str else None
-    
-    return UserResponse(
-        id=user_id,
-        email=user_data.get("email", ""),
-        name=user_data.get("name", ""),
-        phone=user_data.get("phone"),
-        location=user_data.get("location"),
-        created_at=created_at,
-        updated_at=updated_at
-    )
+    return _profile_response(request, response, user_id, *cached)
 
 
 @router.put("/me", response_model=UserResponse)
 async def update_current_user_profile(
     user_update: UserUpdate,
+    response: Response,
     user_id: str = Depends(get_current_user_id)
 ):
     """
     Update the current authenticated user's profile.
     
     Requires valid Bearer token in Authorization header.
+    The updated profile is built from the cached (or read) profile and the
+    update, without reading it back.
     
     Args:
         user_update: Fields to update (name, phone, location)
@@ -201,41 +246,52 @@ async def update_current_user_profile(
     Returns:
         Updated UserResponse
     """
-    db = _get_db()
-    auth_client = _get_auth()
+    # Build update data (only include non-None fields)
+    update_data = user_update.dict(exclude_unset=True)
+    update_data["updated_at"] = datetime.utcnow().isoformat()
+    
+    if not update_data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No fields to update"
+        )
     
     # Check if user exists
-    doc_ref = db.collection("users").document(user_id)
-    doc = doc_ref.get()
+    cached = await profiles.get(user_id, _load_profile)
     
-    if not doc.exists:
+    if cached is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User profile not found"
         )
     
-    # Build update data (only include non-None fields)
-    update_data = user_update.dict(exclude_unset=True)
-    update_data["updated_at"] = datetime.utcnow().isoformat()
-    
-    if not update_data:
+    # Update Firestore document (fails if the profile is gone after all)
+    try:
+        await _run(users.update_profile(user_id, update_data))
+    except UserNotFound:
+        profiles.evict(user_id)
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No fields to update"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User profile not found"
         )
+    except HTTPException:
+        # The write may or may not have happened
+        profiles.evict(user_id)
+        raise
     
-    # Update Firestore document
-    doc_ref.update(update_data)
+    user_data = {**cached[0], **update_data}
+    etag = profiles.put(user_id, user_data)
     
     # If name was updated, also update Firebase Auth display name
     if user_update.name:
         try:
-            auth_client.update_user(user_id, display_name=user_update.name)
+            await users.set_display_name(user_id, user_update.name)
         except Exception:
             pass  # Non-critical, Firestore is source of truth
     
     # Return updated profile
-    return await get_current_user_profile(user_id)
+    response.headers.update({"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL})
+    return _user_response(user_id, user_data)
 
 
 @router.delete("/me")
@@ -255,19 +311,20 @@ async def delete_current_user(user_id: str = Depends(get_current_user_id)):
     Returns:
         Success message
     """
-    db = _get_db()
-    auth_client = _get_auth()
-    
     try:
         # Delete Firestore profile
-        db.collection("users").document(user_id).delete()
+        profiles.evict(user_id)
+        await _run(users.delete_profile(user_id))
+        profiles.evict(user_id)
         
         # Delete Firebase Authentication user
-        auth_client.delete_user(user_id)
+        await _run(users.delete_account(user_id))
         
         return {"message": "User account deleted successfully"}
         
-    except auth.UserNotFoundError:
+    except HTTPException:
+        raise
+    except UserNotFound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
@@ -279,15 +336,51 @@ async def delete_current_user(user_id: str = Depends(get_current_user_id)):
         )
 
 
+@router.post("/batch", response_model=UserBatchResponse)
+async def get_users_batch(
+    batch: UserBatchRequest,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Look up many users' public profiles at once.
+    
+    Requires authentication. Cached profiles are served from the profile
+    cache; the rest are read in a single store call.
+    
+    Args:
+        batch: User IDs to look up (at most USER_BATCH_MAX, default 100)
+        
+    Returns:
+        UserBatchResponse with one entry per requested ID, in the requested
+        order: found with the profile, or found=false
+    """
+    if len(batch.ids) > USER_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {USER_BATCH_MAX} user IDs per request"
+        )
+    
+    # Ids the store cannot hold (e.g. not valid Firestore document ids) come back not found
+    cached = await profiles.get_many(batch.ids, _load_profiles) if batch.ids else {}
+    
+    return UserBatchResponse(users=[
+        UserLookup(id=user_id, found=True, user=_user_response(user_id, cached[user_id][0]))
+        if cached.get(user_id) else UserLookup(id=user_id, found=False)
+        for user_id in batch.ids
+    ])
+
+
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user_by_id(
     user_id: str,
+    request: Request,
+    response: Response,
     current_user_id: str = Depends(get_current_user_id)
 ):
     """
     Get a user's public profile by ID.
     
-    Requires authentication.
+    Requires authentication. Cached and revalidated like GET /users/me.
     
     Args:
         user_id: The user ID to look up
@@ -295,29 +388,12 @@ async def get_user_by_id(
     Returns:
         UserResponse with user profile data
     """
-    db = _get_db()
+    cached = await profiles.get(user_id, _load_profile)
     
-    doc = db.collection("users").document(user_id).get()
-    
-    if not doc.exists:
+    if cached is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    user_data = doc.to_dict()
-    
-    # Parse dates
-    created_at = datetime.fromisoformat(user_data.get("created_at", datetime.utcnow().isoformat()))
-    updated_at_str = user_data.get("updated_at")
-    updated_at = datetime.fromisoformat(updated_at_str) if updated_at_str else None
-    
-    return UserResponse(
-        id=user_id,
-        email=user_data.get("email", ""),
-        name=user_data.get("name", ""),
-        phone=user_data.get("phone"),
-        location=user_data.get("location"),
-        created_at=created_at,
-        updated_at=updated_at
-    )
+    return _profile_response(request, response, user_id, *cached)
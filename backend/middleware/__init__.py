@@ -1,9 +1,15 @@
 # Middleware module
-from .auth import get_current_user_id, get_optional_user_id, CurrentUser, OptionalUser
+from .auth import (
+    get_current_user_id, get_optional_user_id, auth_stats,
+    start_verifier, stop_verifier, CurrentUser, OptionalUser
+)
 
 __all__ = [
     "get_current_user_id",
     "get_optional_user_id", 
+    "auth_stats",
+    "start_verifier",
+    "stop_verifier",
     "CurrentUser",
     "OptionalUser"
 ]
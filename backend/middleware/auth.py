@@ -4,11 +4,26 @@ Authentication Middleware
 This module handles token verification and user extraction.
 Currently uses Firebase, but can be swapped for any auth provider.
 The interface remains the same: extracts user_id from authorization header.
+
+Tokens are verified by firebase-admin (AUTH_VERIFIER=firebase, default) or
+in-process against cached public keys (AUTH_VERIFIER=local, see
+jwt_verifier.py). Either way decoded tokens are cached.
 """
 
 from fastapi import Depends, HTTPException, Header, status
 from typing import Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
+import asyncio
+import functools
+
+from .token_cache import TokenCache
+from .jwt_verifier import (
+    JwtVerifier, GoogleKeySource, LocalKeySource, project_id_from_env,
+    TokenError, ExpiredTokenError, KeysUnavailableError, LOCAL_VERIFIER_AVAILABLE
+)
 
 # Import Firebase auth (this is the only place outside user_controller that uses Firebase)
 try:
@@ -18,6 +33,149 @@ except ImportError:
     FIREBASE_AVAILABLE = False
 
 
+# Revocation checks (each one is a round-trip to Firebase):
+#   off    - signature and claims only (default)
+#   cached - checked when a token is verified; cached tokens are re-verified
+#            after AUTH_REVOCATION_TTL seconds, so a revocation takes effect within that
+#   always - checked on every request, bypassing the cache
+AUTH_REVOCATION_MODES = ("off", "cached", "always")
+AUTH_CHECK_REVOKED = os.getenv("AUTH_CHECK_REVOKED", "off")
+if AUTH_CHECK_REVOKED not in AUTH_REVOCATION_MODES:
+    raise ValueError(
+        f"Unknown AUTH_CHECK_REVOKED '{AUTH_CHECK_REVOKED}'. Use one of: {', '.join(AUTH_REVOCATION_MODES)}"
+    )
+AUTH_REVOCATION_TTL = float(os.getenv("AUTH_REVOCATION_TTL", 60))
+
+# firebase - firebase-admin's verify_id_token, in a thread pool
+# local    - signature and claims checked in-process against cached public keys:
+#            Google's certificates, or the keys in AUTH_KEY_FILE
+AUTH_VERIFIERS = ("firebase", "local")
+AUTH_VERIFIER = os.getenv("AUTH_VERIFIER", "firebase")
+if AUTH_VERIFIER not in AUTH_VERIFIERS:
+    raise ValueError(f"Unknown AUTH_VERIFIER '{AUTH_VERIFIER}'. Use one of: {', '.join(AUTH_VERIFIERS)}")
+if AUTH_VERIFIER == "local" and AUTH_CHECK_REVOKED != "off":
+    raise ValueError("Revocation checks need Firebase: use AUTH_VERIFIER=firebase or AUTH_CHECK_REVOKED=off")
+AUTH_KEY_FILE = os.getenv("AUTH_KEY_FILE")
+
+# Verification is CPU work (and now and then a certificate fetch): keep it off the event loop
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AUTH_VERIFY_THREADS", 4)), thread_name_prefix="auth-verify"
+)
+_token_cache = TokenCache()
+_local_verifier = None
+_key_refresh_task = None
+# Verifications in progress, so concurrent requests with one token share a verification
+_inflight: dict = {}
+_verify_latency = deque(maxlen=4096)
+_counters = {
+    "verifications": 0,
+    "failures": 0,
+    "shared": 0,  # Cache misses that waited on a verification already in progress
+}
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 2)
+
+
+async def start_verifier():
+    """Load the local verifier's keys and keep them fresh (no-op for the firebase verifier)"""
+    global _local_verifier, _key_refresh_task
+    if AUTH_VERIFIER != "local":
+        return
+    if not LOCAL_VERIFIER_AVAILABLE:
+        print("⚠ Local token verification needs PyJWT, cryptography and requests")
+        return
+    project_id = project_id_from_env()
+    if not project_id:
+        print("⚠ Local token verification needs FIREBASE_PROJECT_ID (or a service account key file)")
+        return
+    
+    source = LocalKeySource(AUTH_KEY_FILE) if AUTH_KEY_FILE else GoogleKeySource()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, source.refresh)
+        print(f"✓ Local token verification with {len(source.keys)} keys for project '{project_id}'")
+    except Exception as e:
+        # Google's keys are retried in the background; until then requests get 503
+        print(f"⚠ Could not load auth signing keys: {e}")
+    _local_verifier = JwtVerifier(source, project_id)
+    _key_refresh_task = asyncio.create_task(source.run())
+
+
+async def stop_verifier():
+    global _key_refresh_task
+    if _key_refresh_task:
+        _key_refresh_task.cancel()
+        await asyncio.gather(_key_refresh_task, return_exceptions=True)
+        _key_refresh_task = None
+
+
+async def _verify_uncached(token: str) -> dict:
+    started = time.perf_counter()
+    _counters["verifications"] += 1
+    try:
+        if _local_verifier is not None:
+            # Tens of microseconds of CPU: cheaper inline than a thread hop
+            return _local_verifier.verify(token)
+        return await asyncio.get_running_loop().run_in_executor(
+            _executor,
+            functools.partial(auth.verify_id_token, token, check_revoked=AUTH_CHECK_REVOKED != "off")
+        )
+    except Exception:
+        _counters["failures"] += 1
+        raise
+    finally:
+        _verify_latency.append(time.perf_counter() - started)
+
+
+def _verified(key: bytes, verification: asyncio.Future):
+    """Cache a finished verification (from its callback, so a cancelled request does not lose it)"""
+    _inflight.pop(key, None)
+    if verification.cancelled() or verification.exception() is not None:
+        return
+    ttl = AUTH_REVOCATION_TTL if AUTH_CHECK_REVOKED == "cached" else None
+    _token_cache.put(key, verification.result(), ttl)
+
+
+async def _verify_token(token: str) -> dict:
+    """Decoded token from the cache, or verified (firebase: in the thread pool) and cached"""
+    if AUTH_CHECK_REVOKED == "always":
+        return await _verify_uncached(token)
+    
+    key = TokenCache.key(token)
+    decoded = _token_cache.get(key)
+    if decoded is not None:
+        return decoded
+    
+    verification = _inflight.get(key)
+    if verification is None:
+        verification = _inflight[key] = asyncio.ensure_future(_verify_uncached(token))
+        verification.add_done_callback(functools.partial(_verified, key))
+    else:
+        _counters["shared"] += 1
+    # Shielded: one waiter going away must not cancel the others' verification
+    return await asyncio.shield(verification)
+
+
+def auth_stats() -> dict:
+    """Token cache and verification counters, for /metrics"""
+    return {
+        "verifier": AUTH_VERIFIER,
+        "keys": _local_verifier.stats() if _local_verifier else None,
+        "revocation_check": AUTH_CHECK_REVOKED,
+        "cache": _token_cache.stats(),
+        **_counters,
+        "inflight": len(_inflight),
+        "verify_latency_ms": {
+            "p50": _percentile(_verify_latency, 0.50),
+            "p99": _percentile(_verify_latency, 0.99),
+        },
+    }
+
+
 async def get_current_user_id(authorization: Optional[str] = Header(None)) -> str:
     """
     Extract user_id from authorization token.
@@ -61,31 +219,30 @@ async def get_current_user_id(authorization: Optional[str] = Header(None)) -> st
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    # Verify token with Firebase
-    if not FIREBASE_AVAILABLE:
+    # Verify token with Firebase (or locally, against Firebase's keys)
+    if (_local_verifier is None) if AUTH_VERIFIER == "local" else not FIREBASE_AVAILABLE:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Authentication service not available"
         )
     
     try:
-        # Verify the ID token
-        decoded_token = auth.verify_id_token(token)
+        # Verify the ID token (cached, off the event loop)
+        decoded_token = await _verify_token(token)
         user_id = decoded_token['uid']
         return user_id
-    except auth.ExpiredIdTokenError:
+    except KeysUnavailableError:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired",
-            headers={"WWW-Authenticate": "Bearer"}
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service not available"
         )
-    except auth.RevokedIdTokenError:
+    except ExpiredTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has been revoked",
+            detail="Token has expired",
             headers={"WWW-Authenticate": "Bearer"}
         )
-    except auth.InvalidIdTokenError:
+    except TokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token",
@@ -94,11 +251,24 @@ async def get_current_user_id(authorization: Optional[str] = Header(None)) -> st
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Token verification failed: {str(e)}",
+            detail=_failure_detail(e),
             headers={"WWW-Authenticate": "Bearer"}
         )
 
 
+def _failure_detail(e: Exception) -> str:
+    """401 detail for a failed verification (firebase-admin's errors only exist when it is installed)"""
+    if FIREBASE_AVAILABLE:
+        # Expired and revoked are subclasses of InvalidIdTokenError: check them first
+        if isinstance(e, auth.ExpiredIdTokenError):
+            return "Token has expired"
+        if isinstance(e, auth.RevokedIdTokenError):
+            return "Token has been revoked"
+        if isinstance(e, auth.InvalidIdTokenError):
+            return "Invalid token"
+    return f"Token verification failed: {str(e)}"
+
+
 async def get_optional_user_id(authorization: Optional[str] = Header(None)) -> Optional[str]:
     """
     Optionally extract user_id from authorization token.
@@ -0,0 +1,232 @@
+"""
+Local JWT Verification
+
+Verifies Firebase ID tokens in-process against cached public keys, so no
+request waits on the network. Keys come from a key source:
+- GoogleKeySource: Google's published securetoken certificates, refreshed
+  in the background as their Cache-Control max-age runs out
+- LocalKeySource: a key file, for tests and air-gapped deployments
+
+Uses PyJWT and cryptography, which firebase-admin already depends on.
+"""
+
+import os
+import re
+import json
+import time
+import base64
+import asyncio
+import binascii
+from typing import Optional
+
+try:
+    import requests
+    from jwt.algorithms import RSAAlgorithm
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import padding
+    LOCAL_VERIFIER_AVAILABLE = True
+except ImportError:
+    LOCAL_VERIFIER_AVAILABLE = False
+
+
+GOOGLE_CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+)
+FIREBASE_ISSUER = "https://securetoken.google.com/{project_id}"
+
+
+class TokenError(Exception):
+    """The token is not a valid ID token for this project"""
+
+
+class ExpiredTokenError(TokenError):
+    pass
+
+
+class KeysUnavailableError(TokenError):
+    """No signing keys could be loaded (a server problem, not the client's)"""
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _load_public_key(pem: str):
+    """Public key from a PEM certificate (Google's format) or a PEM public key"""
+    data = pem.encode()
+    if b"BEGIN CERTIFICATE" in data:
+        return x509.load_pem_x509_certificate(data).public_key()
+    return serialization.load_pem_public_key(data)
+
+
+def _parse_keys(document: dict) -> dict:
+    """{kid: public key} from a JWKS ({"keys": [...]}) or a {kid: PEM} mapping"""
+    if "keys" in document:
+        return {jwk["kid"]: RSAAlgorithm.from_jwk(json.dumps(jwk)) for jwk in document["keys"]}
+    return {kid: _load_public_key(pem) for kid, pem in document.items()}
+
+
+class GoogleKeySource:
+    """Google's certificates for Firebase ID tokens, refreshed per Cache-Control"""
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, min_interval: float = 60, retry_interval: float = 30):
+        self.url = url
+        self.min_interval = min_interval
+        self.retry_interval = retry_interval
+        self.keys: dict = {}
+        self.refreshed_at = None
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._expires_in = min_interval
+        self._wake = None  # Created in run(), on the serving loop
+
+    def refresh(self):
+        """Fetch the certificates (blocking; the refresh loop runs it in a thread)"""
+        response = requests.get(self.url, timeout=10)
+        response.raise_for_status()
+        keys = _parse_keys(response.json())
+        match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        self._expires_in = max(self.min_interval, int(match.group(1))) if match else self.min_interval
+        self.keys = keys
+        self.refreshed_at = time.time()
+        self.refreshes += 1
+
+    def request_refresh(self):
+        """Ask for an early refresh, e.g. on an unknown kid (at most every min_interval)"""
+        if self._wake is None:
+            return
+        if self.refreshed_at is None or time.time() - self.refreshed_at >= self.min_interval:
+            self._wake.set()
+
+    async def run(self):
+        """Refresh whenever the certificates expire (or sooner, on request)"""
+        loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        delay = self._expires_in if self.keys else 0
+        while True:
+            wake = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait((wake,), timeout=delay)
+            finally:
+                wake.cancel()
+            self._wake.clear()
+            try:
+                await loop.run_in_executor(None, self.refresh)
+                delay = self._expires_in
+            except Exception as e:
+                self.refresh_failures += 1
+                print(f"Failed to refresh auth signing keys: {e}")
+                delay = self.retry_interval
+
+    def stats(self) -> dict:
+        return {
+            "source": "google",
+            "keys": len(self.keys),
+            "refreshed_at": self.refreshed_at,
+            "expires_in": self._expires_in,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+class LocalKeySource:
+    """Keys from a JSON file: a JWKS, or {kid: PEM certificate or public key}"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.keys: dict = {}
+
+    def refresh(self):
+        with open(self.path) as f:
+            self.keys = _parse_keys(json.load(f))
+
+    def request_refresh(self):
+        pass
+
+    async def run(self):
+        """Nothing to keep fresh: the file is read at startup"""
+
+    def stats(self) -> dict:
+        return {"source": "file", "path": self.path, "keys": len(self.keys)}
+
+
+class JwtVerifier:
+    """
+    Checks a Firebase ID token the way firebase-admin does, but locally:
+    RS256 signature by a known kid, exp, iat and auth_time (with clock skew),
+    aud = project id, iss = securetoken issuer, non-empty sub.
+    The token is split and decoded once; returns its claims with "uid" set to sub.
+    """
+
+    def __init__(self, key_source, project_id: str, issuer: str = None, clock_skew: float = None):
+        self.key_source = key_source
+        self.project_id = project_id
+        self.issuer = issuer or FIREBASE_ISSUER.format(project_id=project_id)
+        self.clock_skew = clock_skew if clock_skew is not None else float(os.getenv("AUTH_CLOCK_SKEW", 10))
+
+    def verify(self, token: str) -> dict:
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = json.loads(_b64decode(header_segment))
+            claims = json.loads(_b64decode(payload_segment))
+            signature = _b64decode(signature_segment)
+        except (ValueError, binascii.Error):
+            raise TokenError("Malformed token")
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            raise TokenError("Malformed token")
+
+        if header.get("alg") != "RS256":
+            raise TokenError("Unexpected signing algorithm")
+        if not self.key_source.keys:
+            raise KeysUnavailableError("No signing keys loaded")
+        key = self.key_source.keys.get(header.get("kid"))
+        if key is None:
+            self.key_source.request_refresh()
+            raise TokenError("Unknown signing key")
+        try:
+            key.verify(
+                signature,
+                f"{header_segment}.{payload_segment}".encode(),
+                padding.PKCS1v15(),
+                hashes.SHA256()
+            )
+        except InvalidSignature:
+            raise TokenError("Invalid signature")
+
+        now = time.time()
+        try:
+            if now - self.clock_skew >= float(claims["exp"]):
+                raise ExpiredTokenError("Token has expired")
+            if float(claims["iat"]) > now + self.clock_skew:
+                raise TokenError("Token issued in the future")
+            if float(claims.get("auth_time", 0)) > now + self.clock_skew:
+                raise TokenError("Token authenticated in the future")
+        except (KeyError, TypeError, ValueError):
+            raise TokenError("Missing or invalid time claims")
+        if claims.get("aud") != self.project_id:
+            raise TokenError("Wrong audience")
+        if claims.get("iss") != self.issuer:
+            raise TokenError("Wrong issuer")
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise TokenError("Invalid subject")
+
+        claims["uid"] = subject
+        return claims
+
+    def stats(self) -> dict:
+        return self.key_source.stats()
+
+
+def project_id_from_env() -> Optional[str]:
+    """FIREBASE_PROJECT_ID, or the project_id of the service account key file"""
+    project_id = os.getenv("FIREBASE_PROJECT_ID")
+    if project_id:
+        return project_id
+    try:
+        with open(os.getenv("FIREBASE_KEY_PATH", "./firebase-key.json")) as f:
+            return json.load(f).get("project_id")
+    except (OSError, ValueError):
+        return None
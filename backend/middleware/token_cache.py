@@ -0,0 +1,75 @@
+"""
+Verified Token Cache
+
+Remembers decoded ID tokens so a client sending the same token on every
+request is verified once, not per request.
+"""
+
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenCache:
+    """
+    Bounded LRU of decoded tokens keyed by the SHA-256 of the token (raw
+    tokens are never kept). An entry lives for at most `ttl` seconds and
+    never past the token's own `exp`. Failed verifications are not cached.
+    """
+
+    def __init__(self, size: int = None, ttl: float = None):
+        self.size = size or int(os.getenv("AUTH_CACHE_SIZE", 10000))
+        self.ttl = ttl if ttl is not None else float(os.getenv("AUTH_CACHE_TTL", 300))
+        self._entries: OrderedDict = OrderedDict()
+
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+        }
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key: bytes) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        expires_at, decoded = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return decoded
+
+    def put(self, key: bytes, decoded: dict, ttl: float = None):
+        """Cache a decoded token until min(now + ttl, exp)"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        if decoded.get("exp"):
+            expires_at = min(expires_at, float(decoded["exp"]))
+        if expires_at <= time.time():
+            return
+        self._entries[key] = (expires_at, decoded)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            "entries": len(self._entries),
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else None,
+            **self.counters,
+        }
@@ -1,23 +1,25 @@
 from .user_models import (
     UserCreate, UserLogin, UserUpdate, 
-    UserResponse, UserProfile, TokenResponse
+    UserResponse, UserProfile, TokenResponse,
+    UserBatchRequest, UserLookup, UserBatchResponse
 )
 from .bee_models import (
     Apiary, ApiaryCreate, ApiaryUpdate,
     Hive, HiveCreate, HiveUpdate,
     QueenBee, QueenBeeCreate, QueenBeeUpdate,
     Event, EventCreate,
-    TelemetryReading
+    TelemetryReading, TelemetryPoint, TelemetrySeries, HiveReadings
 )
 
 __all__ = [
     # User models
     "UserCreate", "UserLogin", "UserUpdate",
     "UserResponse", "UserProfile", "TokenResponse",
+    "UserBatchRequest", "UserLookup", "UserBatchResponse",
     # Bee management models
     "Apiary", "ApiaryCreate", "ApiaryUpdate",
     "Hive", "HiveCreate", "HiveUpdate",
     "QueenBee", "QueenBeeCreate", "QueenBeeUpdate",
     "Event", "EventCreate",
-    "TelemetryReading"
+    "TelemetryReading", "TelemetryPoint", "TelemetrySeries", "HiveReadings"
 ]
@@ -9,7 +9,7 @@ NO Firebase-specific imports or references should be in this file.
 """
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -141,3 +141,38 @@ class TelemetryReading(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class HiveReadings(BaseModel):
+    """Recent readings of one hive, newest first"""
+    hive_id: int
+    device_id: str
+    readings: List[TelemetryReading]
+
+
+class TelemetryPoint(BaseModel):
+    """One point of a telemetry series: a raw reading or a bucket average"""
+    time: datetime
+    temperature: Optional[float] = None
+    humidity: Optional[float] = None
+    weight: Optional[float] = None
+    sound_level: Optional[float] = None
+    count: int = 1  # Readings behind this point
+
+    class Config:
+        from_attributes = True
+
+
+class TelemetrySeries(BaseModel):
+    """
+    Telemetry of one hive over a time range, downsampled to a bounded number of points.
+    source is "raw", "time_bucket" or "readings_hourly"; mode is "avg" or "lttb".
+    """
+    hive_id: int
+    device_id: str
+    start: datetime
+    end: datetime
+    source: str
+    mode: str
+    bucket_seconds: Optional[int] = None  # None for raw readings
+    points: List[TelemetryPoint]
@@ -6,7 +6,7 @@ They are designed to be auth-provider agnostic (can work with Firebase, Auth0, c
 """
 
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -45,6 +45,23 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 
+class UserBatchRequest(BaseModel):
+    """Model for looking up many users at once"""
+    ids: List[str]
+
+
+class UserLookup(BaseModel):
+    """One requested user: found with its profile, or not found"""
+    id: str
+    found: bool
+    user: Optional[UserResponse] = None
+
+
+class UserBatchResponse(BaseModel):
+    """Model for batch lookup results, in the requested order"""
+    users: List[UserLookup]
+
+
 class UserProfile(BaseModel):
     """Model for user profile data"""
     id: str
@@ -0,0 +1,27 @@
+# Services module
+from .connection_manager import ConnectionManager
+from .live_telemetry import LiveTelemetrySubscriber
+from .replay_buffer import ReplayBuffer
+from .latest_cache import LatestReadingCache
+from .ws_codec import FrameEncoder, FrameDecoder
+from .downsample import lttb
+from .telemetry_export import export_encoder, EXPORT_FORMATS
+from .user_store import UserStore, FirestoreUserStore, MemoryUserStore, create_user_store
+from .profile_cache import ProfileCache
+
+__all__ = [
+    "ConnectionManager",
+    "LiveTelemetrySubscriber",
+    "ReplayBuffer",
+    "LatestReadingCache",
+    "FrameEncoder",
+    "FrameDecoder",
+    "lttb",
+    "export_encoder",
+    "EXPORT_FORMATS",
+    "UserStore",
+    "FirestoreUserStore",
+    "MemoryUserStore",
+    "create_user_store",
+    "ProfileCache"
+]
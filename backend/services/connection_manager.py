@@ -0,0 +1,264 @@
+"""
+WebSocket Connection Manager
+
+Fans telemetry out to WebSocket clients without letting one slow client
+hold up the others.
+"""
+
+import os
+import json
+import asyncio
+from collections import deque
+from typing import Optional
+from fastapi import WebSocket
+
+from .ws_codec import FrameEncoder, MAX_RECORDS
+
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "latest", "disconnect")
+
+
+class ClientConnection:
+    """
+    One WebSocket with a bounded outbound queue drained by its own sender task.
+
+    Queue entries are (key, payload) pairs. For JSON connections the payload
+    is text, serialized once per broadcast and shared by every connection.
+    Connections with a binary FrameEncoder queue live readings as dicts; the
+    sender encodes whatever is queued (optionally after a short batching
+    window) into one delta-encoded frame. Control messages stay JSON text.
+
+    When the queue is full the slow-consumer policy decides what happens:
+    - drop_oldest: the oldest queued message is discarded
+    - latest: queued messages for the same key (device) are discarded, so the
+      client skips straight to the newest reading of that device
+    - disconnect: the socket is closed (1013, try again later) and the client
+      is expected to reconnect and catch up
+    """
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager", encoder: FrameEncoder = None):
+        self.websocket = websocket
+        self.manager = manager
+        self.encoder = encoder
+        self.keys = set()
+        self._queue = deque()
+        self._ready = asyncio.Event()
+        self._closing = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._sender())
+
+    async def stop(self):
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def enqueue(self, key, payload) -> bool:
+        """Queue a message without waiting; False if the client was dropped"""
+        if self._closing:
+            return False
+        if len(self._queue) >= self.manager.queue_size:
+            policy = self.manager.policy
+            self.manager.counters["dropped"] += 1
+            if policy == "disconnect":
+                self._closing = True
+                self._ready.set()
+                return False
+            if policy == "latest" and key is not None:
+                stale = [item for item in self._queue if item[0] == key]
+                for item in stale:
+                    self._queue.remove(item)
+                if not stale:
+                    self._queue.popleft()
+            else:
+                self._queue.popleft()
+        self._queue.append((key, payload))
+        self._ready.set()
+        return True
+
+    async def _sender(self):
+        """Send queued messages in order; any failure removes the connection"""
+        manager = self.manager
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                if self._closing:
+                    manager.counters["disconnected_slow"] += 1
+                    await self.websocket.close(code=1013, reason="Client too slow")
+                    break
+                if self.encoder and self.encoder.batch_window:
+                    await asyncio.sleep(self.encoder.batch_window)
+                while self._queue:
+                    _, payload = self._queue.popleft()
+                    if isinstance(payload, str):
+                        await self._send(payload)
+                        manager.counters["sent"] += 1
+                        continue
+                    # Binary: every reading queued back to back goes into one frame
+                    batch = [payload]
+                    while self._queue and not isinstance(self._queue[0][1], str) and len(batch) < MAX_RECORDS:
+                        batch.append(self._queue.popleft()[1])
+                    await self._send(self.encoder.encode(batch))
+                    manager.counters["sent"] += len(batch)
+                    manager.counters["binary_frames"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            manager.counters["send_failures"] += 1
+        manager._remove(self)
+
+    async def _send(self, data):
+        """Send with a timeout (asyncio.wait, unlike wait_for on 3.11, never swallows a cancel)"""
+        if isinstance(data, bytes):
+            send = asyncio.ensure_future(self.websocket.send_bytes(data))
+        else:
+            send = asyncio.ensure_future(self.websocket.send_text(data))
+        try:
+            done, _ = await asyncio.wait((send,), timeout=self.manager.send_timeout)
+        except asyncio.CancelledError:
+            send.cancel()
+            raise
+        if not done:
+            send.cancel()
+            raise asyncio.TimeoutError("WebSocket send timed out")
+        send.result()
+
+
+class ConnectionManager:
+    """
+    Registry of WebSocket connections by key (device id). A connection can
+    subscribe to any number of keys.
+
+    broadcast() serializes a message once (for the JSON connections) and only
+    enqueues it, so it never waits on a client. Connections whose sends fail
+    or time out are removed.
+    """
+
+    def __init__(self, queue_size: int = None, policy: str = None, send_timeout: float = None):
+        self.queue_size = queue_size or int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+        self.policy = policy or os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+        if self.policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(
+                f"Unknown slow consumer policy '{self.policy}'. "
+                f"Use one of: {', '.join(SLOW_CONSUMER_POLICIES)}"
+            )
+        self.send_timeout = send_timeout or float(os.getenv("WS_SEND_TIMEOUT", 10))
+        self.active_connections: dict[str, set] = {}
+        self._clients: dict[WebSocket, ClientConnection] = {}
+        self._hive_ids: dict[str, int] = {}
+        self._stopping: set = set()  # Senders being stopped (the loop only keeps weak references)
+
+        self.counters = {
+            "broadcasts": 0,
+            "sent": 0,
+            "dropped": 0,
+            "disconnected_slow": 0,
+            "send_failures": 0,
+            "binary_frames": 0,
+            "resyncs": 0,
+        }
+
+    async def connect(self, websocket: WebSocket, hive_id: str = None, hive_pk: int = None,
+                      encoder: FrameEncoder = None):
+        """Accept a WebSocket and register it (subscribed to one key, if given)"""
+        await websocket.accept()
+        self._client(websocket, encoder)
+        if hive_id is not None:
+            self.subscribe(websocket, hive_id, hive_pk)
+
+    def subscribe(self, websocket: WebSocket, key: str, hive_pk: int = None):
+        """Subscribe a connection to a key; hive_pk tags its live messages with the hive id"""
+        client = self._client(websocket)
+        client.keys.add(key)
+        self.active_connections.setdefault(key, set()).add(client)
+        if hive_pk is not None:
+            self._hive_ids[key] = hive_pk
+
+    def unsubscribe(self, websocket: WebSocket, key: str):
+        client = self._clients.get(websocket)
+        if client is None:
+            return
+        client.keys.discard(key)
+        subscribers = self.active_connections.get(key)
+        if subscribers is not None:
+            subscribers.discard(client)
+            if not subscribers:
+                del self.active_connections[key]
+                self._hive_ids.pop(key, None)
+
+    def disconnect(self, websocket: WebSocket, hive_id: str = None):
+        """Forget a WebSocket and stop its sender (safe to call more than once)"""
+        client = self._clients.get(websocket)
+        if client is not None:
+            self._remove(client)
+            stopping = asyncio.create_task(client.stop())
+            self._stopping.add(stopping)
+            stopping.add_done_callback(self._stopping.discard)
+
+    def has_subscribers(self, hive_id: str) -> bool:
+        return hive_id in self.active_connections
+
+    def hive_id_for(self, key: str) -> Optional[int]:
+        """Hive id registered for a device key, if any subscriber gave one"""
+        return self._hive_ids.get(key)
+
+    def send(self, websocket: WebSocket, message: dict, key: str = None) -> bool:
+        """Queue a message for one connection, behind anything already queued"""
+        client = self._clients.get(websocket)
+        if client is None:
+            return False
+        return client.enqueue(key, json.dumps(message, default=str))
+
+    async def broadcast(self, hive_id: str, message: dict):
+        """Queue a message for every subscriber of a key (never waits on a client)"""
+        subscribers = self.active_connections.get(hive_id)
+        if not subscribers:
+            return
+        self.counters["broadcasts"] += 1
+        text = None
+        for client in list(subscribers):
+            if client.encoder is not None:
+                client.enqueue(hive_id, message)
+                continue
+            if text is None:
+                text = json.dumps(message, default=str)
+            client.enqueue(hive_id, text)
+
+    def resync(self):
+        """Tell every connection to reload each of its hives (live readings were lost)"""
+        for client in list(self._clients.values()):
+            for key in list(client.keys):
+                message = {"type": "resync", "hive_id": self._hive_ids.get(key)}
+                if client.enqueue(None, json.dumps(message)):
+                    self.counters["resyncs"] += 1
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self._clients),
+            "keys": len(self.active_connections),
+            "policy": self.policy,
+            **self.counters,
+        }
+
+    def _remove(self, client: ClientConnection):
+        if self._clients.get(client.websocket) is not client:
+            return
+        del self._clients[client.websocket]
+        for key in client.keys:
+            subscribers = self.active_connections.get(key)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.active_connections[key]
+                    self._hive_ids.pop(key, None)
+        client.keys.clear()
+
+    def _client(self, websocket: WebSocket, encoder: FrameEncoder = None) -> ClientConnection:
+        client = self._clients.get(websocket)
+        if client is None:
+            client = self._clients[websocket] = ClientConnection(websocket, self, encoder)
+            client.start()
+        return client
@@ -0,0 +1,45 @@
+"""
+Downsampling
+
+Largest-Triangle-Three-Buckets (LTTB): picks `threshold` points out of a
+series so that a line chart of them keeps the shape of the full series
+(peaks and dips survive, unlike with plain averaging).
+"""
+
+
+def lttb(xs: list, ys: list, threshold: int) -> list:
+    """
+    Indices of the points to keep, in order.
+
+    The first and last points are always kept. The points in between are
+    split into threshold - 2 buckets, and from each bucket the point that
+    forms the largest triangle with the previously kept point and the
+    average of the next bucket is kept.
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - end
+        avg_x = sum(xs[end:next_end]) / span
+        avg_y = sum(ys[end:next_end]) / span
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
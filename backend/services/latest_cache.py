@@ -0,0 +1,233 @@
+"""
+Latest Reading Cache
+
+Keeps the newest readings of recently read devices in memory, so "current
+state of the hive" reads do not go to TimescaleDB every time.
+"""
+
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+
+_FIELDS = ('time', 'temperature', 'humidity', 'weight', 'sound_level')
+
+
+class _Slot:
+    """Newest readings of one device as (time, temperature, humidity, weight, sound_level), oldest first"""
+    __slots__ = ('readings', 'loaded_at')
+
+    def __init__(self, readings: list, loaded_at: float):
+        self.readings = readings
+        self.loaded_at = loaded_at
+
+    def insert(self, reading: tuple, depth: int):
+        readings = self.readings
+        index = bisect_left(readings, reading[:1])
+        if index < len(readings) and readings[index][0] == reading[0]:
+            return  # Already have it
+        if index == 0 and len(readings) >= depth:
+            return  # Older than everything kept
+        readings.insert(index, reading)
+        if len(readings) > depth:
+            del readings[0]
+
+
+class LatestReadingCache:
+    """
+    Per-device slots holding the newest `depth` readings.
+
+    A slot is loaded from the database on a miss. After that the live
+    telemetry stream keeps it current (late readings are inserted in time
+    order). A slot is reloaded once it is `max_age` seconds old, which
+    bounds staleness when live readings were missed, e.g. while no
+    listener was running. The least recently read device is evicted
+    beyond `max_devices`.
+
+    Concurrent misses for one device share a load. Readings that arrive
+    while a slot is loading are merged in after the load, so none are lost
+    between the query and the slot going live. A load that clear()
+    overtakes is returned to its callers but not cached.
+
+    The consumer publishes readings when it accepts them, before its next
+    flush stores them. Live readings of every device are therefore also kept
+    for `recent_window` seconds and merged into what the database returns:
+    into slots when they load, and into gap fills through recent().
+    """
+
+    def __init__(self, depth: int = None, max_age: float = None, max_devices: int = None,
+                 recent_window: float = None):
+        self.depth = depth or int(os.getenv("LATEST_CACHE_DEPTH", 16))
+        self.max_age = max_age or float(os.getenv("LATEST_CACHE_MAX_AGE", 30))
+        self.max_devices = max_devices or int(os.getenv("LATEST_CACHE_DEVICES", 10000))
+        # Longer than the consumer's flush interval plus a flush
+        self.recent_window = recent_window or float(os.getenv("LATEST_CACHE_RECENT_WINDOW", 5))
+        self._slots: OrderedDict = OrderedDict()
+        self._loading: dict[str, asyncio.Future] = {}  # device_id -> its slot once loaded
+        self._pending: dict[str, list] = {}  # device_id -> live readings that arrived while loading
+        self._batches: set = set()  # Running loads (the loop only keeps weak references)
+        self._recent: dict[str, deque] = {}  # device_id -> (arrived at, time_us, values...), every device
+
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "live_updates": 0,
+            "shared": 0,  # Misses that waited on a load already in progress
+        }
+
+    async def get_many(self, device_ids: list, limit: int, load) -> list:
+        """
+        Newest `limit` (at most depth) readings of each device as dicts,
+        ordered by device and then time, like the rows of `load`.
+        load(device_ids, depth) fetches the misses in one query.
+        """
+        now = time.monotonic()
+        slots = {}
+        waiting = {}
+        missing = []
+        for device_id in dict.fromkeys(device_ids):
+            slot = self._slots.get(device_id)
+            if slot is not None and now - slot.loaded_at > self.max_age:
+                self.counters["expired"] += 1
+                slot = None
+            if slot is not None:
+                self._slots.move_to_end(device_id)
+                slots[device_id] = slot
+            elif device_id in self._loading:
+                self.counters["shared"] += 1
+                waiting[device_id] = self._loading[device_id]
+            else:
+                missing.append(device_id)
+        self.counters["hits"] += len(slots)
+        self.counters["misses"] += len(waiting) + len(missing)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {}
+            for device_id in missing:
+                futures[device_id] = self._loading[device_id] = waiting[device_id] = loop.create_future()
+                self._pending[device_id] = []
+            batch = asyncio.ensure_future(self._load(futures, load))
+            self._batches.add(batch)
+            batch.add_done_callback(self._batches.discard)
+
+        if waiting:
+            # Shielded: a caller that goes away does not cancel the others' load
+            loaded = await asyncio.shield(asyncio.gather(*waiting.values()))
+            slots.update(zip(waiting, loaded))
+
+        return [
+            {
+                "time": reading[0],
+                "device_id": device_id,
+                "temperature": reading[1],
+                "humidity": reading[2],
+                "weight": reading[3],
+                "sound_level": reading[4],
+            }
+            for device_id in sorted(slots)
+            for reading in slots[device_id].readings[-limit:]
+        ]
+
+    def record(self, device_id: str, time_us: int, temperature, humidity, weight, sound_level):
+        """Keep a live reading as recent, and apply it to the device's slot if it has one (or is loading)"""
+        now = time.monotonic()
+        recent = self._recent.get(device_id)
+        if recent is None:
+            recent = self._recent[device_id] = deque()
+        recent.append((now, time_us, temperature, humidity, weight, sound_level))
+        while recent[0][0] < now - self.recent_window:
+            recent.popleft()
+
+        slot = self._slots.get(device_id)
+        pending = self._pending.get(device_id)
+        if slot is None and pending is None:
+            return
+        reading = (
+            datetime.fromtimestamp(time_us / 1e6, timezone.utc),
+            temperature, humidity, weight, sound_level,
+        )
+        if pending is not None:
+            pending.append(reading)
+        if slot is not None:
+            slot.insert(reading, self.depth)
+            self.counters["live_updates"] += 1
+
+    def recent(self, device_id: str, since_us: int) -> list:
+        """Live readings of a device from the last recent_window seconds after since_us, as rows"""
+        oldest = time.monotonic() - self.recent_window
+        return [
+            {
+                "time": datetime.fromtimestamp(time_us / 1e6, timezone.utc),
+                "device_id": device_id,
+                "temperature": temperature,
+                "humidity": humidity,
+                "weight": weight,
+                "sound_level": sound_level,
+            }
+            for arrived, time_us, temperature, humidity, weight, sound_level in self._recent.get(device_id, ())
+            if arrived >= oldest and time_us > since_us
+        ]
+
+    def clear(self):
+        """Forget every slot, and the loads in progress (live readings may have been missed)"""
+        self._slots.clear()
+        self._loading.clear()
+        self._pending.clear()
+
+    def prune(self):
+        """Drop the recent readings of devices that have not sent any within the window"""
+        oldest = time.monotonic() - self.recent_window
+        for device_id in [d for d, recent in self._recent.items() if recent[-1][0] < oldest]:
+            del self._recent[device_id]
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._slots),
+            "recent_devices": len(self._recent),
+            "depth": self.depth,
+            **self.counters,
+        }
+
+    async def _load(self, futures: dict, load):
+        """Resolve every device's future with its new slot, or the load's error"""
+        try:
+            rows = await load(list(futures), self.depth)
+            loaded_at = time.monotonic()
+            slots = {device_id: _Slot([], loaded_at) for device_id in futures}
+            for row in rows:
+                slots[row['device_id']].readings.append(
+                    (row['time'], row['temperature'], row['humidity'], row['weight'], row['sound_level'])
+                )
+            for device_id, slot in slots.items():
+                # Readings published before the load that were not stored yet
+                for row in self.recent(device_id, 0):
+                    slot.insert(tuple(row[field] for field in _FIELDS), self.depth)
+                loading = futures[device_id]
+                if self._loading.get(device_id) is loading:
+                    del self._loading[device_id]
+                    for reading in self._pending.pop(device_id, ()):
+                        slot.insert(reading, self.depth)
+                    self._slots[device_id] = slot
+                    self._slots.move_to_end(device_id)
+                loading.set_result(slot)
+            while len(self._slots) > self.max_devices:
+                self._slots.popitem(last=False)
+                self.counters["evictions"] += 1
+        except Exception as e:
+            for loading in futures.values():
+                if not loading.done():
+                    loading.set_exception(e)
+        finally:
+            # Failed or cancelled: nobody may be left waiting (or holding _loading) forever
+            for device_id, loading in futures.items():
+                if self._loading.get(device_id) is loading:
+                    del self._loading[device_id]
+                    self._pending.pop(device_id, None)
+                if not loading.done():
+                    loading.cancel()
@@ -0,0 +1,203 @@
+"""
+Live Telemetry Subscriber
+
+Receives the readings the telemetry consumer accepts (NOTIFY on TimescaleDB)
+and hands them to the WebSocket connection manager.
+
+Each backend worker process runs one subscriber: one listener connection
+and one dispatch task, shared by every WebSocket in that worker.
+"""
+
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+import asyncpg
+
+
+# Must match LIVE_NOTIFY_CHANNEL in the telemetry consumer
+LIVE_TELEMETRY_CHANNEL = "telemetry_live"
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 2)
+
+
+class LiveTelemetrySubscriber:
+    """
+    LISTENs on the live telemetry channel and broadcasts new readings.
+
+    Notifications are parsed once, on a single dispatch task, and only
+    readings for devices with connected (or recently connected) viewers are
+    turned into messages. Those are also kept in the replay buffer, if any.
+    Every reading also goes to the latest-reading cache, if any, which keeps
+    the devices it holds current.
+    The listener connection is checked every few seconds and reopened if it
+    dropped. Readings published while it was down, dropped because the queue
+    was full, or that the consumer could not publish (a notification marked
+    "gap") are not replayed: on the next check the replay buffer and
+    latest-reading cache are cleared, since they may have missed some, and
+    every viewer is sent a resync for each of its hives.
+
+    Delivery latency is tracked from when the consumer received the reading
+    from MQTT (received_at) to the end of the broadcast, so it covers the
+    consumer's queue, the NOTIFY and the dispatch here. The reading's age on
+    delivery also includes device batching. Both compare clocks of different
+    hosts, so they are only as good as their time sync.
+    """
+
+    def __init__(self, timescale_url: str, manager, replay=None, latest=None, channel: str = None):
+        self.timescale_url = timescale_url
+        self.manager = manager
+        self.replay = replay
+        self.latest = latest
+        self.channel = channel or os.getenv("LIVE_TELEMETRY_CHANNEL", LIVE_TELEMETRY_CHANNEL)
+        self.check_interval = float(os.getenv("LIVE_TELEMETRY_CHECK_INTERVAL", 5))
+        self._queue = asyncio.Queue(maxsize=int(os.getenv("LIVE_TELEMETRY_QUEUE_SIZE", 1000)))
+        self._conn = None
+        self._tasks = []
+        self._lost = False  # Notifications were dropped since the last check
+        self._delivery_latency = deque(maxlen=4096)
+        self._reading_age = deque(maxlen=4096)
+
+        self.counters = {
+            "notifications": 0,
+            "readings": 0,
+            "delivered": 0,
+            "dropped_notifications": 0,
+            "consumer_gaps": 0,
+            "reconnects": 0,
+            "resyncs": 0,
+        }
+
+    async def start(self):
+        """Open the listener connection and start dispatching"""
+        await self._connect()
+        self._tasks = [
+            asyncio.create_task(self._dispatch_loop()),
+            asyncio.create_task(self._watch_loop()),
+        ]
+
+    async def stop(self):
+        """Stop the tasks and close the listener connection"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._conn and not self._conn.is_closed():
+            await self._conn.close()
+
+    def stats(self) -> dict:
+        """Counters and latency percentiles (ms) over recent deliveries"""
+        return {
+            **self.counters,
+            "queue_depth": self._queue.qsize(),
+            "listening": self._conn is not None and not self._conn.is_closed(),
+            "delivery_latency_ms": {
+                "p50": _percentile(self._delivery_latency, 0.50),
+                "p99": _percentile(self._delivery_latency, 0.99),
+            },
+            "reading_age_ms": {
+                "p50": _percentile(self._reading_age, 0.50),
+                "p99": _percentile(self._reading_age, 0.99),
+            },
+        }
+
+    async def _connect(self):
+        self._conn = await asyncpg.connect(self.timescale_url)
+        await self._conn.add_listener(self.channel, self._on_notify)
+        print(f"✓ Listening for live telemetry on '{self.channel}'")
+
+    async def _watch_loop(self):
+        """Reopen the listener connection if it dropped; resync viewers after lost readings"""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            if self.replay:
+                self.replay.prune()
+            if self.latest:
+                self.latest.prune()
+            if self._lost:
+                self._resync()
+            if self._conn is not None and not self._conn.is_closed():
+                continue
+            try:
+                await self._connect()
+                self.counters["reconnects"] += 1
+                self._resync()
+            except Exception as e:
+                print(f"Live telemetry listener reconnect failed: {e}")
+
+    def _resync(self):
+        """Some readings never reached the viewers: forget what may have gaps and tell them to reload"""
+        self._lost = False
+        self.counters["resyncs"] += 1
+        if self.replay:
+            self.replay.lost()
+        if self.latest:
+            self.latest.clear()
+        self.manager.resync()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        """Queue a notification for the dispatch task (never blocks the connection)"""
+        self.counters["notifications"] += 1
+        try:
+            self._queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.counters["dropped_notifications"] += 1
+            self._lost = True
+
+    async def _dispatch_loop(self):
+        while True:
+            payload = await self._queue.get()
+            try:
+                await self._dispatch(payload)
+            except Exception as e:
+                print(f"Error dispatching live telemetry: {e}")
+
+    async def _dispatch(self, payload: str):
+        notification = json.loads(payload)
+        received_at = notification.get("received_at")
+        readings = notification["readings"]
+        self.counters["readings"] += len(readings)
+        if notification.get("gap"):
+            # The consumer dropped readings before this notification
+            self.counters["consumer_gaps"] += 1
+            self._lost = True
+
+        replay = self.replay
+        latest = self.latest
+        for time_us, device_id, temperature, humidity, weight, sound_level in readings:
+            if latest:
+                latest.record(device_id, time_us, temperature, humidity, weight, sound_level)
+            late = replay.arrived(device_id, time_us) if replay else False
+            watched = self.manager.has_subscribers(device_id)
+            if not watched and not (replay and replay.retains(device_id)):
+                continue
+            # The reading time in epoch microseconds doubles as the resume cursor
+            # (late readings arrive with a cursor older than ones already sent)
+            message = {
+                "type": "reading",
+                "hive_id": self.manager.hive_id_for(device_id),
+                "cursor": time_us,
+                "time": datetime.fromtimestamp(time_us / 1e6, timezone.utc).isoformat(),
+                "device_id": device_id,
+                "temperature": temperature,
+                "humidity": humidity,
+                "weight": weight,
+                "sound_level": sound_level,
+            }
+            if replay:
+                replay.record(device_id, time_us, message, watched, late)
+            if not watched:
+                continue
+            await self.manager.broadcast(device_id, message)
+            now = time.time()
+            self.counters["delivered"] += 1
+            if received_at is not None:
+                self._delivery_latency.append(now - float(received_at))
+            self._reading_age.append(now - time_us / 1e6)
@@ -0,0 +1,174 @@
+"""
+Profile Cache
+
+Keeps recently read user profiles in memory, so /users/me (fetched on every
+app screen) does not go to the user store every time.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from functools import partial
+from typing import Optional
+
+
+class ProfileCache:
+    """
+    Read-through LRU of user profiles with their ETags.
+
+    A profile is loaded from the store on a miss and kept for `ttl` seconds
+    (PROFILE_CACHE_TTL, default 60); the least recently read beyond `size`
+    (PROFILE_CACHE_SIZE, default 10000) is evicted. Writes through this
+    worker put or evict the profile straight away; the TTL bounds how long
+    another worker's write can go unseen.
+
+    Concurrent misses for one user share a load. A load that a write
+    overtakes is returned to its callers but not cached. Missing profiles
+    are not cached.
+    """
+
+    def __init__(self, size: int = None, ttl: float = None):
+        self.size = size or int(os.getenv("PROFILE_CACHE_SIZE", 10000))
+        self.ttl = ttl if ttl is not None else float(os.getenv("PROFILE_CACHE_TTL", 60))
+        self._entries: OrderedDict = OrderedDict()  # user_id -> (expires_at, profile, etag)
+        self._loading: dict = {}
+        self._batches: set = set()  # Running get_many loads (the loop only keeps weak references)
+
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "shared": 0,  # Misses that waited on a load already in progress
+        }
+
+    @staticmethod
+    def etag(profile: dict) -> str:
+        digest = hashlib.blake2b(json.dumps(profile, sort_keys=True, default=str).encode(), digest_size=8)
+        return f'"{digest.hexdigest()}"'
+
+    async def get(self, user_id: str, load) -> Optional[tuple]:
+        """(profile, etag), or None if there is no profile. load(user_id) reads the store."""
+        cached = self._lookup(user_id)
+        if cached is not None:
+            return cached
+
+        loading = self._loading.get(user_id)
+        if loading is None:
+            loading = self._loading[user_id] = asyncio.ensure_future(self._load(user_id, load))
+            loading.add_done_callback(partial(self._loaded, user_id))
+        else:
+            self.counters["shared"] += 1
+        # Shielded: a caller that goes away does not cancel the others' load
+        return await asyncio.shield(loading)
+
+    async def get_many(self, user_ids: list, load_many) -> dict:
+        """
+        {user_id: (profile, etag) or None} for each distinct id. The misses
+        are read with one load_many(user_ids) call, which returns
+        {user_id: profile} of those that exist; ids already loading share
+        that load.
+        """
+        found = {}
+        waiting = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            cached = self._lookup(user_id)
+            if cached is not None:
+                found[user_id] = cached
+            elif user_id in self._loading:
+                self.counters["shared"] += 1
+                waiting[user_id] = self._loading[user_id]
+            else:
+                missing.append(user_id)
+
+        if missing:
+            # A future per id, so single reads and writes treat them like any other load
+            loop = asyncio.get_running_loop()
+            for user_id in missing:
+                loading = self._loading[user_id] = waiting[user_id] = loop.create_future()
+                loading.add_done_callback(partial(self._loaded, user_id))
+            futures = {user_id: waiting[user_id] for user_id in missing}
+            batch = asyncio.ensure_future(self._load_many(futures, load_many))
+            self._batches.add(batch)
+            batch.add_done_callback(self._batches.discard)
+
+        if waiting:
+            loaded = await asyncio.shield(asyncio.gather(*waiting.values()))
+            found.update(zip(waiting, loaded))
+        return found
+
+    def put(self, user_id: str, profile: dict) -> str:
+        """Cache a profile just written; returns its ETag"""
+        self._loading.pop(user_id, None)
+        etag = self.etag(profile)
+        self._store(user_id, profile, etag)
+        return etag
+
+    def evict(self, user_id: str):
+        self._loading.pop(user_id, None)
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._loading.clear()
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            "entries": len(self._entries),
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else None,
+            **self.counters,
+        }
+
+    def _lookup(self, user_id: str) -> Optional[tuple]:
+        """(profile, etag) if cached and fresh; counts the hit or miss"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            if time.monotonic() < entry[0]:
+                self._entries.move_to_end(user_id)
+                self.counters["hits"] += 1
+                return entry[1], entry[2]
+            del self._entries[user_id]
+            self.counters["expired"] += 1
+        self.counters["misses"] += 1
+        return None
+
+    async def _load_many(self, futures: dict, load_many):
+        """Resolve every id's future with its result or the load's error"""
+        try:
+            profiles = await load_many(list(futures))
+            for user_id, loading in futures.items():
+                profile = profiles.get(user_id)
+                loading.set_result((profile, self.etag(profile)) if profile is not None else None)
+        except Exception as e:
+            for loading in futures.values():
+                if not loading.done():
+                    loading.set_exception(e)
+        finally:
+            # Cancelled: nobody may be left waiting (or holding _loading) forever
+            for loading in futures.values():
+                if not loading.done():
+                    loading.cancel()
+
+    async def _load(self, user_id: str, load) -> Optional[tuple]:
+        profile = await load(user_id)
+        return (profile, self.etag(profile)) if profile is not None else None
+
+    def _loaded(self, user_id: str, loading):
+        if self._loading.get(user_id) is not loading:
+            return  # Overtaken by a write (or cleared)
+        del self._loading[user_id]
+        if loading.cancelled() or loading.exception() is not None or loading.result() is None:
+            return
+        self._store(user_id, *loading.result())
+
+    def _store(self, user_id: str, profile: dict, etag: str):
+        self._entries[user_id] = (time.monotonic() + self.ttl, profile, etag)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
@@ -0,0 +1,131 @@
+"""
+Replay Buffer
+
+Keeps the most recent live readings of watched devices in memory so a
+WebSocket client that reconnects can resume from its last cursor.
+"""
+
+import os
+import time
+from collections import deque
+from typing import Optional
+
+
+class ReplayBuffer:
+    """
+    Per-device ring buffers of (cursor, late, message), in arrival order.
+
+    Only devices that have (or recently had) a live subscriber are buffered.
+    A device keeps its buffer for `retain` seconds after its last subscriber
+    left, which covers reconnects after network drops and deploys, and then
+    the buffer is dropped.
+
+    Cursors are reading times, and readings do not always arrive in that
+    order: store-and-forward and spool replays deliver old readings late. A
+    reading older than the newest one seen for its device is marked late.
+    since() returns everything that arrived after the client's position, late
+    readings included, and can only answer when the buffer still reaches back
+    to that position. Otherwise it returns None and the caller falls back to
+    the database, which cannot tell when a reading arrived; late_before() says
+    whether a late reading the database range would miss may have arrived.
+    """
+
+    def __init__(self, size: int = None, retain: float = None, late_retain: float = None):
+        self.size = size or int(os.getenv("WS_REPLAY_BUFFER", 256))
+        self.retain = retain or float(os.getenv("WS_REPLAY_RETAIN", 300))
+        # As far back as the database gap fill reaches
+        self.late_retain = late_retain or float(os.getenv("WS_GAP_FILL_MAX_AGE_HOURS", 24)) * 3600
+        self._buffers: dict[str, deque] = {}
+        self._watched_at: dict[str, float] = {}
+        self._newest: dict[str, int] = {}  # device_id -> newest cursor seen (every device)
+        self._late: dict[str, tuple] = {}  # device_id -> (last late arrival, oldest late cursor), epoch seconds
+        self._lost_at = None  # When live readings were last lost (dropped or missed while reconnecting)
+
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "late": 0,
+        }
+
+    def retains(self, device_id: str) -> bool:
+        """Whether readings of an unwatched device are still being buffered"""
+        watched_at = self._watched_at.get(device_id)
+        return watched_at is not None and time.monotonic() - watched_at <= self.retain
+
+    def arrived(self, device_id: str, cursor: int) -> bool:
+        """Note a live reading of any device; True if it is late (older than one already seen)"""
+        newest = self._newest.get(device_id)
+        if newest is None or cursor >= newest:
+            self._newest[device_id] = cursor
+            return False
+        self.counters["late"] += 1
+        _, oldest = self._late.get(device_id, (None, cursor))
+        self._late[device_id] = (time.time(), min(oldest, cursor))
+        return True
+
+    def record(self, device_id: str, cursor: int, message: dict, watched: bool, late: bool = False):
+        """Append a live reading; watched marks that the device has a subscriber right now"""
+        if watched:
+            self._watched_at[device_id] = time.monotonic()
+        elif not self.retains(device_id):
+            self._drop(device_id)
+            return
+        buffer = self._buffers.get(device_id)
+        if buffer is None:
+            buffer = self._buffers[device_id] = deque(maxlen=self.size)
+        buffer.append((cursor, late, message))
+
+    def since(self, device_id: str, cursor: int) -> Optional[list]:
+        """
+        Messages that arrived after cursor, or None if the buffer does not
+        reach back that far. The client's position is the last in-order
+        reading at or before its cursor; late readings after it are returned
+        even when they are older than the cursor.
+        """
+        entries = list(self._buffers.get(device_id, ()))
+        for index in range(len(entries) - 1, -1, -1):
+            message_cursor, late, _ = entries[index]
+            if not late and message_cursor <= cursor:
+                self.counters["hits"] += 1
+                return [
+                    message for message_cursor, late, message in entries[index + 1:]
+                    if late or message_cursor > cursor
+                ]
+        self.counters["misses"] += 1
+        return None
+
+    def late_before(self, device_id: str, cursor: int) -> bool:
+        """
+        Whether a reading at or before cursor may have arrived after that
+        cursor was current, so a database range after it is incomplete.
+        Conservative: also true after live readings were lost.
+        """
+        current_at = cursor / 1e6
+        if self._lost_at is not None and self._lost_at > current_at:
+            return True
+        late = self._late.get(device_id)
+        return late is not None and late[0] > current_at and late[1] <= cursor
+
+    def lost(self):
+        """Live readings were lost: the buffers have gaps, so drop them"""
+        self._lost_at = time.time()
+        self._buffers.clear()
+
+    def prune(self):
+        """Drop the buffers of devices nobody has watched within the retention time"""
+        for device_id in [d for d in self._watched_at if not self.retains(d)]:
+            self._drop(device_id)
+        oldest = time.time() - self.late_retain
+        for device_id in [d for d, (at, _) in self._late.items() if at < oldest]:
+            del self._late[device_id]
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._buffers),
+            "readings": sum(len(buffer) for buffer in self._buffers.values()),
+            **self.counters,
+        }
+
+    def _drop(self, device_id: str):
+        self._buffers.pop(device_id, None)
+        self._watched_at.pop(device_id, None)
@@ -0,0 +1,128 @@
+"""
+Telemetry Export Encoders
+
+Turn batches of readings into chunks of an export stream. Each encoder
+only ever holds one batch, so an export of any size runs in constant
+memory.
+
+Formats:
+- ndjson: one JSON object per line
+- csv: header row, then one row per reading
+- arrow: Arrow IPC stream, one record batch per chunk (needs pyarrow)
+"""
+
+import io
+import csv
+import json
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+# Column order of the rows the encoders receive
+EXPORT_COLUMNS = ("hive_id", "time", "device_id", "temperature", "humidity", "weight", "sound_level")
+
+
+class NdjsonEncoder:
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        lines = []
+        for row in rows:
+            record = dict(zip(EXPORT_COLUMNS, row))
+            record["time"] = record["time"].isoformat()
+            lines.append(json.dumps(record))
+        return ("\n".join(lines) + "\n").encode()
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class CsvEncoder:
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def header(self) -> bytes:
+        self._writer.writerow(EXPORT_COLUMNS)
+        return self._drain()
+
+    def encode(self, rows) -> bytes:
+        self._writer.writerows(
+            (hive_id, time.isoformat(), *rest) for hive_id, time, *rest in rows
+        )
+        return self._drain()
+
+    def footer(self) -> bytes:
+        return b""
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+class ArrowEncoder:
+    media_type = "application/vnd.apache.arrow.stream"
+    extension = "arrows"
+
+    def __init__(self):
+        self.schema = pa.schema([
+            ("hive_id", pa.int32()),
+            ("time", pa.timestamp("us", tz="UTC")),
+            ("device_id", pa.string()),
+            ("temperature", pa.float64()),
+            ("humidity", pa.float64()),
+            ("weight", pa.float64()),
+            ("sound_level", pa.float64()),
+        ])
+        self._buffer = io.BytesIO()
+        self._writer = pa.ipc.new_stream(self._buffer, self.schema)
+
+    def header(self) -> bytes:
+        return self._drain()
+
+    def encode(self, rows) -> bytes:
+        columns = list(zip(*rows))
+        self._writer.write_batch(pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+        return self._drain()
+
+    def footer(self) -> bytes:
+        self._writer.close()
+        return self._drain()
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+EXPORT_FORMATS = {
+    "ndjson": NdjsonEncoder,
+    "csv": CsvEncoder,
+    "arrow": ArrowEncoder,
+}
+
+
+def export_encoder(format: str):
+    """New encoder for an export format; ValueError if unknown or unavailable"""
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if format == "arrow" and not PYARROW_AVAILABLE:
+        raise ValueError("Arrow export needs pyarrow, which is not installed")
+    return EXPORT_FORMATS[format]()
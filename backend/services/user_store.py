@@ -0,0 +1,341 @@
+"""
+User Store
+
+Accounts (sign-in identities) and profiles (the users collection) behind one
+async interface, so the user controller never blocks the event loop and does
+not care which backend holds the users:
+- FirestoreUserStore: Firebase Authentication + Firestore. The SDKs are
+  synchronous, so every call runs on a bounded thread pool with a timeout.
+- MemoryUserStore: dicts in this process, for benchmarks and local runs.
+
+USER_STORE picks the backend: firestore (default) or memory.
+
+IMPORTANT: FirestoreUserStore is the only place user data touches Firebase.
+"""
+
+import os
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+# Firebase imports (isolated to the Firestore store)
+try:
+    from firebase_admin import auth
+    from google.api_core.exceptions import NotFound
+    from config.firebase_config import get_firestore_client, get_auth_client, is_firebase_initialized
+    FIREBASE_AVAILABLE = True
+except ImportError:
+    FIREBASE_AVAILABLE = False
+
+
+USER_STORES = ("firestore", "memory")
+USERS_COLLECTION = "users"
+# Firestore rejects longer document ids
+MAX_DOCUMENT_ID_BYTES = 1500
+
+
+def is_document_id(user_id: str) -> bool:
+    """Whether Firestore accepts user_id as a document id (others name no user)"""
+    return (
+        bool(user_id)
+        and "/" not in user_id
+        and user_id not in (".", "..")
+        and not (user_id.startswith("__") and user_id.endswith("__"))
+        and len(user_id.encode()) <= MAX_DOCUMENT_ID_BYTES
+    )
+
+
+class UserStoreError(Exception):
+    pass
+
+
+class UserStoreUnavailable(UserStoreError):
+    """The backend is not configured"""
+
+
+class UserStoreTimeout(UserStoreError):
+    """The backend did not answer within the store's timeout"""
+
+
+class UserNotFound(UserStoreError):
+    pass
+
+
+class EmailAlreadyExists(UserStoreError):
+    pass
+
+
+class UserStore:
+    """
+    What the user controller needs from a backend.
+
+    Profiles are plain dicts (email, name, phone, location, created_at,
+    updated_at as ISO strings). get_profile returns None for a missing
+    profile; account methods raise UserNotFound.
+    """
+
+    name = "abstract"
+
+    async def create_account(self, email: str, password: str, name: str) -> str:
+        """Create a sign-in identity and return its user id (EmailAlreadyExists if taken)"""
+        raise NotImplementedError
+
+    async def create_token(self, user_id: str) -> str:
+        raise NotImplementedError
+
+    async def get_account_by_email(self, email: str) -> dict:
+        """{"user_id", "email"} of the account with this email"""
+        raise NotImplementedError
+
+    async def set_display_name(self, user_id: str, name: str):
+        raise NotImplementedError
+
+    async def delete_account(self, user_id: str):
+        raise NotImplementedError
+
+    async def set_profile(self, user_id: str, profile: dict):
+        raise NotImplementedError
+
+    async def get_profile(self, user_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def get_profiles(self, user_ids: list) -> dict:
+        """{user_id: profile} of those that exist; backends with batch reads do it in one call"""
+        found = await asyncio.gather(*(self.get_profile(user_id) for user_id in user_ids))
+        return {user_id: profile for user_id, profile in zip(user_ids, found) if profile is not None}
+
+    async def update_profile(self, user_id: str, fields: dict):
+        """Merge fields into an existing profile (UserNotFound if there is none)"""
+        raise NotImplementedError
+
+    async def delete_profile(self, user_id: str):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    def close(self):
+        pass
+
+
+class FirestoreUserStore(UserStore):
+    """
+    Firebase Authentication and Firestore calls on a bounded thread pool.
+
+    Each call waits at most `timeout` seconds (USER_STORE_TIMEOUT, default 5).
+    Firestore calls get the same timeout themselves, so their threads are
+    freed too; Firebase Auth calls have no timeout of their own and keep
+    their thread until they return. `threads` (USER_STORE_THREADS, default 8)
+    bounds how many calls are in flight; the rest queue.
+    """
+
+    name = "firestore"
+
+    def __init__(self, threads: int = None, timeout: float = None):
+        self.threads = threads or int(os.getenv("USER_STORE_THREADS", 8))
+        self.timeout = timeout or float(os.getenv("USER_STORE_TIMEOUT", 5))
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="user-store")
+
+        self.counters = {
+            "calls": 0,
+            "timeouts": 0,
+            "errors": 0,
+        }
+
+    def _db(self):
+        if not FIREBASE_AVAILABLE or not is_firebase_initialized():
+            raise UserStoreUnavailable("Firebase service not available")
+        return get_firestore_client()
+
+    def _auth(self):
+        if not FIREBASE_AVAILABLE or not is_firebase_initialized():
+            raise UserStoreUnavailable("Firebase service not available")
+        return get_auth_client()
+
+    def _document(self, user_id: str):
+        return self._db().collection(USERS_COLLECTION).document(user_id)
+
+    async def _call(self, fn, *args, **kwargs):
+        """Run a blocking SDK call on the pool, giving up after the timeout"""
+        self.counters["calls"] += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise UserStoreTimeout(f"User store did not answer within {self.timeout}s")
+        except UserStoreError:
+            raise
+        except auth.EmailAlreadyExistsError:
+            raise EmailAlreadyExists("Email already registered")
+        except auth.UserNotFoundError:
+            raise UserNotFound("User not found")
+        except NotFound:
+            # Firestore's update() of a missing document
+            raise UserNotFound("User profile not found")
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+
+    async def create_account(self, email: str, password: str, name: str) -> str:
+        user = await self._call(self._auth().create_user, email=email, password=password, display_name=name)
+        return user.uid
+
+    async def create_token(self, user_id: str) -> str:
+        token = await self._call(self._auth().create_custom_token, user_id)
+        return token.decode() if isinstance(token, bytes) else token
+
+    async def get_account_by_email(self, email: str) -> dict:
+        user = await self._call(self._auth().get_user_by_email, email)
+        return {"user_id": user.uid, "email": user.email}
+
+    async def set_display_name(self, user_id: str, name: str):
+        await self._call(self._auth().update_user, user_id, display_name=name)
+
+    async def delete_account(self, user_id: str):
+        await self._call(self._auth().delete_user, user_id)
+
+    async def set_profile(self, user_id: str, profile: dict):
+        await self._call(self._document(user_id).set, profile, timeout=self.timeout)
+
+    async def get_profile(self, user_id: str) -> Optional[dict]:
+        if not is_document_id(user_id):
+            return None
+        doc = await self._call(self._document(user_id).get, timeout=self.timeout)
+        return doc.to_dict() if doc.exists else None
+
+    def _get_all(self, user_ids: list) -> list:
+        db = self._db()
+        refs = [db.collection(USERS_COLLECTION).document(user_id) for user_id in user_ids]
+        # get_all streams: consume it on the pool thread
+        return list(db.get_all(refs, timeout=self.timeout))
+
+    async def get_profiles(self, user_ids: list) -> dict:
+        self._db()  # Unavailable before anything is queued
+        # One invalid id fails the whole get_all: leave them out, as not found
+        user_ids = [user_id for user_id in user_ids if is_document_id(user_id)]
+        if not user_ids:
+            return {}
+        docs = await self._call(self._get_all, user_ids)
+        return {doc.id: doc.to_dict() for doc in docs if doc.exists}
+
+    async def update_profile(self, user_id: str, fields: dict):
+        await self._call(self._document(user_id).update, fields, timeout=self.timeout)
+
+    async def delete_profile(self, user_id: str):
+        await self._call(self._document(user_id).delete, timeout=self.timeout)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "threads": self.threads,
+            "timeout": self.timeout,
+            **self.counters,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class MemoryUserStore(UserStore):
+    """
+    Users in process memory, lost on restart. `latency` (USER_STORE_LATENCY,
+    seconds, default 0) is awaited on every call to stand in for a remote
+    backend in benchmarks. Passwords are not kept, and tokens are opaque
+    strings no verifier accepts.
+    """
+
+    name = "memory"
+
+    def __init__(self, latency: float = None):
+        self.latency = latency if latency is not None else float(os.getenv("USER_STORE_LATENCY", 0))
+        self._accounts: dict = {}  # user_id -> email
+        self._emails: dict = {}  # email -> user_id
+        self._profiles: dict = {}
+
+        self.counters = {
+            "calls": 0,
+        }
+
+    async def _call(self):
+        self.counters["calls"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _account(self, user_id: str) -> str:
+        if user_id not in self._accounts:
+            raise UserNotFound("User not found")
+        return self._accounts[user_id]
+
+    async def create_account(self, email: str, password: str, name: str) -> str:
+        await self._call()
+        if email in self._emails:
+            raise EmailAlreadyExists("Email already registered")
+        user_id = uuid.uuid4().hex
+        self._accounts[user_id] = email
+        self._emails[email] = user_id
+        return user_id
+
+    async def create_token(self, user_id: str) -> str:
+        await self._call()
+        self._account(user_id)
+        return f"memory-{uuid.uuid4().hex}"
+
+    async def get_account_by_email(self, email: str) -> dict:
+        await self._call()
+        if email not in self._emails:
+            raise UserNotFound("User not found")
+        return {"user_id": self._emails[email], "email": email}
+
+    async def set_display_name(self, user_id: str, name: str):
+        await self._call()
+        self._account(user_id)
+
+    async def delete_account(self, user_id: str):
+        await self._call()
+        email = self._account(user_id)
+        del self._accounts[user_id]
+        del self._emails[email]
+
+    async def set_profile(self, user_id: str, profile: dict):
+        await self._call()
+        self._profiles[user_id] = dict(profile)
+
+    async def get_profile(self, user_id: str) -> Optional[dict]:
+        await self._call()
+        profile = self._profiles.get(user_id)
+        return dict(profile) if profile is not None else None
+
+    async def get_profiles(self, user_ids: list) -> dict:
+        await self._call()
+        return {user_id: dict(self._profiles[user_id]) for user_id in user_ids if user_id in self._profiles}
+
+    async def update_profile(self, user_id: str, fields: dict):
+        await self._call()
+        if user_id not in self._profiles:
+            raise UserNotFound("User profile not found")
+        self._profiles[user_id].update(fields)
+
+    async def delete_profile(self, user_id: str):
+        await self._call()
+        self._profiles.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "users": len(self._profiles),
+            "latency": self.latency,
+            **self.counters,
+        }
+
+
+def create_user_store(backend: str = None) -> UserStore:
+    """The store named by USER_STORE (default: firestore)"""
+    backend = backend or os.getenv("USER_STORE", "firestore")
+    if backend == "firestore":
+        return FirestoreUserStore()
+    if backend == "memory":
+        return MemoryUserStore()
+    raise ValueError(f"Unknown USER_STORE '{backend}'. Use one of: {', '.join(USER_STORES)}")
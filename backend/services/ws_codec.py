@@ -0,0 +1,106 @@
+"""
+WebSocket Frame Codec
+
+Compact binary frames for live telemetry, negotiated per connection with
+?format=binary. JSON stays the default.
+
+Frame layout, version 1 (little-endian):
+    header:  <B magic 0xB7> <B version> <H record count>
+    records, one of:
+      full:  <B kind=0> <I hive_id> <q cursor> <4i temperature, humidity, weight, sound_level>
+      delta: <B kind=1> <I hive_id> <i cursor delta> <4h value deltas>
+Values are fixed-point hundredths (35.12 -> 3512); MISSING marks an absent
+value. Cursors are epoch microseconds (the reading time).
+
+A delta record is relative to the previous record of the same hive on the
+same connection. The encoder falls back to a full record for a hive's first
+reading, when a value is missing, and when a delta does not fit its field.
+Readings dropped for a slow client are never encoded, so deltas always refer
+to what the client actually received.
+"""
+
+import struct
+
+
+MAGIC = 0xB7
+VERSION = 1
+FRAME_HEADER = struct.Struct('<BBH')
+FULL_RECORD = struct.Struct('<BIq4i')
+DELTA_RECORD = struct.Struct('<BIi4h')
+KIND_FULL = 0
+KIND_DELTA = 1
+MISSING = -2 ** 31
+SCALE = 100
+FIELDS = ('temperature', 'humidity', 'weight', 'sound_level')
+MAX_RECORDS = 1024
+
+_INT16 = range(-2 ** 15, 2 ** 15)
+_INT32 = range(-2 ** 31, 2 ** 31)
+
+
+class FrameEncoder:
+    """Per-connection encoder: remembers the last record sent for each hive"""
+
+    version = VERSION
+
+    def __init__(self, batch_window_ms: float = 0):
+        # Seconds the sender waits to gather several readings into one frame
+        self.batch_window = batch_window_ms / 1000
+        self._previous = {}
+
+    def encode(self, messages) -> bytes:
+        """Encode live reading messages (dicts with hive_id, cursor and values) into one frame"""
+        previous = self._previous
+        parts = [FRAME_HEADER.pack(MAGIC, VERSION, len(messages))]
+        for message in messages:
+            hive_id = message.get("hive_id") or 0
+            cursor = message["cursor"]
+            values = tuple(
+                MISSING if message.get(field) is None else round(message[field] * SCALE)
+                for field in FIELDS
+            )
+            last = previous.get(hive_id)
+            previous[hive_id] = (cursor, values)
+
+            if last is not None and MISSING not in values and MISSING not in last[1]:
+                cursor_delta = cursor - last[0]
+                deltas = tuple(v - p for v, p in zip(values, last[1]))
+                if cursor_delta in _INT32 and all(d in _INT16 for d in deltas):
+                    parts.append(DELTA_RECORD.pack(KIND_DELTA, hive_id, cursor_delta, *deltas))
+                    continue
+            parts.append(FULL_RECORD.pack(KIND_FULL, hive_id, cursor, *values))
+        return b''.join(parts)
+
+
+class FrameDecoder:
+    """Reference decoder (what a client implements); keeps the per-hive state deltas need"""
+
+    def __init__(self):
+        self._previous = {}
+
+    def decode(self, frame: bytes) -> list:
+        magic, version, count = FRAME_HEADER.unpack_from(frame)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unsupported frame (magic {magic:#x}, version {version})")
+        readings = []
+        offset = FRAME_HEADER.size
+        for _ in range(count):
+            kind = frame[offset]
+            if kind == KIND_FULL:
+                _, hive_id, cursor, *values = FULL_RECORD.unpack_from(frame, offset)
+                offset += FULL_RECORD.size
+            elif kind == KIND_DELTA:
+                _, hive_id, cursor_delta, *deltas = DELTA_RECORD.unpack_from(frame, offset)
+                offset += DELTA_RECORD.size
+                last_cursor, last_values = self._previous[hive_id]
+                cursor = last_cursor + cursor_delta
+                values = [p + d for p, d in zip(last_values, deltas)]
+            else:
+                raise ValueError(f"Unknown record kind {kind}")
+            self._previous[hive_id] = (cursor, values)
+            readings.append({
+                "hive_id": hive_id,
+                "cursor": cursor,
+                **{field: None if v == MISSING else v / SCALE for field, v in zip(FIELDS, values)},
+            })
+        return readings
@@ -0,0 +1,137 @@
+"""ConnectionManager: per-client queues, slow-consumer policies and disconnects"""
+
+import asyncio
+import json
+
+import pytest
+
+from services.connection_manager import ConnectionManager
+
+
+class StalledSocket:
+    """Records what is sent; every send waits until released"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.started.set()
+        await self.release.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = code
+
+
+async def stalled_client(manager, keys=('hive-001',)):
+    """A connected socket whose sender is stuck on its first message"""
+    websocket = StalledSocket()
+    await manager.connect(websocket)
+    for key in keys:
+        manager.subscribe(websocket, key)
+    await manager.broadcast(keys[0], {"n": 0})
+    await websocket.started.wait()
+    return websocket
+
+
+async def drain(manager, websocket):
+    websocket.release.set()
+    for _ in range(100):
+        await asyncio.sleep(0)
+    manager.disconnect(websocket)
+    await asyncio.gather(*manager._stopping)
+
+
+def test_drop_oldest_discards_the_oldest_queued_message():
+    async def run():
+        manager = ConnectionManager(queue_size=2, policy='drop_oldest')
+        websocket = await stalled_client(manager)
+        for n in (1, 2, 3):
+            await manager.broadcast('hive-001', {"n": n})
+        await drain(manager, websocket)
+        return websocket.sent, manager.counters
+
+    sent, counters = asyncio.run(run())
+    assert [message["n"] for message in sent] == [0, 2, 3]
+    assert counters["dropped"] == 1
+
+
+def test_latest_keeps_the_newest_reading_per_device():
+    async def run():
+        manager = ConnectionManager(queue_size=2, policy='latest')
+        websocket = await stalled_client(manager, keys=('hive-001', 'hive-002'))
+        await manager.broadcast('hive-001', {"n": 1})
+        await manager.broadcast('hive-002', {"n": 2})
+        await manager.broadcast('hive-001', {"n": 3})
+        await drain(manager, websocket)
+        return websocket.sent
+
+    sent = asyncio.run(run())
+    assert [message["n"] for message in sent] == [0, 2, 3]
+
+
+def test_disconnect_policy_closes_the_slow_client():
+    async def run():
+        manager = ConnectionManager(queue_size=1, policy='disconnect')
+        websocket = await stalled_client(manager)
+        await manager.broadcast('hive-001', {"n": 1})
+        await manager.broadcast('hive-001', {"n": 2})
+        websocket.release.set()
+        for _ in range(100):
+            await asyncio.sleep(0)
+        return websocket, manager
+
+    websocket, manager = asyncio.run(run())
+    assert websocket.closed_with == 1013
+    assert manager.counters["disconnected_slow"] == 1
+    assert not manager.has_subscribers('hive-001')
+    assert manager.stats()["connections"] == 0
+
+
+def test_disconnect_keeps_the_stop_task_until_it_is_done():
+    async def run():
+        manager = ConnectionManager()
+        websocket = await stalled_client(manager)
+        client = manager._clients[websocket]
+        sender = client._task
+        manager.disconnect(websocket)
+        manager.disconnect(websocket)  # Safe to repeat
+        stopping = len(manager._stopping)
+        await asyncio.gather(*manager._stopping)
+        return stopping, sender, manager
+
+    stopping, sender, manager = asyncio.run(run())
+    assert stopping == 1
+    assert sender.cancelled()
+    assert not manager._stopping
+    assert not manager.has_subscribers('hive-001')
+
+
+def test_failed_sends_remove_the_client():
+    class BrokenSocket(StalledSocket):
+        async def send_text(self, text):
+            raise ConnectionResetError("gone")
+
+    async def run():
+        manager = ConnectionManager()
+        websocket = BrokenSocket()
+        await manager.connect(websocket, 'hive-001')
+        await manager.broadcast('hive-001', {"n": 0})
+        for _ in range(10):
+            await asyncio.sleep(0)
+        return manager
+
+    manager = asyncio.run(run())
+    assert manager.counters["send_failures"] == 1
+    assert not manager.has_subscribers('hive-001')
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ConnectionManager(policy='spill')
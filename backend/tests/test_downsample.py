@@ -0,0 +1,31 @@
+"""LTTB downsampling"""
+
+import math
+
+from services.downsample import lttb
+
+
+def test_short_series_is_kept_whole():
+    assert lttb([0, 1, 2], [5, 6, 7], 10) == [0, 1, 2]
+
+
+def test_tiny_thresholds_keep_the_ends():
+    xs = list(range(10))
+    assert lttb(xs, xs, 2) == [0, 9]
+    assert lttb(xs, xs, 1) == [0]
+
+
+def test_keeps_threshold_points_in_order_with_both_ends():
+    xs = list(range(1000))
+    ys = [math.sin(x / 20) for x in xs]
+    kept = lttb(xs, ys, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert kept == sorted(set(kept))
+
+
+def test_keeps_a_spike_that_averaging_would_flatten():
+    xs = list(range(100))
+    ys = [0.0] * 100
+    ys[37] = 100.0
+    assert 37 in lttb(xs, ys, 10)
@@ -0,0 +1,138 @@
+"""Local ID token verification, and how the auth middleware reports its failures"""
+
+import asyncio
+import json
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+
+from middleware import auth as auth_module
+from middleware.jwt_verifier import (
+    JwtVerifier, LocalKeySource, TokenError, ExpiredTokenError, KeysUnavailableError
+)
+from middleware.token_cache import TokenCache
+
+PROJECT_ID = 'test-project'
+KID = 'test-key'
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+OTHER_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def mint(key=PRIVATE_KEY, kid=KID, algorithm="RS256", **overrides):
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": "user-1",
+        "iat": now,
+        "auth_time": now,
+        "exp": now + 3600,
+        **overrides,
+    }
+    claims = {name: value for name, value in claims.items() if value is not None}
+    return jwt.encode(claims, key, algorithm=algorithm, headers={"kid": kid})
+
+
+@pytest.fixture
+def verifier(tmp_path):
+    pem = PRIVATE_KEY.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    path = tmp_path / "keys.json"
+    path.write_text(json.dumps({KID: pem.decode()}))
+    source = LocalKeySource(str(path))
+    source.refresh()
+    return JwtVerifier(source, PROJECT_ID, clock_skew=0)
+
+
+def test_valid_token(verifier):
+    claims = verifier.verify(mint())
+    assert claims["uid"] == "user-1"
+    assert claims["aud"] == PROJECT_ID
+
+
+def test_jwks_key_file(tmp_path):
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(PRIVATE_KEY.public_key()))
+    path = tmp_path / "jwks.json"
+    path.write_text(json.dumps({"keys": [{**jwk, "kid": KID}]}))
+    source = LocalKeySource(str(path))
+    source.refresh()
+    assert JwtVerifier(source, PROJECT_ID).verify(mint())["uid"] == "user-1"
+
+
+def test_expired_token(verifier):
+    with pytest.raises(ExpiredTokenError):
+        verifier.verify(mint(exp=int(time.time()) - 1))
+
+
+@pytest.mark.parametrize("token", [
+    mint(key=OTHER_KEY),  # signed by someone else
+    mint(kid="unknown"),
+    mint(aud="another-project"),
+    mint(iss="https://securetoken.google.com/another-project"),
+    mint(sub=""),
+    mint(iat=int(time.time()) + 600),
+    mint(exp=None),
+    jwt.encode({"sub": "user-1"}, "s" * 32, algorithm="HS256", headers={"kid": KID}),
+    "not.a.token",
+    "garbage",
+])
+def test_invalid_tokens(verifier, token):
+    with pytest.raises(TokenError):
+        verifier.verify(token)
+
+
+def test_no_keys_is_a_server_problem(verifier):
+    verifier.key_source.keys = {}
+    with pytest.raises(KeysUnavailableError):
+        verifier.verify(mint())
+
+
+class FailingVerifier:
+    """A verifier that fails with something other than a TokenError"""
+
+    def verify(self, token):
+        raise RuntimeError("unexpected")
+
+
+@pytest.fixture
+def local_auth(monkeypatch, verifier):
+    monkeypatch.setattr(auth_module, "AUTH_VERIFIER", "local")
+    monkeypatch.setattr(auth_module, "_local_verifier", verifier)
+    monkeypatch.setattr(auth_module, "_token_cache", TokenCache())
+    monkeypatch.setattr(auth_module, "_inflight", {})
+    return monkeypatch
+
+
+def current_user(token):
+    return asyncio.run(auth_module.get_current_user_id(f"Bearer {token}"))
+
+
+def test_middleware_with_the_local_verifier(local_auth):
+    assert current_user(mint()) == "user-1"
+
+
+@pytest.mark.parametrize("token, detail", [
+    (mint(exp=int(time.time()) - 1), "Token has expired"),
+    (mint(key=OTHER_KEY), "Invalid token"),
+])
+def test_middleware_rejects_bad_tokens_with_401(local_auth, token, detail):
+    with pytest.raises(HTTPException) as error:
+        current_user(token)
+    assert error.value.status_code == 401
+    assert error.value.detail == detail
+
+
+def test_unexpected_errors_are_401_without_firebase(local_auth):
+    # As if firebase-admin were not installed: its error types must not be looked up
+    local_auth.setattr(auth_module, "FIREBASE_AVAILABLE", False)
+    local_auth.delattr(auth_module, "auth", raising=False)
+    local_auth.setattr(auth_module, "_local_verifier", FailingVerifier())
+    with pytest.raises(HTTPException) as error:
+        current_user(mint())
+    assert error.value.status_code == 401
+    assert error.value.detail == "Token verification failed: unexpected"
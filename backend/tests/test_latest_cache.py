@@ -0,0 +1,158 @@
+"""LatestReadingCache: shared loads, live updates during loads, expiry and eviction"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from services.latest_cache import LatestReadingCache
+
+START_US = int(datetime(2024, 5, 1, tzinfo=timezone.utc).timestamp()) * 1000000
+
+
+def row(device_id, second, temperature=None):
+    return {
+        "time": datetime.fromtimestamp(START_US / 1e6 + second, timezone.utc),
+        "device_id": device_id,
+        "temperature": temperature if temperature is not None else float(second),
+        "humidity": None,
+        "weight": None,
+        "sound_level": None,
+    }
+
+
+def live(cache, device_id, second):
+    cache.record(device_id, START_US + second * 1000000, float(second), None, None, None)
+
+
+class SlowLoad:
+    """load(device_ids, depth) that waits until released; counts calls"""
+
+    def __init__(self, rows, error=None):
+        self.rows = rows
+        self.error = error
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, device_ids, depth):
+        self.calls.append(list(device_ids))
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return [r for r in self.rows if r["device_id"] in device_ids]
+
+
+def temperatures(rows):
+    return [r["temperature"] for r in rows]
+
+
+def test_concurrent_misses_share_one_load_and_keep_live_readings():
+    cache = LatestReadingCache(depth=8, recent_window=0.001)
+    load = SlowLoad([row('hive-001', 1), row('hive-001', 2)])
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_many(['hive-001'], 8, load))
+        await asyncio.sleep(0)
+        live(cache, 'hive-001', 3)
+        second = asyncio.ensure_future(cache.get_many(['hive-001', 'hive-001'], 8, load))
+        await asyncio.sleep(0.01)  # Past the recent window: only the load's own pending list has it
+        live(cache, 'hive-001', 4)
+        load.release.set()
+        results = await asyncio.gather(first, second)
+        live(cache, 'hive-001', 5)
+        return results, await cache.get_many(['hive-001'], 8, load)
+
+    (first, second), after = asyncio.run(run())
+    assert load.calls == [['hive-001']]
+    assert temperatures(first) == temperatures(second) == [1.0, 2.0, 3.0, 4.0]
+    assert temperatures(after) == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert cache.counters["shared"] == 1
+
+
+def test_a_failed_load_fails_every_waiter_and_is_retried():
+    cache = LatestReadingCache()
+    load = SlowLoad([], error=ConnectionResetError("database gone"))
+
+    async def run():
+        calls = [asyncio.ensure_future(cache.get_many(['hive-001'], 4, load)) for _ in range(2)]
+        await asyncio.sleep(0)
+        load.release.set()
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ConnectionResetError) for result in results)
+    assert load.calls == [['hive-001']]
+
+    load.error = None
+    load.rows = [row('hive-001', 1)]
+    assert temperatures(asyncio.run(cache.get_many(['hive-001'], 4, load))) == [1.0]
+    assert len(load.calls) == 2
+
+
+def test_a_load_overtaken_by_clear_is_not_cached():
+    cache = LatestReadingCache()
+    load = SlowLoad([row('hive-001', 1)])
+
+    async def run():
+        call = asyncio.ensure_future(cache.get_many(['hive-001'], 4, load))
+        await asyncio.sleep(0)
+        cache.clear()
+        load.release.set()
+        return await call
+
+    assert temperatures(asyncio.run(run())) == [1.0]
+    assert cache.stats()["devices"] == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_load():
+    cache = LatestReadingCache()
+    load = SlowLoad([row('hive-001', 1)])
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_many(['hive-001'], 4, load))
+        second = asyncio.ensure_future(cache.get_many(['hive-001'], 4, load))
+        await asyncio.sleep(0)
+        first.cancel()
+        load.release.set()
+        return await second
+
+    assert temperatures(asyncio.run(run())) == [1.0]
+
+
+def test_live_readings_keep_slots_current_in_time_order():
+    cache = LatestReadingCache(depth=3)
+
+    async def load(device_ids, depth):
+        return [row('hive-001', 1), row('hive-001', 3)]
+
+    asyncio.run(cache.get_many(['hive-001'], 3, load))
+    live(cache, 'hive-001', 2)  # Late
+    live(cache, 'hive-001', 4)
+    live(cache, 'hive-001', 0)  # Older than everything kept
+
+    rows = asyncio.run(cache.get_many(['hive-001'], 3, load))
+    assert temperatures(rows) == [2.0, 3.0, 4.0]
+    assert cache.counters["hits"] == 1
+
+
+@pytest.mark.parametrize("max_age, max_devices, loads", [
+    (0.000001, 10, 2),  # Expired: reloaded
+    (30, 1, 3),  # hive-001 evicted by hive-002: reloaded
+])
+def test_expiry_and_eviction_reload(max_age, max_devices, loads):
+    cache = LatestReadingCache(max_age=max_age, max_devices=max_devices)
+    calls = []
+
+    async def load(device_ids, depth):
+        calls.append(device_ids)
+        return [row(device_id, 1) for device_id in device_ids]
+
+    async def run():
+        await cache.get_many(['hive-001'], 4, load)
+        if max_devices == 1:
+            await cache.get_many(['hive-002'], 4, load)
+        await asyncio.sleep(0.001)
+        await cache.get_many(['hive-001'], 4, load)
+
+    asyncio.run(run())
+    assert len(calls) == loads
@@ -0,0 +1,89 @@
+"""Live telemetry dispatch: latency from consumer receipt, consumer gaps, unstored readings"""
+
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+from services.latest_cache import LatestReadingCache
+from services.live_telemetry import LiveTelemetrySubscriber
+
+START_US = int(datetime(2024, 5, 1, tzinfo=timezone.utc).timestamp()) * 1000000
+
+
+class FakeManager:
+    def __init__(self, watched):
+        self.watched = set(watched)
+        self.broadcasts = []
+        self.resyncs = 0
+
+    def has_subscribers(self, device_id):
+        return device_id in self.watched
+
+    def hive_id_for(self, device_id):
+        return 1
+
+    async def broadcast(self, device_id, message):
+        self.broadcasts.append(message)
+
+    def resync(self):
+        self.resyncs += 1
+
+
+def notification(readings, received_at, **fields):
+    return json.dumps({"received_at": received_at, **fields, "readings": readings})
+
+
+def test_delivery_latency_runs_from_consumer_receipt():
+    manager = FakeManager({'hive-001'})
+    subscriber = LiveTelemetrySubscriber('postgresql://test', manager)
+    readings = [[START_US, 'hive-001', 35.0, 60.0, None, 55.5], [START_US, 'hive-002', 20.0, 50.0, 1.0, 2.0]]
+
+    asyncio.run(subscriber._dispatch(notification(readings, time.time() - 0.05)))
+
+    (message,) = manager.broadcasts
+    assert message["cursor"] == START_US
+    assert message["temperature"] == 35.0
+    assert subscriber.stats()["delivery_latency_ms"]["p50"] >= 50
+
+
+def test_consumer_gap_resyncs_viewers():
+    manager = FakeManager({'hive-001'})
+    latest = LatestReadingCache()
+    subscriber = LiveTelemetrySubscriber('postgresql://test', manager, latest=latest)
+
+    asyncio.run(subscriber._dispatch(notification([], time.time(), gap=True)))
+    assert subscriber.counters["consumer_gaps"] == 1
+    assert subscriber._lost
+
+    subscriber._resync()
+    assert manager.resyncs == 1
+    assert not subscriber._lost
+
+
+def test_unstored_live_readings_are_merged_into_loads():
+    latest = LatestReadingCache(depth=4)
+    stored = [
+        {"time": datetime.fromtimestamp((START_US + i * 1000000) / 1e6, timezone.utc), "device_id": 'hive-001',
+         "temperature": 30.0 + i, "humidity": None, "weight": None, "sound_level": None}
+        for i in range(2)
+    ]
+    # Published live, not flushed by the consumer yet
+    latest.record('hive-001', START_US + 1000000, 31.0, None, None, None)
+    latest.record('hive-001', START_US + 2000000, 32.0, None, None, None)
+
+    async def load(device_ids, depth):
+        return stored
+
+    rows = asyncio.run(latest.get_many(['hive-001'], 4, load))
+    assert [row["temperature"] for row in rows] == [30.0, 31.0, 32.0]
+    assert [row["temperature"] for row in latest.recent('hive-001', START_US + 1000000)] == [32.0]
+
+
+def test_recent_readings_expire():
+    latest = LatestReadingCache(recent_window=0.01)
+    latest.record('hive-001', START_US, 31.0, None, None, None)
+    time.sleep(0.02)
+    assert latest.recent('hive-001', 0) == []
+    latest.prune()
+    assert latest.stats()["recent_devices"] == 0
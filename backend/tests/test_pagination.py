@@ -0,0 +1,36 @@
+"""Pagination cursors: what X-Next-Cursor holds and ?cursor= accepts"""
+
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from controllers.bee_controller import _encode_cursor, _decode_cursor
+
+
+def test_cursor_round_trip_with_id():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    cursor = _encode_cursor(created_at, 42)
+    assert _decode_cursor(cursor, 2) == [created_at, 42]
+
+
+def test_cursor_round_trip_time_only_keeps_timezone():
+    time = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    assert _decode_cursor(_encode_cursor(time), 1) == [time]
+
+
+def test_cursor_is_url_safe():
+    cursor = _encode_cursor(datetime(2024, 5, 1), 2 ** 40)
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    _encode_cursor(datetime(2024, 5, 1)),  # size 1 where 2 is expected
+    _encode_cursor("yesterday", 1),
+    _encode_cursor(datetime(2024, 5, 1), "1"),
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        _decode_cursor(cursor, 2)
+    assert error.value.status_code == 400
@@ -0,0 +1,189 @@
+"""ProfileCache batch reads, and POST /users/batch on the memory user store"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from controllers import user_controller
+from models import UserBatchRequest
+from services.profile_cache import ProfileCache
+from services.user_store import MemoryUserStore, is_document_id
+
+
+class SlowLoadMany:
+    """load_many(user_ids) that waits until released; counts calls"""
+
+    def __init__(self, profiles, error=None):
+        self.profiles = profiles
+        self.error = error
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, user_ids):
+        self.calls.append(list(user_ids))
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return {user_id: self.profiles[user_id] for user_id in user_ids if user_id in self.profiles}
+
+
+def profile(name):
+    return {"name": name, "email": f"{name}@example.com"}
+
+
+def names(found):
+    return {user_id: entry[0]["name"] if entry else None for user_id, entry in found.items()}
+
+
+def test_misses_are_read_in_one_call_and_missing_ids_are_none():
+    cache = ProfileCache()
+    load = SlowLoadMany({"ann": profile("ann"), "bob": profile("bob")})
+    load.release.set()
+
+    found = asyncio.run(cache.get_many(["ann", "bob", "ann", "nobody"], load))
+    assert load.calls == [["ann", "bob", "nobody"]]
+    assert names(found) == {"ann": "ann", "bob": "bob", "nobody": None}
+    assert found["ann"][1] == ProfileCache.etag(profile("ann"))
+
+    # Cached now; the missing profile is not
+    again = asyncio.run(cache.get_many(["ann", "nobody"], load))
+    assert names(again) == {"ann": "ann", "nobody": None}
+    assert load.calls[1:] == [["nobody"]]
+    assert cache.stats()["entries"] == 2
+
+
+def test_batches_and_single_reads_share_loads():
+    cache = ProfileCache()
+    load = SlowLoadMany({"ann": profile("ann"), "bob": profile("bob")})
+    singles = []
+
+    async def load_one(user_id):
+        singles.append(user_id)
+        return profile(user_id)
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_many(["ann", "bob"], load))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get_many(["bob", "ann"], load))
+        single = asyncio.ensure_future(cache.get("ann", load_one))
+        await asyncio.sleep(0)
+        load.release.set()
+        return await asyncio.gather(first, second, single)
+
+    first, second, single = asyncio.run(run())
+    assert load.calls == [["ann", "bob"]]
+    assert not singles
+    assert names(first) == names(second) == {"ann": "ann", "bob": "bob"}
+    assert single[0]["name"] == "ann"
+    assert cache.counters["shared"] == 3
+
+
+def test_a_failed_load_fails_every_waiter_and_is_retried():
+    cache = ProfileCache()
+    load = SlowLoadMany({}, error=ConnectionResetError("store gone"))
+
+    async def run():
+        calls = [asyncio.ensure_future(cache.get_many(["ann", "bob"], load)) for _ in range(2)]
+        await asyncio.sleep(0)
+        load.release.set()
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ConnectionResetError) for result in results)
+    assert load.calls == [["ann", "bob"]]
+    assert not cache._loading
+
+    load.error = None
+    load.profiles = {"ann": profile("ann")}
+    assert names(asyncio.run(cache.get_many(["ann"], load))) == {"ann": "ann"}
+    assert len(load.calls) == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_load():
+    cache = ProfileCache()
+    load = SlowLoadMany({"ann": profile("ann")})
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_many(["ann"], load))
+        second = asyncio.ensure_future(cache.get_many(["ann"], load))
+        await asyncio.sleep(0)
+        first.cancel()
+        load.release.set()
+        return await second
+
+    assert names(asyncio.run(run())) == {"ann": "ann"}
+    assert load.calls == [["ann"]]
+    assert cache.stats()["entries"] == 1
+
+
+def test_a_load_overtaken_by_a_write_is_not_cached():
+    cache = ProfileCache()
+    load = SlowLoadMany({"ann": profile("ann")})
+
+    async def run():
+        call = asyncio.ensure_future(cache.get_many(["ann"], load))
+        await asyncio.sleep(0)
+        cache.put("ann", profile("ann-renamed"))
+        load.release.set()
+        return await call
+
+    assert names(asyncio.run(run())) == {"ann": "ann"}
+    cached = asyncio.run(cache.get_many(["ann"], load))
+    assert names(cached) == {"ann": "ann-renamed"}
+    assert len(load.calls) == 1
+
+
+@pytest.fixture
+def memory_users(monkeypatch):
+    store = MemoryUserStore()
+    monkeypatch.setattr(user_controller, "users", store)
+    monkeypatch.setattr(user_controller, "profiles", ProfileCache())
+    for user_id in ("ann", "bob"):
+        asyncio.run(store.set_profile(user_id, {
+            **profile(user_id),
+            "created_at": "2024-05-01T00:00:00",
+        }))
+    return store
+
+
+def lookup(ids):
+    return asyncio.run(user_controller.get_users_batch(UserBatchRequest(ids=ids), current_user_id="ann"))
+
+
+def test_batch_endpoint_returns_every_id_in_order(memory_users):
+    response = lookup(["bob", "nobody", "ann", "bob", "a/b", "__x__", ""])
+
+    assert [(entry.id, entry.found) for entry in response.users] == [
+        ("bob", True), ("nobody", False), ("ann", True), ("bob", True),
+        ("a/b", False), ("__x__", False), ("", False),
+    ]
+    assert response.users[0].user.email == "bob@example.com"
+    assert memory_users.counters["calls"] == 2 + 1  # Two profiles set, one read
+
+    lookup(["ann", "bob"])
+    assert memory_users.counters["calls"] == 3  # Served from the cache
+
+
+def test_batch_endpoint_limits(memory_users, monkeypatch):
+    assert lookup([]).users == []
+    assert memory_users.counters["calls"] == 2
+
+    monkeypatch.setattr(user_controller, "USER_BATCH_MAX", 2)
+    with pytest.raises(HTTPException) as error:
+        lookup(["ann", "bob", "nobody"])
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("user_id, valid", [
+    ("Xy7aBc12", True),
+    ("", False),
+    ("a/b", False),
+    (".", False),
+    ("..", False),
+    ("__name__", False),
+    ("x" * 1500, True),
+    ("x" * 1501, False),
+])
+def test_document_ids(user_id, valid):
+    assert is_document_id(user_id) is valid
@@ -0,0 +1,91 @@
+"""ReplayBuffer: resuming from a cursor, late readings, retention and losses"""
+
+import time
+
+from services.replay_buffer import ReplayBuffer
+
+
+def feed(buffer, device_id, cursors, watched=True):
+    for cursor in cursors:
+        late = buffer.arrived(device_id, cursor)
+        buffer.record(device_id, cursor, {"cursor": cursor}, watched, late)
+
+
+def cursors(messages):
+    return None if messages is None else [message["cursor"] for message in messages]
+
+
+def test_since_returns_what_arrived_after_the_cursor():
+    buffer = ReplayBuffer(size=8)
+    feed(buffer, 'hive-001', [10, 20, 30, 40])
+
+    assert cursors(buffer.since('hive-001', 20)) == [30, 40]
+    assert cursors(buffer.since('hive-001', 40)) == []
+    assert cursors(buffer.since('hive-001', 25)) == [30, 40]
+    assert buffer.counters["hits"] == 3
+
+
+def test_since_misses_when_the_buffer_does_not_reach_back():
+    buffer = ReplayBuffer(size=3)
+    feed(buffer, 'hive-001', [10, 20, 30, 40, 50])
+
+    assert buffer.since('hive-001', 10) is None
+    assert buffer.since('hive-002', 10) is None
+    assert cursors(buffer.since('hive-001', 30)) == [40, 50]
+    assert buffer.counters["misses"] == 2
+
+
+def test_late_readings_after_the_position_are_returned():
+    buffer = ReplayBuffer(size=8)
+    feed(buffer, 'hive-001', [10, 20, 30])
+    # The client saw 30, then a store-and-forward reading from before it arrived
+    feed(buffer, 'hive-001', [15, 40])
+
+    assert buffer.counters["late"] == 1
+    assert cursors(buffer.since('hive-001', 30)) == [15, 40]
+    # A late entry is never the resume position
+    assert cursors(buffer.since('hive-001', 15)) == [20, 30, 15, 40]
+
+
+def test_late_before_reports_late_arrivals_the_database_would_miss():
+    buffer = ReplayBuffer()
+    now_us = int(time.time() * 1e6)
+    feed(buffer, 'hive-001', [now_us])
+    feed(buffer, 'hive-001', [now_us - 10_000_000])  # Late, 10 s old
+
+    # Arrived after a cursor 5 s old, but older than it: a range after the cursor misses it
+    assert buffer.late_before('hive-001', now_us - 5_000_000)
+    # A range after a cursor 20 s old still holds it
+    assert not buffer.late_before('hive-001', now_us - 20_000_000)
+    assert not buffer.late_before('hive-002', now_us - 60_000_000)
+
+
+def test_lost_readings_clear_the_buffers_and_mark_older_cursors():
+    buffer = ReplayBuffer()
+    now_us = int(time.time() * 1e6)
+    feed(buffer, 'hive-001', [now_us - 2_000_000, now_us - 1_000_000])
+
+    buffer.lost()
+
+    assert buffer.since('hive-001', now_us - 2_000_000) is None
+    assert buffer.late_before('hive-002', now_us - 5_000_000)
+    assert not buffer.late_before('hive-002', now_us + 5_000_000)
+
+
+def test_unwatched_devices_are_kept_only_within_the_retention():
+    buffer = ReplayBuffer(retain=0.01)
+    feed(buffer, 'hive-001', [10], watched=True)
+    feed(buffer, 'hive-002', [10], watched=False)
+    assert buffer.stats()["devices"] == 1
+
+    feed(buffer, 'hive-001', [20], watched=False)  # Viewer left just now
+    assert cursors(buffer.since('hive-001', 10)) == [20]
+
+    time.sleep(0.02)
+    feed(buffer, 'hive-001', [30], watched=False)
+    assert buffer.since('hive-001', 20) is None
+
+    feed(buffer, 'hive-003', [10], watched=True)
+    time.sleep(0.02)
+    buffer.prune()
+    assert buffer.stats()["devices"] == 0
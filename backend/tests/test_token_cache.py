@@ -0,0 +1,118 @@
+"""Verified-token cache, and sharing one verification between concurrent requests"""
+
+import asyncio
+import time
+
+from middleware import auth as auth_module
+from middleware.token_cache import TokenCache
+
+
+def test_tokens_are_keyed_by_hash():
+    key = TokenCache.key("header.payload.signature")
+    assert len(key) == 32
+    assert b"payload" not in key
+
+
+def test_hit_and_miss():
+    cache = TokenCache(ttl=60)
+    key = TokenCache.key("token")
+    assert cache.get(key) is None
+    cache.put(key, {"uid": "user-1"})
+    assert cache.get(key) == {"uid": "user-1"}
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_entries_never_outlive_the_token():
+    cache = TokenCache(ttl=300)
+    key = TokenCache.key("token")
+    cache.put(key, {"uid": "user-1", "exp": time.time() + 0.01})
+    assert cache.get(key) is not None
+    time.sleep(0.02)
+    assert cache.get(key) is None
+    assert cache.counters["expired"] == 1
+
+    # Already expired: not cached at all
+    cache.put(key, {"uid": "user-1", "exp": time.time() - 1})
+    assert cache.stats()["entries"] == 0
+
+
+def test_ttl_override():
+    cache = TokenCache(ttl=300)
+    key = TokenCache.key("token")
+    cache.put(key, {"uid": "user-1"}, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_is_evicted():
+    cache = TokenCache(size=2, ttl=60)
+    keys = [TokenCache.key(f"token-{n}") for n in range(3)]
+    cache.put(keys[0], {"uid": "0"})
+    cache.put(keys[1], {"uid": "1"})
+    cache.get(keys[0])
+    cache.put(keys[2], {"uid": "2"})
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == {"uid": "0"}
+    assert cache.counters["evictions"] == 1
+
+
+def verifying(monkeypatch, result):
+    """Replace the real verification with one that counts calls and waits a moment"""
+    calls = []
+
+    async def verify(token):
+        calls.append(token)
+        await asyncio.sleep(0.01)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(auth_module, "_verify_uncached", verify)
+    monkeypatch.setattr(auth_module, "_token_cache", TokenCache(ttl=60))
+    monkeypatch.setattr(auth_module, "_inflight", {})
+    return calls
+
+
+def test_concurrent_requests_share_one_verification(monkeypatch):
+    calls = verifying(monkeypatch, {"uid": "user-1"})
+
+    async def run():
+        first = await asyncio.gather(*(auth_module._verify_token("token") for _ in range(5)))
+        # Cached now
+        return first, await auth_module._verify_token("token")
+
+    first, again = asyncio.run(run())
+    assert calls == ["token"]
+    assert first == [{"uid": "user-1"}] * 5
+    assert again == {"uid": "user-1"}
+    assert not auth_module._inflight
+
+
+def test_failed_verifications_are_not_cached(monkeypatch):
+    calls = verifying(monkeypatch, ValueError("bad signature"))
+
+    async def run():
+        results = []
+        for _ in range(2):
+            try:
+                await auth_module._verify_token("token")
+            except ValueError as e:
+                results.append(e)
+        return results
+
+    assert len(asyncio.run(run())) == 2
+    assert calls == ["token", "token"]
+
+
+def test_a_cancelled_request_does_not_cancel_the_shared_verification(monkeypatch):
+    calls = verifying(monkeypatch, {"uid": "user-1"})
+
+    async def run():
+        first = asyncio.ensure_future(auth_module._verify_token("token"))
+        second = asyncio.ensure_future(auth_module._verify_token("token"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == {"uid": "user-1"}
+    assert calls == ["token"]
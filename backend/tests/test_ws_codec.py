@@ -0,0 +1,58 @@
+"""Binary WebSocket frames: what FrameEncoder writes, FrameDecoder reads back"""
+
+import pytest
+
+from services.ws_codec import (
+    FrameEncoder, FrameDecoder, FRAME_HEADER, FULL_RECORD, DELTA_RECORD, MAGIC, VERSION
+)
+
+
+def reading(hive_id, cursor, temperature=35.12, humidity=60.5, weight=42.0, sound_level=55.25):
+    return {
+        "hive_id": hive_id,
+        "cursor": cursor,
+        "temperature": temperature,
+        "humidity": humidity,
+        "weight": weight,
+        "sound_level": sound_level,
+    }
+
+
+def test_round_trip_across_frames():
+    encoder, decoder = FrameEncoder(), FrameDecoder()
+    frames = [
+        [reading(1, 1_700_000_000_000_000), reading(2, 1_700_000_000_000_500, temperature=-3.5)],
+        [reading(1, 1_700_000_001_000_000, temperature=35.2), reading(2, 1_700_000_001_000_500)],
+        [reading(1, 1_700_000_002_000_000, humidity=None)],
+    ]
+    for messages in frames:
+        assert decoder.decode(encoder.encode(messages)) == messages
+
+
+def test_later_readings_of_a_hive_are_deltas():
+    encoder = FrameEncoder()
+    first = encoder.encode([reading(1, 1_000_000)])
+    second = encoder.encode([reading(1, 2_000_000, temperature=35.5)])
+    assert len(first) == FRAME_HEADER.size + FULL_RECORD.size
+    assert len(second) == FRAME_HEADER.size + DELTA_RECORD.size
+
+
+@pytest.mark.parametrize("change", [
+    {"cursor": 1_000_000 + 2 ** 31},  # cursor delta beyond int32
+    {"weight": 42.0 + 400},  # value delta beyond int16 hundredths
+    {"sound_level": None},  # missing value
+])
+def test_falls_back_to_full_records(change):
+    encoder, decoder = FrameEncoder(), FrameDecoder()
+    decoder.decode(encoder.encode([reading(1, 1_000_000)]))
+    message = {**reading(1, 1_000_000), **change}
+    frame = encoder.encode([message])
+    assert len(frame) == FRAME_HEADER.size + FULL_RECORD.size
+    assert decoder.decode(frame) == [message]
+
+
+def test_rejects_unknown_frames():
+    with pytest.raises(ValueError):
+        FrameDecoder().decode(FRAME_HEADER.pack(MAGIC, VERSION + 1, 0))
+    with pytest.raises(ValueError):
+        FrameDecoder().decode(FRAME_HEADER.pack(MAGIC ^ 0xFF, VERSION, 0))
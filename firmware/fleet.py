@@ -0,0 +1,251 @@
+"""
+Beehive Fleet Simulator
+Drives thousands of virtual hives from one process over a few MQTT connections
+"""
+
+import json
+import math
+import time
+import heapq
+import random
+import threading
+from datetime import datetime
+import paho.mqtt.client as mqtt
+
+from payload_format import encode_binary
+
+
+DRIFT_MODELS = ('random', 'walk', 'diurnal', 'mixed')
+
+# Baselines and the band each value is kept in: temperature, humidity, weight, sound_level
+BASELINES = (35.0, 60.0, 45.0, 50.0)
+LIMITS = ((20.0, 45.0), (20.0, 95.0), (5.0, 120.0), (10.0, 100.0))
+NOISE = (2.0, 5.0, 0.5, 10.0)
+
+
+class VirtualHive:
+    """Compact per-device state: current values, drift model and schedule"""
+    __slots__ = ('device_id', 'topic', 'model', 'values', 'phase', 'connection')
+
+    def __init__(self, device_id, model, connection):
+        self.device_id = device_id
+        self.topic = f"beehive/{device_id}/telemetry"
+        self.model = model
+        self.values = [base + random.uniform(-n, n) / 2 for base, n in zip(BASELINES, NOISE)]
+        self.phase = random.random()
+        self.connection = connection
+
+    def sample(self, now):
+        """Advance the drift model and return the four sensor values"""
+        if self.model == 'walk':
+            for i, (low, high) in enumerate(LIMITS):
+                self.values[i] = min(high, max(low, self.values[i] + random.gauss(0, NOISE[i] / 10)))
+            return [round(v, 2) for v in self.values]
+
+        if self.model == 'diurnal':
+            # One cycle per day, offset per hive, plus a little noise
+            day = math.sin(2 * math.pi * (now / 86400 + self.phase))
+            return [
+                round(self.values[0] + 3.0 * day + random.uniform(-0.3, 0.3), 2),
+                round(self.values[1] - 8.0 * day + random.uniform(-1.0, 1.0), 2),
+                round(self.values[2] + 0.5 * day, 2),
+                round(self.values[3] + 10.0 * day + random.uniform(-2.0, 2.0), 2),
+            ]
+
+        # random: independent noise around the baseline (like BeehiveSimulator)
+        return [round(base + random.uniform(-n, n), 2) for base, n in zip(BASELINES, NOISE)]
+
+
+class FleetConnection:
+    """One MQTT client shared by many virtual hives, tracking PUBACK latency"""
+
+    def __init__(self, index, broker_host, broker_port, max_inflight):
+        self.index = index
+        self.client = mqtt.Client(client_id=f"fleet_simulator_{index}_{random.randrange(1 << 30)}")
+        self.client.max_inflight_messages_set(max_inflight)
+        self.client.on_publish = self.on_publish
+        self.broker_host = broker_host
+        self.broker_port = broker_port
+
+        self._lock = threading.Lock()
+        self._sent_at = {}
+        self._acked_early = {}
+        self.latencies = []
+        self.published = 0
+        self.errors = 0
+
+    def connect(self):
+        self.client.connect(self.broker_host, self.broker_port, 60)
+        self.client.loop_start()
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+    def publish(self, topic, payload):
+        started = time.perf_counter()
+        result = self.client.publish(topic, payload, qos=1)
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            self.errors += 1
+            return
+        self.published += 1
+        # The PUBACK can race the return of publish(); whichever side comes
+        # second records the latency. Never hold this lock while calling paho.
+        with self._lock:
+            acked = self._acked_early.pop(result.mid, None)
+            if acked is None:
+                self._sent_at[result.mid] = started
+            else:
+                self.latencies.append(acked - started)
+
+    def on_publish(self, client, userdata, mid):
+        now = time.perf_counter()
+        with self._lock:
+            started = self._sent_at.pop(mid, None)
+            if started is None:
+                self._acked_early[mid] = now
+            else:
+                self.latencies.append(now - started)
+
+    def unacked(self):
+        with self._lock:
+            return len(self._sent_at)
+
+
+class FleetSimulator:
+    """
+    Simulates `fleet` hives publishing at an aggregate `rate` messages/second.
+
+    Every hive reports once per fleet/rate seconds. Each next send is jittered
+    by +/- `jitter` of that interval, and start times are spread over the first
+    interval so the fleet does not publish in lockstep. Hives are spread
+    round-robin over `connections` MQTT clients. Nothing is printed per message.
+    """
+
+    def __init__(self, fleet, rate, broker_host='localhost', broker_port=1883, connections=4,
+                 drift='mixed', jitter=0.1, payload_format='json', device_prefix='fleet-hive',
+                 max_inflight=1000):
+        if drift not in DRIFT_MODELS:
+            raise ValueError(f"Unknown drift model '{drift}'. Use one of: {', '.join(DRIFT_MODELS)}")
+        self.fleet = fleet
+        self.rate = rate
+        self.interval = fleet / rate
+        self.jitter = jitter
+        self.payload_format = payload_format
+        self.broker_host = broker_host
+        self.broker_port = broker_port
+        self.max_inflight = max_inflight
+
+        self.connections = [self.make_connection(i) for i in range(max(1, connections))]
+        models = ('random', 'walk', 'diurnal')
+        self.hives = [
+            VirtualHive(
+                f"{device_prefix}-{i:05d}",
+                random.choice(models) if drift == 'mixed' else drift,
+                self.connections[i % len(self.connections)]
+            )
+            for i in range(fleet)
+        ]
+
+    def make_connection(self, index):
+        """Create the connection for one slice of the fleet"""
+        return FleetConnection(index, self.broker_host, self.broker_port, self.max_inflight)
+
+    def encode(self, hive, now, values):
+        if self.payload_format == 'binary':
+            return encode_binary([{
+                "timestamp": now * 1000,
+                "temperature": values[0],
+                "humidity": values[1],
+                "weight": values[2],
+                "sound_level": values[3],
+            }])
+        return json.dumps({
+            "device_id": hive.device_id,
+            "timestamp": datetime.utcfromtimestamp(now).isoformat() + "Z",
+            "temperature": values[0],
+            "humidity": values[1],
+            "weight": values[2],
+            "sound_level": values[3],
+        })
+
+    def run(self, duration=60, count=None, report_every=10):
+        """Publish until duration seconds have passed (or count messages were sent)"""
+        for connection in self.connections:
+            connection.connect()
+        time.sleep(1)  # Wait for connections
+
+        print(
+            f"Fleet of {self.fleet} hives over {len(self.connections)} connections, "
+            f"target {self.rate:.0f} msg/s (each hive every {self.interval:.2f}s)"
+        )
+
+        start = time.monotonic()
+        schedule = [(start + random.uniform(0, self.interval), i) for i in range(self.fleet)]
+        heapq.heapify(schedule)
+
+        sent = 0
+        next_report = start + report_every
+        deadline = start + duration if duration else None
+        try:
+            while schedule:
+                due, index = schedule[0]
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                if due > now:
+                    time.sleep(min(due - now, 0.05))
+                    continue
+
+                hive = self.hives[index]
+                wall = time.time()
+                hive.connection.publish(hive.topic, self.encode(hive, wall, hive.sample(wall)))
+                sent += 1
+                if count is not None and sent >= count:
+                    break
+
+                next_due = due + self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+                heapq.heapreplace(schedule, (next_due, index))
+
+                if report_every and now >= next_report:
+                    print(f"  {sent} sent, {sent / (now - start):.0f} msg/s")
+                    next_report = now + report_every
+        except KeyboardInterrupt:
+            print("\nFleet stopped by user")
+
+        elapsed = time.monotonic() - start
+        self._drain(timeout=10)
+        for connection in self.connections:
+            connection.close()
+        return self.summary(sent, elapsed)
+
+    def _drain(self, timeout):
+        """Wait for outstanding PUBACKs"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(c.unacked() for c in self.connections):
+            time.sleep(0.05)
+
+    def summary(self, sent, elapsed):
+        """Achieved publish rate and PUBACK latency percentiles"""
+        latencies = sorted(latency for c in self.connections for latency in c.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+
+        return {
+            "fleet": self.fleet,
+            "target_rate": self.rate,
+            "sent": sent,
+            "acked": len(latencies),
+            "errors": sum(c.errors for c in self.connections),
+            "elapsed_s": round(elapsed, 2),
+            "achieved_rate": round(sent / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": percentile(0.50),
+                "p90": percentile(0.90),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 3) if latencies else None,
+            },
+        }
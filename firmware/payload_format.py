@@ -0,0 +1,49 @@
+"""
+Telemetry Payload Encoder
+Encodes simulator samples in the compact binary wire format
+"""
+
+import struct
+from datetime import datetime, timezone
+
+
+# Compact binary format, version 1 (keep in sync with telemetry/codec.py)
+#   header:  <B magic 0xBE> <B version> <H record count>
+#   records: <q epoch milliseconds> <4i temperature, humidity, weight, sound_level>
+# Values are fixed-point hundredths (35.12 -> 3512); MISSING marks an absent value.
+# The device id is carried by the topic (beehive/{device_id}/telemetry).
+MAGIC = 0xBE
+VERSION = 1
+HEADER = struct.Struct('<BBH')
+RECORD = struct.Struct('<q4i')
+MISSING = -2 ** 31
+SCALE = 100
+
+FIELDS = ('temperature', 'humidity', 'weight', 'sound_level')
+
+
+def epoch_millis(timestamp):
+    """
+    Convert an ISO-8601 timestamp (as produced by the simulator) to epoch ms.
+    Numbers are taken as epoch milliseconds already, like the consumer does.
+    """
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    if timestamp.endswith('Z'):
+        timestamp = timestamp[:-1] + '+00:00'
+    time = datetime.fromisoformat(timestamp)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return int(time.timestamp() * 1000)
+
+
+def encode_binary(samples):
+    """Encode a list of telemetry dicts into one compact binary payload"""
+    parts = [HEADER.pack(MAGIC, VERSION, len(samples))]
+    for sample in samples:
+        values = (sample.get(field) for field in FIELDS)
+        parts.append(RECORD.pack(
+            epoch_millis(sample['timestamp']),
+            *(MISSING if value is None else round(value * SCALE) for value in values)
+        ))
+    return b''.join(parts)
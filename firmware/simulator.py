@@ -8,18 +8,50 @@ import json
 import random
 import time
 import argparse
+from collections import deque
 from datetime import datetime
 import paho.mqtt.client as mqtt
 
+from payload_format import encode_binary
+from fleet import FleetSimulator, DRIFT_MODELS
+
+
+PAYLOAD_FORMATS = ('json', 'binary')
+
+# The binary header stores the record count in 16 bits
+MAX_BATCH_SIZE = 65535
+
 
 class BeehiveSimulator:
-    def __init__(self, device_id, broker_host='localhost', broker_port=1883):
+    def __init__(self, device_id, broker_host='localhost', broker_port=1883, payload_format='json',
+                 batch_size=1, batch_interval=None, buffer_limit=10000):
+        """
+        Args:
+            device_id: Unique device identifier
+            broker_host: MQTT broker hostname
+            broker_port: MQTT broker port
+            payload_format: 'json' or 'binary'
+            batch_size: Samples sent per message once that many are buffered
+            batch_interval: Send a partial batch once its oldest sample is this many seconds old
+            buffer_limit: Samples kept while disconnected; the oldest are dropped beyond it
+        """
         self.device_id = device_id
+        self.payload_format = payload_format
         self.broker_host = broker_host
         self.broker_port = broker_port
         self.client = mqtt.Client(client_id=f"simulator_{device_id}")
         self.topic = f"beehive/{device_id}/telemetry"
         
+        # Store-and-forward buffer of (monotonic time buffered, sample)
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.batch_interval = batch_interval
+        self.pending = deque()
+        self.buffer_limit = buffer_limit
+        self.connected = False
+        self.samples_dropped = 0
+        self.messages_sent = 0
+        self.last_publish = None
+        
         # Simulated baseline values with some variation
         self.base_temperature = 35.0  # Celsius
         self.base_humidity = 60.0     # Percentage
@@ -28,10 +60,17 @@ class BeehiveSimulator:
         
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
+            self.connected = True
             print(f"[{self.device_id}] Connected to MQTT broker at {self.broker_host}:{self.broker_port}")
+            if self.pending:
+                print(f"[{self.device_id}] {len(self.pending)} buffered samples will be sent")
         else:
             print(f"[{self.device_id}] Connection failed with code {rc}")
     
+    def on_disconnect(self, client, userdata, rc):
+        self.connected = False
+        print(f"[{self.device_id}] Disconnected (rc: {rc}), buffering samples locally")
+    
     def on_publish(self, client, userdata, mid):
         print(f"[{self.device_id}] Message published (mid: {mid})")
     
@@ -56,6 +95,7 @@ class BeehiveSimulator:
     def connect(self):
         """Connect to MQTT broker"""
         self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
         self.client.on_publish = self.on_publish
         
         try:
@@ -67,46 +107,102 @@ class BeehiveSimulator:
             print(f"[{self.device_id}] Error connecting: {e}")
             return False
     
-    def publish_telemetry(self):
-        """Generate and publish telemetry data"""
-        telemetry = self.generate_telemetry()
-        payload = json.dumps(telemetry)
+    def encode_payload(self, samples):
+        """Encode one sample (dict) or a batch (list) in the configured wire format"""
+        if isinstance(samples, dict):
+            samples = [samples]
+        if self.payload_format == 'binary':
+            # Compact fixed-size records; the device id travels in the topic
+            return encode_binary(samples)
+        # A single sample stays a plain object for consumers that predate batching
+        return json.dumps(samples[0] if len(samples) == 1 else samples)
+    
+    def buffer_sample(self, telemetry):
+        """Add a sample to the store-and-forward buffer, dropping the oldest when full"""
+        if len(self.pending) >= self.buffer_limit:
+            self.pending.popleft()
+            self.samples_dropped += 1
+        self.pending.append((time.monotonic(), telemetry))
+    
+    def flush(self, force=False):
+        """
+        Publish buffered samples while connected.
         
+        Full batches are always sent; a partial batch is sent when force is set
+        or when its oldest sample has waited batch_interval seconds.
+        """
+        while self.pending and self.connected:
+            oldest_age = time.monotonic() - self.pending[0][0]
+            due = (
+                force
+                or len(self.pending) >= self.batch_size
+                or (self.batch_interval is not None and oldest_age >= self.batch_interval)
+            )
+            if not due:
+                return
+            
+            chunk = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+            if not self.publish_batch([sample for _, sample in chunk]):
+                # Keep the samples for the next attempt, in their original order
+                self.pending.extendleft(reversed(chunk))
+                return
+    
+    def publish_batch(self, samples):
+        """Publish a batch of samples as one message"""
+        payload = self.encode_payload(samples)
         result = self.client.publish(self.topic, payload, qos=1)
         
         if result.rc == mqtt.MQTT_ERR_SUCCESS:
-            print(f"[{self.device_id}] Published: {payload}")
+            self.messages_sent += 1
+            self.last_publish = result
+            print(f"[{self.device_id}] Published {len(samples)} samples ({self.payload_format}, {len(payload)} bytes)")
         else:
             print(f"[{self.device_id}] Publish failed with code {result.rc}")
         
         return result.rc == mqtt.MQTT_ERR_SUCCESS
     
+    def publish_telemetry(self):
+        """Generate and publish telemetry data (buffered while disconnected)"""
+        telemetry = self.generate_telemetry()
+        self.buffer_sample(telemetry)
+        self.flush()
+        return telemetry
+    
     def run(self, interval=5, count=None):
         """
         Run the simulator
         
         Args:
-            interval: Seconds between telemetry transmissions
-            count: Number of messages to send (None for infinite)
+            interval: Seconds between telemetry samples
+            count: Number of samples to take (None for infinite)
         """
         if not self.connect():
             print(f"[{self.device_id}] Failed to connect. Exiting.")
             return
         
-        print(f"[{self.device_id}] Starting telemetry transmission (interval: {interval}s)")
+        batching = f", batch: {self.batch_size}" if self.batch_size > 1 else ""
+        print(f"[{self.device_id}] Starting telemetry transmission (interval: {interval}s{batching})")
         
-        messages_sent = 0
+        samples_taken = 0
         try:
-            while count is None or messages_sent < count:
+            while count is None or samples_taken < count:
                 self.publish_telemetry()
-                messages_sent += 1
+                samples_taken += 1
                 time.sleep(interval)
         except KeyboardInterrupt:
             print(f"\n[{self.device_id}] Stopped by user")
         finally:
+            # Send what is left and give the broker a chance to acknowledge it
+            self.flush(force=True)
+            if self.last_publish is not None:
+                self.last_publish.wait_for_publish(timeout=5)
             self.client.loop_stop()
             self.client.disconnect()
-            print(f"[{self.device_id}] Disconnected. Total messages sent: {messages_sent}")
+            print(
+                f"[{self.device_id}] Disconnected. Samples: {samples_taken}, "
+                f"messages sent: {self.messages_sent}, unsent: {len(self.pending)}, "
+                f"dropped: {self.samples_dropped}"
+            )
 
 
 def main():
@@ -120,14 +216,58 @@ def main():
     parser.add_argument('--interval', type=int, default=5,
                         help='Seconds between transmissions (default: 5)')
     parser.add_argument('--count', type=int, default=None,
-                        help='Number of messages to send (default: infinite)')
+                        help='Number of samples to take (default: infinite)')
+    parser.add_argument('--format', choices=PAYLOAD_FORMATS, default='json',
+                        help='Payload format: json or compact binary (default: json)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Samples per message (default: 1, no batching)')
+    parser.add_argument('--batch-interval', type=float, default=None,
+                        help='Send a partial batch after this many seconds (default: wait for a full batch)')
+    parser.add_argument('--buffer-limit', type=int, default=10000,
+                        help='Samples buffered while disconnected (default: 10000)')
+
+    fleet = parser.add_argument_group('fleet mode', 'Simulate many hives from one process')
+    fleet.add_argument('--fleet', type=int, default=None,
+                       help='Number of virtual hives (enables fleet mode)')
+    fleet.add_argument('--rate', type=float, default=None,
+                       help='Aggregate messages per second (default: fleet / interval)')
+    fleet.add_argument('--connections', type=int, default=4,
+                       help='MQTT connections shared by the fleet (default: 4)')
+    fleet.add_argument('--drift', choices=DRIFT_MODELS, default='mixed',
+                       help='Per-hive drift model; mixed picks one per hive (default: mixed)')
+    fleet.add_argument('--jitter', type=float, default=0.1,
+                       help='Schedule jitter as a fraction of the interval (default: 0.1)')
+    fleet.add_argument('--duration', type=float, default=60,
+                       help='Seconds to run in fleet mode (default: 60)')
+    fleet.add_argument('--max-inflight', type=int, default=1000,
+                       help='Unacknowledged QoS 1 messages per connection (default: 1000)')
     
     args = parser.parse_args()
+
+    if args.fleet:
+        simulator = FleetSimulator(
+            fleet=args.fleet,
+            rate=args.rate or args.fleet / args.interval,
+            broker_host=args.broker,
+            broker_port=args.port,
+            connections=args.connections,
+            drift=args.drift,
+            jitter=args.jitter,
+            payload_format=args.format,
+            device_prefix=args.device_id,
+            max_inflight=args.max_inflight
+        )
+        print(json.dumps(simulator.run(duration=args.duration, count=args.count), indent=2))
+        return
     
     simulator = BeehiveSimulator(
         device_id=args.device_id,
         broker_host=args.broker,
-        broker_port=args.port
+        broker_port=args.port,
+        payload_format=args.format,
+        batch_size=args.batch_size,
+        batch_interval=args.batch_interval,
+        buffer_limit=args.buffer_limit
     )
     
     simulator.run(interval=args.interval, count=args.count)
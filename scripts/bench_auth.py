@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Auth overhead benchmark: what token verification costs per request
+
+Mints Firebase-shaped ID tokens with a locally generated RSA key, points the
+local verifier (AUTH_VERIFIER=local) at a key file holding its public key and
+times, per request:
+  - verify:   the local verifier alone (signature and claims, no cache)
+  - cached:   get_current_user_id with the same token every request
+  - distinct: get_current_user_id with a new token every request (cache misses)
+
+Nothing touches the network, so the numbers are the whole cost of auth on
+the request path.
+
+Usage:
+    python scripts/bench_auth.py
+    python scripts/bench_auth.py --requests 50000 --key-bits 4096
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+PROJECT_ID = 'bench-project'
+KID = 'bench-key'
+
+
+def write_key_file(private_key, path):
+    pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    with open(path, 'w') as f:
+        json.dump({KID: pem.decode()}, f)
+
+
+def mint(private_key, uid, now):
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "iat": now,
+        "auth_time": now,
+        "exp": now + 3600,
+    }
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": KID})
+
+
+def summarize(name, samples):
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        "case": name,
+        "requests": len(samples),
+        "p50_us": round(samples[len(samples) // 2] * 1e6, 2),
+        "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6, 2),
+        "mean_us": round(total / len(samples) * 1e6, 2),
+        "ops_per_s": round(len(samples) / total),
+    }
+
+
+async def run(args, private_key):
+    # Imported here: the verifier is configured from the environment at import time
+    from middleware import auth
+
+    await auth.start_verifier()
+    now = int(time.time())
+    token = mint(private_key, 'bench-user', now)
+    distinct = [mint(private_key, f'bench-user-{index}', now) for index in range(args.requests)]
+    results = []
+
+    samples = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        auth._local_verifier.verify(token)
+        samples.append(time.perf_counter() - started)
+    results.append(summarize('verify', samples))
+
+    header = f"Bearer {token}"
+    await auth.get_current_user_id(header)
+    samples = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        await auth.get_current_user_id(header)
+        samples.append(time.perf_counter() - started)
+    results.append(summarize('cached', samples))
+
+    samples = []
+    for token in distinct:
+        started = time.perf_counter()
+        await auth.get_current_user_id(f"Bearer {token}")
+        samples.append(time.perf_counter() - started)
+    results.append(summarize('distinct', samples))
+
+    await auth.stop_verifier()
+    return results, auth.auth_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-request token verification cost')
+    parser.add_argument('--requests', type=int, default=10000, help='Requests per case (default: 10000)')
+    parser.add_argument('--key-bits', type=int, default=2048,
+                        help='RSA key size; Firebase signs with 2048 (default: 2048)')
+    parser.add_argument('--output', default=None, help='Also write the results as JSON to this path')
+    args = parser.parse_args()
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=args.key_bits)
+    with tempfile.TemporaryDirectory() as directory:
+        key_file = os.path.join(directory, 'keys.json')
+        write_key_file(private_key, key_file)
+        os.environ.update({
+            "AUTH_VERIFIER": "local",
+            "AUTH_KEY_FILE": key_file,
+            "AUTH_CHECK_REVOKED": "off",
+            "FIREBASE_PROJECT_ID": PROJECT_ID,
+            # Room for the distinct-token case, so it measures verification, not eviction
+            "AUTH_CACHE_SIZE": str(args.requests + 1),
+        })
+        sys.path.insert(0, 'backend')
+        results, stats = asyncio.run(run(args, private_key))
+
+    print(f"{'case':<12}{'p50 us':>10}{'p99 us':>10}{'mean us':>10}{'ops/s':>10}")
+    for result in results:
+        print(
+            f"{result['case']:<12}{result['p50_us']:>10}{result['p99_us']:>10}"
+            f"{result['mean_us']:>10}{result['ops_per_s']:>10}"
+        )
+    print(f"Cache hit rate: {stats['cache']['hit_rate']}, verifications: {stats['verifications']}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({"benchmark": "auth", "config": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+WebSocket frame benchmark: JSON vs binary vs batched binary live readings
+
+Subscribes many in-process fake sockets to a set of hives through the real
+ConnectionManager, broadcasts rounds of live readings (one per hive per
+round, drifting like the fleet simulator's 'walk' model) and reports, per
+format:
+  - bytes per reading delivered: payload only, and on the wire including
+    the WebSocket frame header (server frames are unmasked: 2, 4 or 10 bytes)
+  - server CPU per reading delivered (broadcast, encoding and sends)
+  - messages (WebSocket frames) sent per socket
+
+No network is involved, so the CPU numbers leave out the kernel and TLS
+cost, which scales with the bytes and frames sent.
+
+Usage:
+    python scripts/bench_ws_frames.py
+    python scripts/bench_ws_frames.py --sockets 10000 --hives 1000 --hives-per-socket 5 --batch-ms 250
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+from datetime import datetime, timezone
+
+sys.path.insert(0, 'backend')
+sys.path.insert(0, 'firmware')
+from services import ConnectionManager, FrameEncoder, FrameDecoder  # noqa: E402
+from services.ws_codec import FRAME_HEADER  # noqa: E402
+from fleet import VirtualHive  # noqa: E402
+
+
+def process_cpu():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def ws_header_bytes(length):
+    """Size of an unmasked (server to client) WebSocket frame header"""
+    if length < 126:
+        return 2
+    if length < 65536:
+        return 4
+    return 10
+
+
+class FakeSocket:
+    """Stands in for a Starlette WebSocket; counts what would go on the wire"""
+
+    def __init__(self, decoder=None):
+        self.messages = 0
+        self.readings = 0
+        self.payload_bytes = 0
+        self.wire_bytes = 0
+        self.decoder = decoder
+        self.decoded = []
+
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000, reason=None):
+        pass
+
+    async def send_text(self, text):
+        data = text.encode()
+        self._count(len(data), 1)
+        if self.decoder is not None:
+            self.decoded.append(json.loads(text))
+
+    async def send_bytes(self, data):
+        self._count(len(data), FRAME_HEADER.unpack_from(data)[2])
+        if self.decoder is not None:
+            self.decoded.extend(self.decoder.decode(data))
+
+    def _count(self, size, readings):
+        self.messages += 1
+        self.readings += readings
+        self.payload_bytes += size
+        self.wire_bytes += size + ws_header_bytes(size)
+
+
+def reading_message(hive_id, device_id, time_us, values):
+    """Same shape as the live telemetry subscriber's reading messages"""
+    temperature, humidity, weight, sound_level = values
+    return {
+        "type": "reading",
+        "hive_id": hive_id,
+        "cursor": time_us,
+        "time": datetime.fromtimestamp(time_us / 1e6, timezone.utc).isoformat(),
+        "device_id": device_id,
+        "temperature": temperature,
+        "humidity": humidity,
+        "weight": weight,
+        "sound_level": sound_level,
+    }
+
+
+async def run_format(name, batch_ms, args, readings):
+    """Deliver the same readings to a fresh manager with every socket in one format"""
+    manager = ConnectionManager(queue_size=args.queue_size, send_timeout=60)
+    sockets = []
+    for index in range(args.sockets):
+        # The first socket decodes what it gets, to check the encoding round-trips
+        socket = FakeSocket(decoder=FrameDecoder() if index == 0 else None)
+        encoder = None if name == 'json' else FrameEncoder(batch_ms)
+        await manager.connect(socket, encoder=encoder)
+        first = index * args.hives_per_socket
+        for offset in range(args.hives_per_socket):
+            hive_id = (first + offset) % args.hives + 1
+            manager.subscribe(socket, f"bench-hive-{hive_id:05d}", hive_id)
+        sockets.append(socket)
+    await asyncio.sleep(0)
+
+    clients = list(manager._clients.values())
+    queued = sum(
+        len(manager.active_connections.get(device_id, ()))
+        for round_messages in readings
+        for device_id, _ in round_messages
+    )
+    started = time.perf_counter()
+    cpu = process_cpu()
+    for round_messages in readings:
+        round_started = time.perf_counter()
+        for device_id, message in round_messages:
+            await manager.broadcast(device_id, message)
+        await asyncio.sleep(max(0.0, args.interval_ms / 1000 - (time.perf_counter() - round_started)))
+    # Let the senders drain: an empty queue can still have a send in progress,
+    # so wait until every queued reading was sent (or dropped)
+    deadline = time.perf_counter() + manager.send_timeout
+    while manager.counters["sent"] + manager.counters["dropped"] < queued and time.perf_counter() < deadline:
+        await asyncio.sleep(0.001)
+    cpu = process_cpu() - cpu
+    elapsed = time.perf_counter() - started
+
+    check = sockets[0]
+    expected = sorted(
+        (message["hive_id"], message["cursor"], message["temperature"])
+        for round_messages in readings
+        for _, message in round_messages
+        if message["hive_id"] in {(offset % args.hives) + 1 for offset in range(args.hives_per_socket)}
+    )
+    received = sorted((m["hive_id"], m["cursor"], m["temperature"]) for m in check.decoded)
+
+    for client in clients:
+        await client.stop()
+
+    delivered = sum(socket.readings for socket in sockets)
+    stats = manager.stats()
+    return {
+        "format": name,
+        "batch_ms": batch_ms,
+        "readings_delivered": delivered,
+        "payload_bytes_per_reading": round(sum(s.payload_bytes for s in sockets) / delivered, 2),
+        "wire_bytes_per_reading": round(sum(s.wire_bytes for s in sockets) / delivered, 2),
+        "cpu_us_per_reading": round(cpu / delivered * 1e6, 3),
+        "cpu_s": round(cpu, 3),
+        "elapsed_s": round(elapsed, 3),
+        "messages_per_socket": round(sum(s.messages for s in sockets) / len(sockets), 1),
+        "dropped": stats["dropped"],
+        "round_trip_ok": received == expected,
+    }
+
+
+def make_readings(args):
+    """One reading per hive per round, interval_ms apart in reading time"""
+    random.seed(args.seed)
+    hives = [VirtualHive(f"bench-hive-{hive_id:05d}", 'walk', None) for hive_id in range(1, args.hives + 1)]
+    start_us = int(time.time() * 1e6)
+    rounds = []
+    for round_index in range(args.rounds):
+        time_us = start_us + round_index * int(args.interval_ms * 1000)
+        rounds.append([
+            (hive.device_id, reading_message(hive_id, hive.device_id, time_us, hive.sample(time_us / 1e6)))
+            for hive_id, hive in enumerate(hives, start=1)
+        ])
+    return rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare JSON and binary WebSocket frames for live telemetry')
+    parser.add_argument('--sockets', type=int, default=10000, help='Connected sockets (default: 10000)')
+    parser.add_argument('--hives', type=int, default=1000, help='Hives producing readings (default: 1000)')
+    parser.add_argument('--hives-per-socket', type=int, default=5,
+                        help='Hives each socket subscribes to (default: 5)')
+    parser.add_argument('--rounds', type=int, default=10, help='Readings per hive (default: 10)')
+    parser.add_argument('--interval-ms', type=float, default=100,
+                        help='Time between rounds (default: 100)')
+    parser.add_argument('--batch-ms', type=int, default=250,
+                        help='Batching window of the batched binary run (default: 250)')
+    parser.add_argument('--queue-size', type=int, default=4096, help='Per-socket send queue (default: 4096)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=None, help='Also write the results as JSON to this path')
+    args = parser.parse_args()
+
+    readings = make_readings(args)
+    runs = [('json', 0), ('binary', 0), ('binary', args.batch_ms)]
+    results = []
+    for name, batch_ms in runs:
+        print(f"Running {name}{f' (batch {batch_ms} ms)' if batch_ms else ''}...", file=sys.stderr)
+        results.append(asyncio.run(run_format(name, batch_ms, args, readings)))
+
+    print(f"{'format':<20}{'payload B/rdg':>15}{'wire B/rdg':>12}{'CPU us/rdg':>12}{'msgs/socket':>13}{'ok':>5}")
+    for result in results:
+        label = result['format'] + (f"+batch{result['batch_ms']}" if result['batch_ms'] else '')
+        print(
+            f"{label:<20}{result['payload_bytes_per_reading']:>15}{result['wire_bytes_per_reading']:>12}"
+            f"{result['cpu_us_per_reading']:>12}{result['messages_per_socket']:>13}"
+            f"{'yes' if result['round_trip_ok'] else 'NO':>5}"
+        )
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({"benchmark": "ws_frames", "config": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+MQTT to asyncio bridge
+Hands raw payloads from paho's network thread to a pool of asyncio workers
+"""
+
+import os
+import time
+import asyncio
+import threading
+
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+
+class MessageBridge:
+    """
+    Thread-safe handoff between the MQTT client thread and the event loop.
+
+    submit() is called on paho's network thread. It never touches the queue
+    directly: the payload is scheduled onto the loop with call_soon_threadsafe
+    and a fixed pool of worker tasks drains the queue into the async handler,
+    handler(topic, payload, received_at), where received_at is the epoch time
+    submit() was called.
+
+    When the queue is full the overflow policy decides what happens:
+    - block: the MQTT thread waits for space, so the broker sees TCP backpressure.
+      A semaphore counts the free slots (workers release one per payload they
+      take), so the thread only waits when the queue is actually full
+    - drop_oldest: the oldest queued payload is discarded to make room
+    - drop_newest: the incoming payload is discarded
+    """
+
+    def __init__(self, handler, queue_size=None, workers=None, overflow_policy=None):
+        self.handler = handler
+        self.queue_size = queue_size or int(os.getenv("INGEST_QUEUE_SIZE", 10000))
+        self.worker_count = workers or int(os.getenv("INGEST_WORKERS", 4))
+        self.overflow_policy = overflow_policy or os.getenv("INGEST_OVERFLOW_POLICY", "block")
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy '{self.overflow_policy}'. "
+                f"Use one of: {', '.join(OVERFLOW_POLICIES)}"
+            )
+
+        self.loop = None
+        self.queue = None
+        self._slots = None  # Free queue slots, for the block policy
+        self._workers = []
+        self._closed = False
+
+        self.stats = {
+            "received": 0,
+            "dropped": 0,
+            "blocked": 0,
+            "handler_errors": 0,
+        }
+
+    def start(self):
+        """Create the queue and worker tasks on the running loop"""
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.overflow_policy == 'block':
+            self._slots = threading.Semaphore(self.queue_size)
+        self._closed = False
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.worker_count)
+        ]
+
+    def close(self):
+        """Stop accepting payloads (safe to call from any thread)"""
+        self._closed = True
+
+    async def stop(self, timeout=10.0):
+        """Drain what is queued, then cancel the workers"""
+        self.close()
+        if self.queue is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                print(f"Bridge stopped with {self.queue.qsize()} payloads still queued")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def depth(self):
+        """Number of payloads waiting in the queue"""
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def submit(self, topic, payload):
+        """Queue a raw MQTT payload (called from the MQTT network thread)"""
+        if self._closed or self.loop is None or self.loop.is_closed():
+            self.stats["dropped"] += 1
+            return
+
+        item = (topic, payload, time.time())
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            # Queue full: wait in slices so shutdown can release a blocked MQTT thread
+            self.stats["blocked"] += 1
+            while not self._slots.acquire(timeout=1.0):
+                if self._closed:
+                    self.stats["dropped"] += 1
+                    return
+        self.loop.call_soon_threadsafe(self._enqueue, item)
+
+    def _enqueue(self, item):
+        """Put an item on the queue applying the drop policy (runs on the loop; never full under block)"""
+        try:
+            self.queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        self.stats["dropped"] += 1
+        if self.overflow_policy == 'drop_oldest':
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.queue.put_nowait(item)
+
+    async def _worker(self):
+        """Drain the queue into the handler"""
+        while True:
+            topic, payload, received_at = await self.queue.get()
+            if self._slots is not None:
+                self._slots.release()
+            self.stats["received"] += 1
+            try:
+                await self.handler(topic, payload, received_at)
+            except Exception as e:
+                self.stats["handler_errors"] += 1
+                print(f"Error processing message on {topic}: {e}")
+            finally:
+                self.queue.task_done()
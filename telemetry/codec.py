@@ -0,0 +1,154 @@
+"""
+Telemetry Payload Codec
+Decodes MQTT telemetry payloads (compact binary or JSON) into reading tuples
+"""
+
+import json
+import math
+import struct
+from datetime import datetime, timedelta, timezone
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Compact binary format, version 1 (keep in sync with firmware/payload_format.py)
+#   header:  <B magic 0xBE> <B version> <H record count>
+#   records: <q epoch milliseconds> <4i temperature, humidity, weight, sound_level>
+# Values are fixed-point hundredths (35.12 -> 3512); MISSING marks an absent value.
+# The device id is not repeated in the payload: it comes from the topic
+# beehive/{device_id}/telemetry.
+MAGIC = 0xBE
+VERSION = 1
+HEADER = struct.Struct('<BBH')
+RECORD = struct.Struct('<q4i')
+MISSING = -2 ** 31
+SCALE = 100
+
+VALUE_FIELDS = ('temperature', 'humidity', 'weight', 'sound_level')
+
+
+class PayloadError(ValueError):
+    """Raised when a payload cannot be decoded"""
+
+
+def device_from_topic(topic):
+    """Extract the device id from beehive/{device_id}/telemetry"""
+    parts = topic.split('/')
+    return parts[1] if len(parts) >= 3 else None
+
+
+def decode_payload(topic, payload):
+    """
+    Decode one MQTT payload into reading tuples
+    (time, device_id, temperature, humidity, weight, sound_level).
+
+    The format is detected per message: payloads starting with the binary
+    magic byte use the compact format, everything else is parsed as JSON.
+    """
+    if payload[:1] == bytes((MAGIC,)):
+        return decode_binary(device_from_topic(topic), payload)
+    return decode_json(topic, payload)
+
+
+def decode_binary(device_id, payload):
+    """Decode a compact binary payload in one pass over its fixed-size records"""
+    if device_id is None:
+        raise PayloadError("Binary payloads need a beehive/{device_id}/telemetry topic")
+    if len(payload) < HEADER.size:
+        raise PayloadError("Binary payload shorter than its header")
+
+    magic, version, count = HEADER.unpack_from(payload)
+    if version != VERSION:
+        raise PayloadError(f"Unsupported binary payload version {version}")
+    body = memoryview(payload)[HEADER.size:]
+    if len(body) != count * RECORD.size:
+        raise PayloadError(f"Binary payload declares {count} records but has {len(body)} bytes")
+
+    epoch = EPOCH
+    ms = timedelta(milliseconds=1)
+    try:
+        return [
+            (
+                epoch + millis * ms,
+                device_id,
+                None if t == MISSING else t / SCALE,
+                None if h == MISSING else h / SCALE,
+                None if w == MISSING else w / SCALE,
+                None if s == MISSING else s / SCALE,
+            )
+            for millis, t, h, w, s in RECORD.iter_unpack(body)
+        ]
+    except OverflowError as e:
+        # A timestamp outside the years datetime can hold
+        raise PayloadError(f"Invalid timestamp in binary payload: {e}")
+
+
+def decode_json(topic, payload):
+    """Decode a JSON reading object, or an array of them (a batch from one device)"""
+    try:
+        telemetry = json.loads(payload)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise PayloadError(f"Invalid JSON: {e}")
+    if isinstance(telemetry, dict):
+        return [_reading_from_dict(topic, telemetry)]
+    if isinstance(telemetry, list) and all(isinstance(item, dict) for item in telemetry):
+        return [_reading_from_dict(topic, item) for item in telemetry]
+    raise PayloadError("JSON payload must be an object or an array of objects")
+
+
+def _reading_from_dict(topic, telemetry):
+    device_id = telemetry.get('device_id') or device_from_topic(topic)
+    if not device_id:
+        raise PayloadError("Reading has no device_id")
+    try:
+        time = parse_timestamp(telemetry.get('timestamp'))
+    except (TypeError, ValueError, AttributeError, OverflowError) as e:
+        raise PayloadError(f"Invalid timestamp {telemetry.get('timestamp')!r}: {e}")
+    if not isinstance(device_id, str):
+        raise PayloadError(f"Invalid device_id {device_id!r}")
+    return (time, device_id, *(_reading_value(telemetry, field) for field in VALUE_FIELDS))
+
+
+def _reading_value(telemetry, field):
+    """A measurement as a finite float, or None if absent"""
+    value = telemetry.get(field)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise PayloadError(f"Invalid {field} {value!r}")
+    try:
+        number = float(value)
+    except ValueError:
+        raise PayloadError(f"Invalid {field} {value!r}")
+    if not math.isfinite(number):
+        raise PayloadError(f"Invalid {field} {value!r}")
+    return number
+
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 string or epoch milliseconds into an aware datetime"""
+    if value is None:
+        return datetime.now(timezone.utc)
+    if isinstance(value, bool):
+        raise TypeError("a boolean is not a timestamp")
+    if isinstance(value, (int, float)):
+        return EPOCH + timedelta(milliseconds=value)
+    if value.endswith('Z'):
+        # Handle ISO format with Z (fromisoformat only accepts it from 3.11)
+        value = value[:-1] + '+00:00'
+    time = datetime.fromisoformat(value)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return time
+
+
+def encode_binary(readings):
+    """Encode reading tuples in the compact binary format (used by tooling and benchmarks)"""
+    parts = [HEADER.pack(MAGIC, VERSION, len(readings))]
+    for time, _device_id, *values in readings:
+        millis = (time - EPOCH) // timedelta(milliseconds=1)
+        parts.append(RECORD.pack(
+            millis,
+            *(MISSING if value is None else round(value * SCALE) for value in values)
+        ))
+    return b''.join(parts)
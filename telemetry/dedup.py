@@ -0,0 +1,50 @@
+"""
+Reading Deduplication
+Drops QoS 1 redeliveries before they reach the batch writer
+"""
+
+import os
+from collections import deque
+
+
+class DuplicateFilter:
+    """
+    Short-window seen-set of (device_id, time) keys.
+
+    Each device keeps the timestamps of its last `window` readings in a set
+    (for O(1) lookups) and a deque (for O(1) eviction of the oldest). Broker
+    redeliveries arrive shortly after the original, so a small window catches
+    them. Anything older is left to the unique index on readings.
+    """
+
+    def __init__(self, window=None):
+        self.window = window or int(os.getenv("DEDUP_WINDOW", 32))
+        self._seen = {}
+        self.duplicates = 0
+
+    def filter(self, readings):
+        """Return the readings whose (device_id, time) has not been seen recently"""
+        fresh = []
+        seen = self._seen
+        window = self.window
+        for reading in readings:
+            time, device_id = reading[0], reading[1]
+            entry = seen.get(device_id)
+            if entry is None:
+                entry = seen[device_id] = (set(), deque())
+            keys, order = entry
+
+            if time in keys:
+                self.duplicates += 1
+                continue
+
+            keys.add(time)
+            order.append(time)
+            if len(order) > window:
+                keys.discard(order.popleft())
+            fresh.append(reading)
+        return fresh
+
+    def forget(self, device_id):
+        """Drop the state kept for a device (e.g. after it was unregistered)"""
+        self._seen.pop(device_id, None)
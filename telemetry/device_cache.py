@@ -0,0 +1,179 @@
+"""
+Registered Device Cache
+Keeps the set of registered device ids from PostgreSQL in memory
+"""
+
+import os
+import json
+import time
+import asyncio
+import asyncpg
+
+
+# Channel the backend notifies on when hives are created, updated or deleted
+HIVE_DEVICES_CHANNEL = 'hive_devices'
+
+
+class DeviceRegistry:
+    """
+    In-memory set of device ids registered in the PostgreSQL hives table.
+
+    The set is loaded once on start, updated incrementally from NOTIFY
+    messages the backend sends on HIVE_DEVICES_CHANNEL, and fully resynced
+    every resync_interval seconds as a safety net. Changes notified while a
+    resync is loading are applied again on top of what it loaded, so the
+    snapshot cannot undo them. When the listener connection drops it is
+    reopened straight away, retrying with backoff, and the set is resynced
+    since changes were missed meanwhile.
+    """
+
+    def __init__(self, postgres_url, resync_interval=None):
+        self.postgres_url = postgres_url
+        self.resync_interval = resync_interval or float(os.getenv("DEVICE_RESYNC_INTERVAL", 300))
+        self.retry_delay = float(os.getenv("DEVICE_RECONNECT_DELAY", 0.5))
+        self.max_retry_delay = float(os.getenv("DEVICE_RECONNECT_MAX_DELAY", 30.0))
+        self.devices = set()
+        self.reconnects = 0
+        self._conn = None
+        self._task = None
+        self._dropped = asyncio.Event()
+        self._pending = None  # Changes notified while a resync is loading
+
+    async def start(self):
+        """Connect, subscribe to changes and load the full device set"""
+        await self._connect()
+        await self.resync()
+        self._task = asyncio.create_task(self._resync_loop())
+
+    async def stop(self):
+        """Stop the resync task and close the listener connection"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._conn and not self._conn.is_closed():
+            await self._conn.close()
+
+    def is_registered(self, device_id):
+        """Check whether a device id belongs to a registered hive"""
+        return device_id in self.devices
+
+    async def _connect(self):
+        """Open the listener connection (LISTEN before loading, so no change is missed)"""
+        self._dropped.clear()
+        self._conn = await asyncpg.connect(self.postgres_url)
+        self._conn.add_termination_listener(self._on_terminate)
+        await self._conn.add_listener(HIVE_DEVICES_CHANNEL, self._on_notify)
+
+    async def resync(self):
+        """Reload the full set of registered device ids"""
+        self._pending = []
+        try:
+            rows = await self._conn.fetch("SELECT device_id FROM hives")
+            devices = {row['device_id'] for row in rows}
+            # The snapshot may predate some of these; replayed in order they win
+            for change in self._pending:
+                self._apply(devices, change)
+        finally:
+            self._pending = None
+        self.devices = devices
+        print(f"Device cache loaded: {len(self.devices)} registered devices")
+
+    async def _resync_loop(self):
+        """Resync periodically, and reconnect (then resync) as soon as the listener drops"""
+        while True:
+            try:
+                await asyncio.wait_for(self._dropped.wait(), timeout=self.resync_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._conn is None or self._conn.is_closed():
+                await self._reconnect()
+                continue
+            try:
+                await self.resync()
+            except Exception as e:
+                print(f"Device cache resync failed: {e}")
+
+    async def _reconnect(self):
+        """Reopen the listener connection and resync, backing off between attempts"""
+        delay = self.retry_delay
+        while True:
+            try:
+                await self._connect()
+                await self.resync()
+                self.reconnects += 1
+                return
+            except Exception as e:
+                print(f"Device cache reconnect failed: {e}. Retrying in {delay:.1f}s")
+                if self._conn is not None and not self._conn.is_closed():
+                    await self._conn.close()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def _on_terminate(self, connection):
+        self._dropped.set()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        """Apply an insert/update/delete notification from the backend"""
+        try:
+            change = json.loads(payload)
+        except json.JSONDecodeError:
+            print(f"Ignoring malformed {channel} notification: {payload}")
+            return
+
+        if self._pending is not None:
+            self._pending.append(change)
+        self._apply(self.devices, change)
+
+    @staticmethod
+    def _apply(devices, change):
+        op = change.get('op')
+        device_id = change.get('device_id')
+        if op == 'delete':
+            devices.discard(device_id)
+        elif op == 'update':
+            devices.discard(change.get('old_device_id'))
+            devices.add(device_id)
+        elif op == 'insert':
+            devices.add(device_id)
+
+
+class UnknownDeviceSampler:
+    """
+    Counts readings from unregistered devices and logs a summary at most once
+    per interval, instead of printing a warning for every message.
+    """
+
+    def __init__(self, interval=None, max_tracked=1000, sample_size=5):
+        self.interval = interval or float(os.getenv("UNKNOWN_DEVICE_LOG_INTERVAL", 60))
+        self.max_tracked = max_tracked
+        self.sample_size = sample_size
+        self.total = 0
+        self._counts = {}
+        self._window_total = 0
+        self._last_report = time.monotonic()
+
+    def record(self, device_id):
+        """Count one skipped reading and report if the interval has elapsed"""
+        self.total += 1
+        self._window_total += 1
+        if device_id in self._counts:
+            self._counts[device_id] += 1
+        elif len(self._counts) < self.max_tracked:
+            self._counts[device_id] = 1
+
+        if time.monotonic() - self._last_report >= self.interval:
+            self.report()
+
+    def report(self):
+        """Log the skipped readings seen since the last report"""
+        if self._window_total:
+            top = sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+            sample = ', '.join(f"{device_id} ({count})" for device_id, count in top[:self.sample_size])
+            print(
+                f"Warning: skipped {self._window_total} readings from "
+                f"{len(self._counts)} unregistered devices, e.g. {sample}"
+            )
+        self._counts = {}
+        self._window_total = 0
+        self._last_report = time.monotonic()
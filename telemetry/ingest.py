@@ -0,0 +1,284 @@
+"""
+Batched Ingest Pipeline
+Buffers telemetry readings in memory and writes them to TimescaleDB with COPY
+"""
+
+import os
+import time
+import asyncio
+
+import asyncpg
+
+
+# Column order of the tuples handed to the writer (matches the readings table)
+READING_COLUMNS = ('time', 'device_id', 'temperature', 'humidity', 'weight', 'sound_level')
+
+# COPY cannot skip conflicting rows, so batches are copied into a per-session
+# staging table and merged into readings with ON CONFLICT DO NOTHING. The unique
+# index on readings (device_id, time) makes redeliveries and replays idempotent.
+STAGING_TABLE = 'readings_staging'
+
+MERGE_STAGING_SQL = f"""
+    INSERT INTO readings (time, device_id, temperature, humidity, weight, sound_level)
+    SELECT time, device_id, temperature, humidity, weight, sound_level FROM {STAGING_TABLE}
+    ON CONFLICT DO NOTHING
+"""
+
+
+# Errors caused by the rows themselves: retrying the same batch cannot succeed.
+# asyncpg raises a ValueError subclass for values it cannot encode, and the
+# server rejects bad values (class 22) and constraint violations (class 23).
+# Any other error is treated as the database being unavailable.
+DATA_ERRORS = (
+    asyncpg.exceptions.DataError,
+    asyncpg.exceptions.IntegrityConstraintViolationError,
+    ValueError,
+    TypeError,
+)
+
+
+async def init_connection(conn):
+    """Create the staging table on every new pool connection"""
+    await conn.execute(
+        f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE}
+        (LIKE readings INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+        """
+    )
+
+
+class BatchWriter:
+    """
+    Collects readings into a bounded buffer and flushes them with
+    copy_records_to_table when the buffer reaches batch_size or when
+    flush_interval seconds have passed, whichever comes first.
+
+    A batch that fails to flush is kept and retried with exponential backoff,
+    so a database hiccup delays readings instead of losing them. While the
+    buffer is full, add() waits, which pushes backpressure to the caller.
+    A batch rejected for its data is not retried: it is split in halves
+    until the bad rows are isolated, and those are dropped and counted.
+
+    With a spool, a batch that still fails after spool_after_retries attempts
+    is written to disk instead, and later batches go straight to disk until
+    the database is reachable again. A replay task writes the spool back in
+    large batches, limited to replay_rate readings per second.
+    """
+
+    def __init__(self, db_pool, batch_size=None, flush_interval=None, max_buffer=None, spool=None):
+        self.db_pool = db_pool
+        self.spool = spool
+        self.batch_size = batch_size or int(os.getenv("INGEST_BATCH_SIZE", 1000))
+        self.flush_interval = flush_interval or float(os.getenv("INGEST_FLUSH_INTERVAL", 1.0))
+        self.max_buffer = max_buffer or int(os.getenv("INGEST_MAX_BUFFER", 50000))
+        self.retry_delay = float(os.getenv("INGEST_RETRY_DELAY", 0.5))
+        self.max_retry_delay = float(os.getenv("INGEST_MAX_RETRY_DELAY", 30.0))
+        self.spool_after_retries = int(os.getenv("INGEST_SPOOL_AFTER_RETRIES", 3))
+        self.replay_batch_size = int(os.getenv("SPOOL_REPLAY_BATCH", 5000))
+        self.replay_rate = float(os.getenv("SPOOL_REPLAY_RATE", 20000))
+        self.db_available = True
+
+        self._buffer = []
+        self._batch_ready = asyncio.Event()
+        self._has_space = asyncio.Event()
+        self._has_space.set()
+        self._task = None
+        self._replay_task = None
+        self._running = False
+
+        self.stats = {
+            "buffered": 0,
+            "flushes": 0,
+            "rows_written": 0,
+            "duplicates_skipped": 0,
+            "flush_failures": 0,
+            "rows_rejected": 0,
+            "rows_lost": 0,
+            "backpressure_waits": 0,
+            "last_flush_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+        }
+
+    def start(self):
+        """Start the background flush task (and spool replay, if spooling)"""
+        self._running = True
+        self._task = asyncio.create_task(self._flush_loop())
+        if self.spool:
+            self._replay_task = asyncio.create_task(self._replay_loop())
+
+    async def stop(self):
+        """Stop the flush task after writing everything still buffered"""
+        self._running = False
+        self._batch_ready.set()
+        if self._replay_task:
+            self._replay_task.cancel()
+            await asyncio.gather(self._replay_task, return_exceptions=True)
+            self._replay_task = None
+        if self._task:
+            await self._task
+            self._task = None
+        if self.spool:
+            self.spool.close()
+
+    def snapshot(self):
+        """Current writer counters, including the spool backlog"""
+        stats = dict(self.stats)
+        if self.spool:
+            stats.update({
+                "db_available": self.db_available,
+                "spool_backlog_records": self.spool.backlog_records(),
+                "spool_backlog_bytes": self.spool.backlog_bytes(),
+                **{f"spool_{key}": value for key, value in self.spool.stats.items()},
+            })
+        return stats
+
+    async def add(self, record):
+        """Buffer a single reading tuple (ordered as READING_COLUMNS)"""
+        await self.add_many((record,))
+
+    async def add_many(self, records):
+        """Buffer several reading tuples, waiting while the buffer is full"""
+        while len(self._buffer) >= self.max_buffer:
+            self.stats["backpressure_waits"] += 1
+            self._has_space.clear()
+            await self._has_space.wait()
+
+        self._buffer.extend(records)
+        self.stats["buffered"] = len(self._buffer)
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+
+    async def _flush_loop(self):
+        """Flush on size or on the time limit until stopped and drained"""
+        while self._running or self._buffer:
+            if self._running and len(self._buffer) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+
+            while self._buffer:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                self.stats["buffered"] = len(self._buffer)
+                self._has_space.set()
+
+                try:
+                    await self._flush_with_retry(batch)
+                except Exception as e:
+                    # E.g. the spool's disk failing: lose this batch, not the writer
+                    self.stats["rows_lost"] += len(batch)
+                    print(f"Lost {len(batch)} readings: {e}")
+
+                # Leave partial batches for the next interval while running
+                if self._running and len(self._buffer) < self.batch_size:
+                    break
+
+    async def _flush_with_retry(self, batch):
+        """Write a batch, retrying with backoff until it succeeds or is spooled"""
+        delay = self.retry_delay
+        attempts = 0
+        while True:
+            if self.spool and not self.db_available:
+                # Database known to be down: keep the live path moving
+                self.spool.append(batch)
+                return
+
+            started = time.perf_counter()
+            try:
+                rejected = await self._write_isolating(batch)
+            except Exception as e:
+                self.stats["flush_failures"] += 1
+                attempts += 1
+                if self.spool and (attempts >= self.spool_after_retries or not self._running):
+                    print(f"Error flushing {len(batch)} readings: {e}. Spooling to disk")
+                    self.db_available = False
+                    self.spool.append(batch)
+                    return
+                print(f"Error flushing {len(batch)} readings: {e}. Retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(batch) - rejected
+            self.stats["last_flush_size"] = len(batch) - rejected
+            self.stats["last_flush_ms"] = round(elapsed_ms, 2)
+            self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], round(elapsed_ms, 2))
+            print(f"Flushed {len(batch) - rejected} readings in {elapsed_ms:.1f} ms")
+            return
+
+    async def _replay_loop(self):
+        """Write spooled readings back to the database at a bounded rate"""
+        delay = self.retry_delay
+        while self._running:
+            records, token = self.spool.read_batch(self.replay_batch_size)
+            if not records:
+                await asyncio.sleep(1.0)
+                continue
+
+            started = time.perf_counter()
+            try:
+                # Rows the database rejects are dropped, so a bad row cannot pin the replay
+                rejected = await self._write_isolating(records)
+            except Exception as e:
+                self.db_available = False
+                print(f"Spool replay failed: {e}. Retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+
+            elapsed = time.perf_counter() - started
+            delay = self.retry_delay
+            self.spool.commit(token)
+            if not self.db_available:
+                print("Database reachable again, resuming direct writes")
+                self.db_available = True
+            print(
+                f"Replayed {len(records) - rejected} spooled readings in {elapsed * 1000:.1f} ms "
+                f"({self.spool.backlog_records()} left)"
+            )
+
+            # Stay under the configured replay rate
+            pause = len(records) / self.replay_rate - elapsed
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+    async def _write_isolating(self, batch):
+        """
+        Write a batch; if its data is rejected, write it in halves, recursively,
+        and drop the single rows that still fail. Availability errors propagate
+        (rows already written are skipped as duplicates on the retry).
+        Returns the number of rows dropped.
+        """
+        try:
+            await self.write_batch(batch)
+            return 0
+        except DATA_ERRORS as e:
+            if len(batch) == 1:
+                self.stats["rows_rejected"] += 1
+                print(f"Dropping reading the database rejects: {batch[0]!r} ({e})")
+                return 1
+            middle = len(batch) // 2
+            return (
+                await self._write_isolating(batch[:middle])
+                + await self._write_isolating(batch[middle:])
+            )
+
+    async def write_batch(self, batch):
+        """Write one batch of readings to the readings hypertable, skipping rows already stored"""
+        async with self.db_pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.copy_records_to_table(
+                    STAGING_TABLE,
+                    records=batch,
+                    columns=READING_COLUMNS
+                )
+                status = await conn.execute(MERGE_STAGING_SQL)
+
+        # Status is "INSERT 0 <rows inserted>"
+        inserted = int(status.split()[-1])
+        self.stats["duplicates_skipped"] += len(batch) - inserted
@@ -0,0 +1,153 @@
+"""
+Live Telemetry Publisher
+Publishes accepted readings to backend WebSocket workers with NOTIFY on TimescaleDB
+"""
+
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from datetime import timedelta
+
+import asyncpg
+
+from codec import EPOCH
+
+
+MICROSECOND = timedelta(microseconds=1)
+
+# One round trip for every notification of a round
+NOTIFY_SQL = "SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload"
+
+
+class LivePublisher:
+    """
+    Publishes readings as soon as the consumer accepts them, independently
+    of the batch writer, so live viewers do not wait for the next flush.
+
+    publish() never waits: it encodes the readings and queues them. A single
+    task sends everything queued since its last round on its own connection
+    (not one from the writer's pool, which can be busy with a COPY), then
+    starts the next round with whatever arrived meanwhile. Under load the
+    rounds grow instead of queueing up behind each other.
+
+    Rows are grouped by a running byte count into notifications of about
+    chunk_bytes (NOTIFY payloads are limited to 8000 bytes). Each one is
+    {"received_at": <epoch seconds>, "readings": [[epoch microseconds,
+    device_id, temperature, humidity, weight, sound_level], ...]}, where
+    received_at is when the consumer received the oldest reading in it.
+
+    Readings are published before they are stored. When readings could not be
+    published (the queue overflowed or NOTIFY failed) the next notification
+    carries "gap": true, so listeners know they missed some.
+    """
+
+    def __init__(self, database_url, channel=None, chunk_bytes=None, max_pending=None):
+        self.database_url = database_url
+        self.channel = channel or os.getenv("LIVE_NOTIFY_CHANNEL", "telemetry_live")
+        self.chunk_bytes = chunk_bytes or int(os.getenv("LIVE_NOTIFY_CHUNK_BYTES", 6000))
+        self.max_pending = max_pending or int(os.getenv("LIVE_NOTIFY_MAX_PENDING", 10000))
+        self.retry_delay = float(os.getenv("LIVE_NOTIFY_RETRY_DELAY", 0.5))
+        self.max_retry_delay = float(os.getenv("LIVE_NOTIFY_MAX_RETRY_DELAY", 30.0))
+
+        self._pending = deque()  # (received_at, encoded reading)
+        self._ready = asyncio.Event()
+        self._gap = False
+        self._conn = None
+        self._task = None
+
+        self.stats = {
+            "live_published": 0,
+            "live_notifications": 0,
+            "live_dropped": 0,
+            "live_failures": 0,
+        }
+
+    def start(self):
+        """Start the publishing task (the connection is opened on first use)"""
+        self._task = asyncio.create_task(self._publish_loop())
+
+    async def stop(self):
+        """Stop publishing; readings still queued are not live any more"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._conn and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+    def publish(self, readings, received_at=None):
+        """Queue accepted reading tuples for the next round (never waits)"""
+        if received_at is None:
+            received_at = time.time()
+        pending = self._pending
+        for reading_time, device_id, temperature, humidity, weight, sound_level in readings:
+            pending.append((received_at, json.dumps(
+                [(reading_time - EPOCH) // MICROSECOND, device_id, temperature, humidity, weight, sound_level],
+                separators=(',', ':')
+            )))
+        overflow = len(pending) - self.max_pending
+        if overflow > 0:
+            # Viewers care about the newest readings: drop the oldest
+            for _ in range(overflow):
+                pending.popleft()
+            self.stats["live_dropped"] += overflow
+            self._gap = True
+        self._ready.set()
+
+    def _notifications(self):
+        """Take everything queued, as notification payloads"""
+        payloads = []
+        rows = []
+        size = 0
+        received_at = None
+        gap, self._gap = self._gap, False
+        pending = self._pending
+        while pending:
+            at, row = pending.popleft()
+            if rows and size + len(row) > self.chunk_bytes:
+                payloads.append(self._payload(received_at, rows, gap))
+                rows, size, received_at, gap = [], 0, None, False
+            rows.append(row)
+            size += len(row) + 1
+            if received_at is None or at < received_at:
+                received_at = at
+        if rows:
+            payloads.append(self._payload(received_at, rows, gap))
+        return payloads
+
+    @staticmethod
+    def _payload(received_at, rows, gap):
+        gap_field = ',"gap":true' if gap else ''
+        return f'{{"received_at":{received_at!r}{gap_field},"readings":[{",".join(rows)}]}}'
+
+    async def _publish_loop(self):
+        delay = self.retry_delay
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            if not self._pending:
+                continue
+            readings = len(self._pending)
+            payloads = self._notifications()
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    self._conn = await asyncpg.connect(self.database_url)
+                await self._conn.execute(NOTIFY_SQL, self.channel, payloads)
+            except Exception as e:
+                # Stale by the time the database is back: drop them and flag the gap
+                self.stats["live_failures"] += 1
+                self.stats["live_dropped"] += readings
+                self._gap = True
+                print(f"Live publish of {readings} readings failed: {e}. Retrying in {delay:.1f}s")
+                if self._conn is not None and not self._conn.is_closed():
+                    self._conn.terminate()
+                self._conn = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            delay = self.retry_delay
+            self.stats["live_published"] += readings
+            self.stats["live_notifications"] += len(payloads)
@@ -0,0 +1,245 @@
+"""
+Disk Spool
+Append-only, segment-rotated write-ahead buffer for readings that could not be
+written to TimescaleDB
+"""
+
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Frame: <I body length> then body
+#   <q time in epoch microseconds> <B null mask> <4d temperature, humidity, weight, sound_level>
+#   followed by the UTF-8 device_id (rest of the body)
+FRAME_HEADER = struct.Struct('<I')
+RECORD_HEAD = struct.Struct('<qB4d')
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.spool'
+
+
+def encode_record(record):
+    """
+    Encode one reading tuple (time, device_id, temperature, humidity, weight, sound_level).
+    Raises ValueError for a reading that does not fit the frame.
+    """
+    try:
+        time, device_id, *values = record
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+        delta = time - EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+        mask = 0
+        floats = []
+        for i, value in enumerate(values):
+            if value is None:
+                mask |= 1 << i
+                floats.append(0.0)
+            else:
+                floats.append(value)
+
+        body = RECORD_HEAD.pack(micros, mask, *floats) + device_id.encode()
+    except (struct.error, TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"Cannot spool reading {record!r}: {e}")
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+def decode_frames(data, max_records=None):
+    """Decode complete frames from data; returns (records, bytes consumed)"""
+    records = []
+    offset = 0
+    end = len(data)
+    while offset + FRAME_HEADER.size <= end:
+        if max_records is not None and len(records) >= max_records:
+            break
+        (length,) = FRAME_HEADER.unpack_from(data, offset)
+        body_start = offset + FRAME_HEADER.size
+        if body_start + length > end:
+            break  # torn write at the tail of the segment
+        if length < RECORD_HEAD.size:
+            break  # corrupt frame: nothing after it can be trusted
+        micros, mask, *floats = RECORD_HEAD.unpack_from(data, body_start)
+        try:
+            device_id = bytes(data[body_start + RECORD_HEAD.size:body_start + length]).decode()
+        except UnicodeDecodeError:
+            break
+        values = [None if mask & (1 << i) else value for i, value in enumerate(floats)]
+        records.append((EPOCH + timedelta(microseconds=micros), device_id, *values))
+        offset = body_start + length
+    return records, offset
+
+
+class DiskSpool:
+    """
+    Stores readings on local disk in numbered segment files.
+
+    New frames go to the active segment, which is closed and replaced once it
+    reaches segment_bytes. Replay always reads from the oldest closed segment
+    and records its progress in a small .offset sidecar file, so a restart
+    resumes where it stopped. When the spool exceeds max_bytes the oldest
+    segment is discarded and counted as dropped. Readings that cannot be
+    encoded are not spooled; they are counted as rejected.
+    """
+
+    def __init__(self, directory=None, segment_bytes=None, max_bytes=None):
+        self.directory = directory or os.getenv("SPOOL_DIR", "spool")
+        self.segment_bytes = segment_bytes or int(os.getenv("SPOOL_SEGMENT_BYTES", 16 * 1024 * 1024))
+        self.max_bytes = max_bytes or int(os.getenv("SPOOL_MAX_BYTES", 1024 * 1024 * 1024))
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._segments = {}  # seq -> [bytes, records] for segments still on disk
+        self._active_seq = None
+        self._active_file = None
+
+        self.stats = {
+            "spooled": 0,
+            "replayed": 0,
+            "dropped": 0,
+            "rejected": 0,
+        }
+        self._load_existing()
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{seq:010d}{SEGMENT_SUFFIX}")
+
+    def _offset_path(self, seq):
+        return self._path(seq) + '.offset'
+
+    def _load_existing(self):
+        """Pick up segments left by a previous run"""
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+                continue
+            seq = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            with open(self._path(seq), 'rb') as f:
+                data = f.read()
+            offset = self._read_offset(seq)
+            records, _ = decode_frames(data[offset:])
+            self._segments[seq] = [len(data) - offset, len(records)]
+        if self._segments:
+            print(f"Spool has {self.backlog_records()} readings from a previous run")
+
+    def _read_offset(self, seq):
+        try:
+            with open(self._offset_path(seq)) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def backlog_records(self):
+        """Readings waiting on disk to be replayed"""
+        return sum(records for _, records in self._segments.values())
+
+    def backlog_bytes(self):
+        """Bytes waiting on disk to be replayed"""
+        return sum(size for size, _ in self._segments.values())
+
+    def append(self, records):
+        """Append readings to the active segment, rotating and trimming as needed"""
+        if self._active_file is None:
+            self._open_segment()
+
+        frames = []
+        for record in records:
+            try:
+                frames.append(encode_record(record))
+            except ValueError as e:
+                self.stats["rejected"] += 1
+                print(f"Not spooling reading: {e}")
+        data = b''.join(frames)
+        self._active_file.write(data)
+        self._active_file.flush()
+
+        segment = self._segments[self._active_seq]
+        segment[0] += len(data)
+        segment[1] += len(frames)
+        self.stats["spooled"] += len(frames)
+
+        if segment[0] >= self.segment_bytes:
+            self._close_segment()
+        self._enforce_limit()
+
+    def _open_segment(self):
+        seq = max(self._segments, default=0) + 1
+        self._active_seq = seq
+        self._active_file = open(self._path(seq), 'ab')
+        self._segments[seq] = [0, 0]
+
+    def _close_segment(self):
+        if self._active_file is not None:
+            self._active_file.close()
+        self._active_file = None
+        self._active_seq = None
+
+    def _enforce_limit(self):
+        """Drop the oldest segments while the spool is over max_bytes"""
+        while self.backlog_bytes() > self.max_bytes and len(self._segments) > 1:
+            seq = min(self._segments)
+            if seq == self._active_seq:
+                break
+            _, records = self._segments.pop(seq)
+            self._remove(seq)
+            self.stats["dropped"] += records
+            print(f"Warning: spool over {self.max_bytes} bytes, dropped {records} oldest readings")
+
+    def _remove(self, seq):
+        for path in (self._path(seq), self._offset_path(seq)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def read_batch(self, max_records):
+        """
+        Read up to max_records from the oldest segment.
+
+        Returns (records, token); pass the token to commit() once the records
+        are safely in the database. Returns ([], None) when the spool is empty.
+        """
+        while self._segments:
+            seq = min(self._segments)
+            if seq == self._active_seq:
+                # Freeze the active segment so it can be replayed
+                self._close_segment()
+
+            offset = self._read_offset(seq)
+            with open(self._path(seq), 'rb') as f:
+                f.seek(offset)
+                data = f.read(max(65536, max_records * 256))
+
+            records, consumed = decode_frames(data, max_records)
+            if records:
+                return records, (seq, offset + consumed, len(records), consumed)
+
+            # Nothing decodable left: the rest of the segment is a torn write
+            _, remaining = self._segments.pop(seq)
+            self.stats["dropped"] += remaining
+            self._remove(seq)
+
+        return [], None
+
+    def commit(self, token):
+        """Mark records returned by read_batch as written"""
+        seq, new_offset, count, consumed = token
+        segment = self._segments.get(seq)
+        if segment is None:
+            return
+        segment[0] -= consumed
+        segment[1] -= count
+        self.stats["replayed"] += count
+
+        if segment[1] <= 0:
+            self._segments.pop(seq)
+            self._remove(seq)
+        else:
+            with open(self._offset_path(seq), 'w') as f:
+                f.write(str(new_offset))
+
+    def close(self):
+        """Close the active segment file"""
+        self._close_segment()
+
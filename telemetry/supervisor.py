@@ -0,0 +1,106 @@
+"""
+Consumer Worker Supervisor
+Runs N telemetry consumer processes and restarts the ones that crash
+"""
+
+import time
+import signal
+import multiprocessing
+
+
+class WorkerSupervisor:
+    """
+    Starts one process per worker index and keeps them running.
+
+    A worker that exits is restarted after a backoff that doubles on every
+    quick crash (up to max_backoff) and resets once the worker has stayed up
+    for stable_after seconds.
+    """
+
+    def __init__(self, target, worker_count, min_backoff=1.0, max_backoff=30.0, stable_after=60.0):
+        self.target = target
+        self.worker_count = worker_count
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = {}
+        self._stopping = False
+
+    def run(self):
+        """Start all workers and supervise them until SIGINT/SIGTERM"""
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+
+        print(f"Supervisor starting {self.worker_count} consumer workers")
+        for index in range(self.worker_count):
+            self._workers[index] = {
+                "process": None,
+                "started_at": 0.0,
+                "backoff": self.min_backoff,
+                "restart_at": 0.0,
+                "restarts": 0,
+            }
+            self._start(index)
+
+        try:
+            while not self._stopping:
+                self._check_workers()
+                time.sleep(0.5)
+        finally:
+            self._shutdown()
+
+    def _start(self, index):
+        """Spawn the process for one worker index"""
+        worker = self._workers[index]
+        process = self._ctx.Process(
+            target=self.target,
+            args=(index, self.worker_count),
+            name=f"telemetry-worker-{index}",
+            daemon=False
+        )
+        process.start()
+        worker["process"] = process
+        worker["started_at"] = time.monotonic()
+        worker["restart_at"] = 0.0
+        print(f"Worker {index} started (pid {process.pid})")
+
+    def _check_workers(self):
+        """Schedule restarts for workers that exited and start due ones"""
+        now = time.monotonic()
+        for index, worker in self._workers.items():
+            process = worker["process"]
+            if process is not None and process.is_alive():
+                continue
+
+            if process is not None:
+                # Just noticed the exit: schedule a restart
+                uptime = now - worker["started_at"]
+                if uptime >= self.stable_after:
+                    worker["backoff"] = self.min_backoff
+                print(
+                    f"Worker {index} exited with code {process.exitcode} after {uptime:.0f}s. "
+                    f"Restarting in {worker['backoff']:.1f}s"
+                )
+                worker["restart_at"] = now + worker["backoff"]
+                worker["backoff"] = min(worker["backoff"] * 2, self.max_backoff)
+                worker["process"] = None
+            elif now >= worker["restart_at"]:
+                worker["restarts"] += 1
+                self._start(index)
+
+    def _handle_signal(self, signum, frame):
+        self._stopping = True
+
+    def _shutdown(self):
+        """Ask every worker to stop and wait for it"""
+        print("Supervisor stopping workers...")
+        processes = [w["process"] for w in self._workers.values() if w["process"] is not None]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=15)
+            if process.is_alive():
+                process.kill()
+        print("All consumer workers stopped")
@@ -0,0 +1,120 @@
+"""MessageBridge: handoff from the MQTT thread and the overflow policies"""
+
+import asyncio
+
+import pytest
+
+from bridge import MessageBridge
+
+
+class StalledHandler:
+    """Records payloads; the first one holds the (single) worker until released"""
+
+    def __init__(self):
+        self.handled = []
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def __call__(self, topic, payload, received_at):
+        self.handled.append(payload)
+        self.started.set()
+        await self.release.wait()
+
+
+def submit_all(bridge, payloads):
+    for payload in payloads:
+        bridge.submit('beehive/hive-001/telemetry', payload)
+
+
+@pytest.mark.parametrize("policy, kept", [
+    ('drop_newest', [0, 1, 2]),
+    ('drop_oldest', [0, 3, 4]),
+])
+def test_drop_policies(policy, kept):
+    async def run():
+        handler = StalledHandler()
+        bridge = MessageBridge(handler, queue_size=2, workers=1, overflow_policy=policy)
+        bridge.start()
+        await asyncio.to_thread(submit_all, bridge, [0])
+        await handler.started.wait()
+        # The worker is busy with 0: 1 and 2 fill the queue, 3 and 4 overflow
+        await asyncio.to_thread(submit_all, bridge, [1, 2, 3, 4])
+        handler.release.set()
+        await bridge.stop()
+        return handler.handled, bridge.stats
+
+    handled, stats = asyncio.run(run())
+    assert handled == kept
+    assert stats["dropped"] == 2
+    assert stats["received"] == 3
+
+
+def test_block_waits_only_when_full():
+    async def run():
+        handler = StalledHandler()
+        bridge = MessageBridge(handler, queue_size=2, workers=1, overflow_policy='block')
+        bridge.start()
+        await asyncio.to_thread(submit_all, bridge, [0])
+        await handler.started.wait()
+
+        # 1 and 2 fit, 3 has to wait until the worker takes something
+        producer = asyncio.ensure_future(asyncio.to_thread(submit_all, bridge, [1, 2, 3]))
+        await asyncio.sleep(0.1)
+        waiting = not producer.done()
+        handler.release.set()
+        await producer
+        await bridge.stop()
+        return waiting, handler.handled, bridge.stats
+
+    waiting, handled, stats = asyncio.run(run())
+    assert waiting
+    assert handled == [0, 1, 2, 3]
+    assert stats["blocked"] == 1
+    assert stats["dropped"] == 0
+
+
+def test_block_does_not_wait_with_room():
+    async def run():
+        handler = StalledHandler()
+        handler.release.set()
+        bridge = MessageBridge(handler, queue_size=100, workers=2, overflow_policy='block')
+        bridge.start()
+        await asyncio.to_thread(submit_all, bridge, range(100))
+        await bridge.stop()
+        return handler.handled, bridge.stats
+
+    handled, stats = asyncio.run(run())
+    assert sorted(handled) == list(range(100))
+    assert stats["blocked"] == 0
+
+
+def test_handler_errors_are_counted():
+    async def failing(topic, payload, received_at):
+        raise RuntimeError("boom")
+
+    async def run():
+        bridge = MessageBridge(failing, queue_size=10, workers=1, overflow_policy='block')
+        bridge.start()
+        await asyncio.to_thread(submit_all, bridge, [0, 1])
+        await bridge.stop()
+        return bridge.stats
+
+    stats = asyncio.run(run())
+    assert stats["handler_errors"] == 2
+
+
+def test_closed_bridge_drops():
+    async def run():
+        bridge = MessageBridge(StalledHandler(), queue_size=10, workers=1)
+        bridge.start()
+        bridge.close()
+        await asyncio.to_thread(submit_all, bridge, [0])
+        await bridge.stop()
+        return bridge.stats
+
+    assert asyncio.run(run())["dropped"] == 1
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        MessageBridge(None, overflow_policy='spill')
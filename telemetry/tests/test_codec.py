@@ -0,0 +1,93 @@
+"""Payload decoding and validation (binary and JSON)"""
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from codec import PayloadError, decode_payload, encode_binary, HEADER, MAGIC, RECORD, VERSION
+
+TOPIC = 'beehive/hive-001/telemetry'
+TIME = datetime(2024, 5, 1, 12, 0, 0, 250000, tzinfo=timezone.utc)
+
+
+def test_binary_round_trip():
+    readings = [
+        (TIME, 'hive-001', 35.12, 60.5, 42.0, 55.25),
+        (TIME.replace(second=10), 'hive-001', -3.5, None, None, 0.0),
+    ]
+    assert decode_payload(TOPIC, encode_binary(readings)) == readings
+
+
+def test_binary_needs_the_device_in_the_topic():
+    payload = encode_binary([(TIME, 'hive-001', 35.0, 60.0, 42.0, 55.0)])
+    with pytest.raises(PayloadError):
+        decode_payload('telemetry', payload)
+
+
+@pytest.mark.parametrize("payload", [
+    bytes((MAGIC,)),  # shorter than the header
+    HEADER.pack(MAGIC, VERSION + 1, 0),  # unknown version
+    encode_binary([(TIME, 'hive-001', 35.0, 60.0, 42.0, 55.0)])[:-1],  # truncated record
+    HEADER.pack(MAGIC, VERSION, 1) + RECORD.pack(2 ** 62, 0, 0, 0, 0),  # time past year 9999
+    HEADER.pack(MAGIC, VERSION, 1) + RECORD.pack(-2 ** 62, 0, 0, 0, 0),  # time before year 1
+])
+def test_binary_rejects_malformed_payloads(payload):
+    with pytest.raises(PayloadError):
+        decode_payload(TOPIC, payload)
+
+
+def test_json_object():
+    payload = json.dumps({
+        "timestamp": "2024-05-01T12:00:00.250Z",
+        "temperature": 35.12,
+        "humidity": "60.5",
+        "weight": 42,
+    }).encode()
+    assert decode_payload(TOPIC, payload) == [(TIME, 'hive-001', 35.12, 60.5, 42.0, None)]
+
+
+def test_json_batch_with_epoch_millis_and_device_override():
+    millis = int(TIME.timestamp() * 1000)
+    payload = json.dumps([
+        {"timestamp": millis, "temperature": 35.0},
+        {"timestamp": millis + 1000, "device_id": "hive-002", "temperature": 36.0},
+    ]).encode()
+    first, second = decode_payload(TOPIC, payload)
+    assert first[:3] == (TIME, 'hive-001', 35.0)
+    assert second[1:3] == ('hive-002', 36.0)
+    assert (second[0] - first[0]).total_seconds() == 1
+
+
+def test_json_without_timestamp_is_stamped_now():
+    before = datetime.now(timezone.utc)
+    (reading,) = decode_payload(TOPIC, b'{"temperature": 35.0}')
+    assert before <= reading[0] <= datetime.now(timezone.utc)
+
+
+@pytest.mark.parametrize("telemetry", [
+    {"temperature": "warm"},
+    {"temperature": True},
+    {"temperature": [35.0]},
+    {"temperature": "NaN"},
+    {"weight": float("inf")},
+    {"timestamp": "yesterday"},
+    {"timestamp": True},
+    {"timestamp": 1e20},
+    {"timestamp": -2 ** 62},
+    {"device_id": 7},
+])
+def test_json_rejects_invalid_readings(telemetry):
+    with pytest.raises(PayloadError):
+        decode_payload(TOPIC, json.dumps(telemetry).encode())
+
+
+@pytest.mark.parametrize("payload", [b'not json', b'\xff\xfe', b'42', b'[1, 2]'])
+def test_json_rejects_malformed_payloads(payload):
+    with pytest.raises(PayloadError):
+        decode_payload(TOPIC, payload)
+
+
+def test_json_without_any_device_id_is_rejected():
+    with pytest.raises(PayloadError):
+        decode_payload('telemetry', b'{"temperature": 35.0}')
@@ -0,0 +1,39 @@
+"""Redelivery filtering"""
+
+from datetime import datetime, timedelta, timezone
+
+from dedup import DuplicateFilter
+
+START = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def reading(device_id, seconds):
+    return (START + timedelta(seconds=seconds), device_id, 35.0, 60.0, 42.0, 55.0)
+
+
+def test_drops_redeliveries_within_a_batch_and_across_batches():
+    dedup = DuplicateFilter(window=8)
+    first = [reading('a', 0), reading('a', 1), reading('a', 0)]
+    assert dedup.filter(first) == first[:2]
+    assert dedup.filter([reading('a', 1), reading('a', 2)]) == [reading('a', 2)]
+    assert dedup.duplicates == 2
+
+
+def test_devices_are_independent():
+    dedup = DuplicateFilter(window=8)
+    dedup.filter([reading('a', 0)])
+    assert dedup.filter([reading('b', 0)]) == [reading('b', 0)]
+
+
+def test_window_bounds_what_is_remembered():
+    dedup = DuplicateFilter(window=2)
+    dedup.filter([reading('a', 0), reading('a', 1), reading('a', 2)])
+    assert dedup.filter([reading('a', 0)]) == [reading('a', 0)]
+    assert dedup.filter([reading('a', 2)]) == []
+
+
+def test_forget_drops_a_device():
+    dedup = DuplicateFilter(window=8)
+    dedup.filter([reading('a', 0)])
+    dedup.forget('a')
+    assert dedup.filter([reading('a', 0)]) == [reading('a', 0)]
@@ -0,0 +1,125 @@
+"""Registered device cache: notifications, resyncs and listener reconnects"""
+
+import asyncio
+import json
+
+import device_cache
+from device_cache import DeviceRegistry, HIVE_DEVICES_CHANNEL
+
+
+class FakeConnection:
+    """The parts of an asyncpg connection the registry uses"""
+
+    def __init__(self, database):
+        self.database = database
+        self.listeners = {}
+        self.terminated = []
+        self.closed = False
+
+    def add_termination_listener(self, callback):
+        self.terminated.append(callback)
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    async def fetch(self, query):
+        rows = [{'device_id': device_id} for device_id in sorted(self.database.devices)]
+        if self.database.during_fetch:
+            self.database.during_fetch(self)
+        await asyncio.sleep(0)
+        return rows
+
+    def notify(self, **change):
+        self.listeners[HIVE_DEVICES_CHANNEL](self, 1, HIVE_DEVICES_CHANNEL, json.dumps(change))
+
+    def drop(self):
+        self.closed = True
+        for callback in self.terminated:
+            callback(self)
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeDatabase:
+    def __init__(self, devices, failures=0):
+        self.devices = set(devices)
+        self.failures = failures
+        self.connections = []
+        self.during_fetch = None
+
+    async def connect(self, url):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionRefusedError("database unavailable")
+        connection = FakeConnection(self)
+        self.connections.append(connection)
+        return connection
+
+
+def registry_for(monkeypatch, database):
+    monkeypatch.setattr(device_cache.asyncpg, 'connect', database.connect)
+    registry = DeviceRegistry('postgresql://test', resync_interval=60)
+    registry.retry_delay = 0.001
+    return registry
+
+
+def test_applies_notifications(monkeypatch):
+    database = FakeDatabase({'hive-001', 'hive-002'})
+    registry = registry_for(monkeypatch, database)
+
+    async def run():
+        await registry.start()
+        connection = database.connections[0]
+        connection.notify(op='insert', device_id='hive-003')
+        connection.notify(op='delete', device_id='hive-001')
+        connection.notify(op='update', device_id='hive-020', old_device_id='hive-002')
+        await registry.stop()
+
+    asyncio.run(run())
+    assert registry.devices == {'hive-003', 'hive-020'}
+
+
+def test_changes_during_a_resync_are_not_undone(monkeypatch):
+    database = FakeDatabase({'hive-001', 'hive-002'})
+    registry = registry_for(monkeypatch, database)
+
+    def change_during_fetch(connection):
+        # Committed after the snapshot was taken
+        database.devices.add('hive-003')
+        connection.notify(op='insert', device_id='hive-003')
+        database.devices.discard('hive-001')
+        connection.notify(op='delete', device_id='hive-001')
+
+    async def run():
+        await registry.start()
+        database.during_fetch = change_during_fetch
+        await registry.resync()
+        await registry.stop()
+
+    asyncio.run(run())
+    assert registry.devices == {'hive-002', 'hive-003'}
+
+
+def test_reconnects_with_backoff_and_resyncs_after_a_drop(monkeypatch):
+    database = FakeDatabase({'hive-001'})
+    registry = registry_for(monkeypatch, database)
+
+    async def run():
+        await registry.start()
+        database.devices.add('hive-002')  # Missed while the listener is down
+        database.failures = 2
+        database.connections[0].drop()
+        for _ in range(1000):
+            if registry.reconnects:
+                break
+            await asyncio.sleep(0.001)
+        await registry.stop()
+
+    asyncio.run(run())
+    assert registry.reconnects == 1
+    assert len(database.connections) == 2
+    assert registry.devices == {'hive-001', 'hive-002'}
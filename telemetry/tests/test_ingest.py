@@ -0,0 +1,93 @@
+"""BatchWriter flushing: retries on availability errors, bad-row isolation on data errors"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+
+from ingest import BatchWriter
+
+START = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def reading(index, temperature=35.0):
+    return (START + timedelta(seconds=index), 'hive-001', temperature, 60.0, 42.0, 55.0)
+
+
+class FakeDatabase:
+    """Stands in for write_batch: rejects batches holding a bad row, or fails while down"""
+
+    def __init__(self, down_for=0):
+        self.down_for = down_for
+        self.rows = []
+        self.calls = 0
+
+    async def write_batch(self, batch):
+        self.calls += 1
+        if self.down_for:
+            self.down_for -= 1
+            raise ConnectionRefusedError("database unavailable")
+        if any(row[2] == 'bad' for row in batch):
+            raise asyncpg.exceptions.DataError("invalid input syntax for type double precision")
+        self.rows.extend(batch)
+
+
+def writer_for(database, **kwargs):
+    writer = BatchWriter(None, batch_size=100, flush_interval=0.01, **kwargs)
+    writer.retry_delay = 0.001
+    writer.write_batch = database.write_batch
+    return writer
+
+
+def test_bad_rows_are_isolated_and_dropped():
+    database = FakeDatabase()
+    writer = writer_for(database)
+    batch = [reading(index) for index in range(16)]
+    batch[3] = reading(3, 'bad')
+    batch[11] = reading(11, 'bad')
+
+    rejected = asyncio.run(writer._write_isolating(batch))
+
+    assert rejected == 2
+    assert writer.stats["rows_rejected"] == 2
+    assert database.rows == [row for row in batch if row[2] != 'bad']
+
+
+def test_flush_retries_until_the_database_is_back():
+    database = FakeDatabase(down_for=2)
+    writer = writer_for(database)
+    batch = [reading(index) for index in range(10)]
+
+    asyncio.run(writer._flush_with_retry(batch))
+
+    assert database.rows == batch
+    assert writer.stats["flush_failures"] == 2
+    assert writer.stats["rows_written"] == 10
+    assert writer.stats["flushes"] == 1
+
+
+def test_rejected_rows_are_not_counted_as_written():
+    database = FakeDatabase()
+    writer = writer_for(database)
+    batch = [reading(index) for index in range(10)]
+    batch[5] = reading(5, 'bad')
+
+    asyncio.run(writer._flush_with_retry(batch))
+
+    assert writer.stats["flush_failures"] == 0
+    assert writer.stats["rows_written"] == 9
+    assert writer.stats["last_flush_size"] == 9
+
+
+def test_stop_drains_the_buffer():
+    database = FakeDatabase()
+    writer = writer_for(database)
+
+    async def run():
+        writer.start()
+        await writer.add_many([reading(index) for index in range(250)])
+        await writer.stop()
+
+    asyncio.run(run())
+    assert len(database.rows) == 250
+    assert writer.stats["buffered"] == 0
@@ -0,0 +1,163 @@
+"""Live publishing: accepted readings go out at once, in chunks, with gaps flagged"""
+
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import live
+from consumer import TelemetryConsumer
+from ingest import BatchWriter
+from live import LivePublisher
+
+START = datetime(2024, 5, 1, tzinfo=timezone.utc)
+START_US = int(START.timestamp()) * 1000000
+
+
+def reading(index, device_id='hive-001'):
+    return (START + timedelta(seconds=index), device_id, 35.0 + index, 60.0, None, 55.5)
+
+
+class FakeConnection:
+    """Collects NOTIFY payloads; fails while failing is set"""
+
+    def __init__(self):
+        self.payloads = []
+        self.sent = asyncio.Event()
+        self.failing = False
+        self.closed = False
+
+    async def execute(self, query, channel, payloads):
+        if self.failing:
+            raise ConnectionResetError("connection lost")
+        self.payloads.extend(json.loads(payload) for payload in payloads)
+        self.sent.set()
+
+    def is_closed(self):
+        return self.closed
+
+    def terminate(self):
+        self.closed = True
+
+    async def close(self):
+        self.closed = True
+
+
+def publisher_for(monkeypatch, connection, **kwargs):
+    async def connect(url):
+        return connection
+    monkeypatch.setattr(live.asyncpg, 'connect', connect)
+    publisher = LivePublisher('postgresql://test', **kwargs)
+    publisher.retry_delay = 0.001
+    return publisher
+
+
+class AllDevices:
+    def is_registered(self, device_id):
+        return True
+
+
+def test_accepted_readings_are_published_without_waiting_for_the_flush(monkeypatch):
+    connection = FakeConnection()
+    consumer = TelemetryConsumer()
+    consumer.devices = AllDevices()
+    consumer.live = publisher_for(monkeypatch, connection)
+
+    async def run():
+        consumer.writer = BatchWriter(None, flush_interval=1.0)
+        consumer.writer.write_batch = None  # Must not flush within this test
+        consumer.writer.start()
+        consumer.live.start()
+        received_at = time.time()
+        payload = json.dumps({"timestamp": "2024-05-01T00:00:00Z", "temperature": 35.0}).encode()
+        await consumer.handle_message('beehive/hive-001/telemetry', payload, received_at)
+        await asyncio.wait_for(connection.sent.wait(), timeout=1.0)
+        elapsed = time.time() - received_at
+        buffered = consumer.writer.stats["buffered"]
+        await consumer.live.stop()
+        consumer.writer._buffer.clear()
+        await consumer.writer.stop()
+        return received_at, elapsed, buffered
+
+    received_at, elapsed, buffered = asyncio.run(run())
+    assert elapsed < 0.1
+    assert buffered == 1  # Still waiting for the writer's flush
+    (notification,) = connection.payloads
+    assert notification == {
+        "received_at": received_at,
+        "readings": [[START_US, 'hive-001', 35.0, None, None, None]],
+    }
+
+
+def test_readings_are_chunked_in_order_with_the_oldest_receipt_time(monkeypatch):
+    connection = FakeConnection()
+    publisher = publisher_for(monkeypatch, connection, chunk_bytes=200)
+
+    async def run():
+        publisher.publish([reading(index) for index in range(10)], received_at=100.0)
+        publisher.publish([reading(index) for index in range(10, 20)], received_at=101.0)
+        publisher.start()
+        await asyncio.wait_for(connection.sent.wait(), timeout=1.0)
+        await publisher.stop()
+
+    asyncio.run(run())
+    assert len(connection.payloads) > 1
+    assert all(len(json.dumps(payload)) < 300 for payload in connection.payloads)
+    rows = [row for payload in connection.payloads for row in payload["readings"]]
+    assert [row[0] for row in rows] == [START_US + index * 1000000 for index in range(20)]
+    assert rows[3] == [START_US + 3000000, 'hive-001', 38.0, 60.0, None, 55.5]
+    assert connection.payloads[0]["received_at"] == 100.0
+    assert connection.payloads[-1]["received_at"] == 101.0
+    assert publisher.stats["live_published"] == 20
+
+
+def test_overflow_drops_the_oldest_and_flags_a_gap(monkeypatch):
+    connection = FakeConnection()
+    publisher = publisher_for(monkeypatch, connection, max_pending=5)
+
+    async def run():
+        publisher.publish([reading(index) for index in range(8)])
+        publisher.start()
+        await asyncio.wait_for(connection.sent.wait(), timeout=1.0)
+        connection.sent.clear()
+        publisher.publish([reading(8)])
+        await asyncio.wait_for(connection.sent.wait(), timeout=1.0)
+        await publisher.stop()
+
+    asyncio.run(run())
+    first, second = connection.payloads
+    assert first["gap"] is True
+    assert [row[0] for row in first["readings"]] == [START_US + index * 1000000 for index in range(3, 8)]
+    assert "gap" not in second
+    assert publisher.stats["live_dropped"] == 3
+
+
+def test_failed_publish_reconnects_and_flags_a_gap(monkeypatch):
+    broken = FakeConnection()
+    broken.failing = True
+    connection = FakeConnection()
+    connections = [broken, connection]
+
+    async def connect(url):
+        return connections.pop(0)
+    monkeypatch.setattr(live.asyncpg, 'connect', connect)
+    publisher = LivePublisher('postgresql://test')
+    publisher.retry_delay = 0.001
+
+    async def run():
+        publisher.start()
+        publisher.publish([reading(0)])
+        for _ in range(1000):
+            if publisher.stats["live_failures"]:
+                break
+            await asyncio.sleep(0.001)
+        publisher.publish([reading(1)])
+        await asyncio.wait_for(connection.sent.wait(), timeout=1.0)
+        await publisher.stop()
+
+    asyncio.run(run())
+    assert broken.closed
+    (notification,) = connection.payloads
+    assert notification["gap"] is True
+    assert [row[0] for row in notification["readings"]] == [START_US + 1000000]
+    assert publisher.stats["live_dropped"] == 1
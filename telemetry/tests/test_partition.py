@@ -0,0 +1,44 @@
+"""Device-hash partitioning between consumer workers"""
+
+from collections import Counter
+
+from consumer import TelemetryConsumer, partition_owner
+
+DEVICES = [f"hive-{index:05d}" for index in range(20000)]
+
+
+def test_owner_is_stable_and_in_range():
+    for device_id in DEVICES[:100]:
+        owner = partition_owner(device_id, 7)
+        assert 0 <= owner < 7
+        assert partition_owner(device_id, 7) == owner
+
+
+def test_devices_are_spread_evenly():
+    counts = Counter(partition_owner(device_id, 8) for device_id in DEVICES)
+    assert sorted(counts) == list(range(8))
+    assert max(counts.values()) < 1.1 * len(DEVICES) / 8
+
+
+def test_adding_a_worker_only_moves_devices_to_it():
+    moved = [
+        device_id for device_id in DEVICES
+        if partition_owner(device_id, 5) != partition_owner(device_id, 4)
+    ]
+    assert all(partition_owner(device_id, 5) == 4 for device_id in moved)
+    assert abs(len(moved) / len(DEVICES) - 1 / 5) < 0.02
+
+
+def test_each_device_has_exactly_one_owning_worker():
+    workers = [TelemetryConsumer(worker_index=index, worker_count=3) for index in range(3)]
+    for device_id in DEVICES[:300]:
+        topic = f"beehive/{device_id}/telemetry"
+        assert sum(worker.owns_topic(topic) for worker in workers) == 1
+
+
+def test_hash_is_the_default_and_subscribes_to_every_topic():
+    worker = TelemetryConsumer(worker_index=0, worker_count=2)
+    assert worker.partition == 'hash'
+    assert worker.subscription_topic() == "beehive/+/telemetry"
+    shared = TelemetryConsumer(worker_index=0, worker_count=2, partition='shared')
+    assert shared.subscription_topic().startswith("$share/")
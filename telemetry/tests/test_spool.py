@@ -0,0 +1,114 @@
+"""Disk spool frames and segments, and the writer's fallback to the spool"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from ingest import BatchWriter
+from spool import DiskSpool, FRAME_HEADER, decode_frames, encode_record
+
+TIME = datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+RECORDS = [
+    (TIME, 'hive-001', 35.12, 60.5, 42.0, 55.25),
+    (TIME.replace(second=10), 'hive-ü', None, 61.0, None, 0.0),
+]
+
+
+def test_frames_round_trip():
+    data = b''.join(encode_record(record) for record in RECORDS)
+    assert decode_frames(data) == (RECORDS, len(data))
+
+
+def test_naive_times_are_utc():
+    naive = (TIME.replace(tzinfo=None), *RECORDS[0][1:])
+    assert decode_frames(encode_record(naive))[0] == [RECORDS[0]]
+
+
+def test_decode_stops_at_max_records():
+    first = encode_record(RECORDS[0])
+    records, consumed = decode_frames(first + encode_record(RECORDS[1]), max_records=1)
+    assert records == RECORDS[:1] and consumed == len(first)
+
+
+def test_torn_tail_is_left_unconsumed():
+    first = encode_record(RECORDS[0])
+    data = first + encode_record(RECORDS[1])[:-3]
+    assert decode_frames(data) == (RECORDS[:1], len(first))
+
+
+@pytest.mark.parametrize("frame", [FRAME_HEADER.pack(3) + b'abc', FRAME_HEADER.pack(0)])
+def test_corrupt_frame_stops_decoding(frame):
+    first = encode_record(RECORDS[0])
+    assert decode_frames(first + frame + encode_record(RECORDS[1])) == (RECORDS[:1], len(first))
+
+
+@pytest.mark.parametrize("record", [
+    (TIME, None, 35.0, 60.0, 42.0, 55.0),
+    (TIME, 'hive-001', 'warm', 60.0, 42.0, 55.0),
+    ('2024-05-01', 'hive-001', 35.0, 60.0, 42.0, 55.0),
+    (TIME, 'hive-001', 35.0),
+])
+def test_unencodable_records_raise_value_error(record):
+    with pytest.raises(ValueError):
+        encode_record(record)
+
+
+def test_spool_replays_appended_records_once(tmp_path):
+    spool = DiskSpool(directory=str(tmp_path))
+    spool.append([RECORDS[0], (TIME, None, 1.0, 2.0, 3.0, 4.0), RECORDS[1]])
+    assert spool.stats["rejected"] == 1
+    assert spool.backlog_records() == 2
+
+    records, token = spool.read_batch(10)
+    assert records == RECORDS
+    spool.commit(token)
+    assert spool.backlog_records() == 0
+    assert spool.read_batch(10) == ([], None)
+    spool.close()
+
+
+class FlakyDatabase:
+    """write_batch stand-in that is down until brought back"""
+
+    def __init__(self):
+        self.up = False
+        self.rows = []
+
+    async def write_batch(self, batch):
+        if not self.up:
+            raise ConnectionRefusedError("database unavailable")
+        self.rows.extend(batch)
+
+
+def test_writer_spools_while_the_database_is_down_and_replays_later(tmp_path):
+    database = FlakyDatabase()
+    writer = BatchWriter(None, batch_size=10, flush_interval=0.01, spool=DiskSpool(directory=str(tmp_path)))
+    writer.retry_delay = 0.001
+    writer.spool_after_retries = 2
+    writer.write_batch = database.write_batch
+
+    async def run():
+        writer._running = True
+        await writer._flush_with_retry(RECORDS[:1])
+        # Known down: the next batch goes straight to disk without retrying
+        await writer._flush_with_retry(RECORDS[1:])
+        spooled = writer.spool.backlog_records()
+
+        database.up = True
+        replay = asyncio.ensure_future(writer._replay_loop())
+        for _ in range(1000):
+            if writer.db_available:
+                break
+            await asyncio.sleep(0.001)
+        writer._running = False
+        replay.cancel()
+        await asyncio.gather(replay, return_exceptions=True)
+        return spooled
+
+    spooled = asyncio.run(run())
+    assert spooled == 2
+    assert writer.stats["flush_failures"] == 2
+    assert database.rows == RECORDS
+    assert writer.spool.backlog_records() == 0
+    writer.spool.close()
@@ -20,7 +20,10 @@ CREATE TABLE IF NOT EXISTS readings (
 SELECT create_hypertable('readings', 'time', if_not_exists => TRUE);
 
 -- ==================== INDEXES ====================
-CREATE INDEX IF NOT EXISTS idx_readings_device_id_time ON readings (device_id, time DESC);
+-- Unique so that QoS 1 redeliveries and spool replays cannot create duplicate rows.
+-- The consumer COPYs each batch into a session temp table and merges it with
+-- INSERT ... SELECT ... ON CONFLICT DO NOTHING, which relies on this index.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_readings_device_id_time ON readings (device_id, time DESC);
 CREATE INDEX IF NOT EXISTS idx_readings_time ON readings (time DESC);
 
 -- ==================== CONTINUOUS AGGREGATE FOR HOURLY AVERAGES ====================